@@ -1,5 +1,20 @@
-from . import tools
-from . import match
-from . import molar_mass
-from . import annotator
-from . import gui
+import importlib
+
+__version__ = '1.1.1'
+
+# 子包按需导入：import msidat 不加载 PyQt5，也不初始化日志
+_SUBMODULES = ('tools', 'match', 'molar_mass', 'annotator', 'imaging', 'cli', 'service', 'benchmarks', 'gui')
+
+__all__ = list(_SUBMODULES)
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        module = importlib.import_module('.' + name, __name__)
+        globals()[name] = module
+        return module
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_SUBMODULES))
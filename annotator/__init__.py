@@ -1,3 +1,6 @@
 from . import make_annotator
+from .database_index import DatabaseIndex
+from .decoy import DecoySearch, q_values
+from .adduct_groups import AdductGroups, group_adducts, load_adducts
 
-__all__ = ['make_annotator']
+__all__ = ['make_annotator', 'DatabaseIndex', 'DecoySearch', 'q_values', 'AdductGroups', 'group_adducts', 'load_adducts']
@@ -0,0 +1,206 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from loguru import logger
+from .database_index import DatabaseIndex, _ColumnIndex
+
+ADDUCT_TYPE_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'adduct_type.json')
+
+
+def load_adducts(path=None, polarity='positive'):
+    '''
+    Objective: adduct mass deltas of one polarity from an adduct type file (adduct_type.json layout)
+    return: dict {database column name, e.g. '[M+H]+': adduct m/z - neutral mass}
+    '''
+    with open(path or ADDUCT_TYPE_FILE, 'r', encoding='utf-8') as f:
+        table = json.load(f)
+    if polarity == 'negative':
+        return {'[%s]-' % name: float(delta) for name, delta in table['negative'].items()}
+    # adduct_type.json 中正离子键名为 'positve'
+    section = table.get('positve', table.get('positive', {}))
+    return {'[%s]+' % name: float(delta) for name, delta in section.items()}
+
+
+def database_polarity(data_base):
+    '''
+    return: 'negative' when most adduct columns (fifth column on) of an Annotator database end with '-'
+    '''
+    names = [str(v) for v in data_base.columns[4:]]
+    return 'negative' if sum(v.endswith('-') for v in names) * 2 > len(names) else 'positive'
+
+
+class AdductGroups(object):
+    """
+    Peaks explained as different adducts of one neutral compound (see group_adducts).
+        per peak: group (-1 outside any group), adduct, neutral_mass (NaN outside any group)
+        per group: neutral_mass, members (peak indices, ascending m/z), spread_ppm
+    """
+    def __init__(self, n_peaks, adduct_names, peak_group, peak_adduct, peak_mass, group_mass, members, spread_ppm):
+        self.n_peaks = n_peaks
+        self.adduct_names = np.asarray(adduct_names, dtype=object)
+        self.group = peak_group
+        self.adduct = peak_adduct
+        self.neutral_mass = peak_mass
+        self.group_mass = group_mass
+        self.members = members
+        self.spread_ppm = spread_ppm
+
+    def peak_table(self, group_annotation=None):
+        '''
+        return: DataFrame per peak: adduct_group, inferred_adduct, neutral_mass (and group_annotation)
+        '''
+        grouped = self.group >= 0
+        adduct = np.full(self.n_peaks, '', dtype=object)
+        adduct[grouped] = self.adduct_names[self.adduct[grouped]]
+        table = pd.DataFrame({'adduct_group': self.group, 'inferred_adduct': adduct, 'neutral_mass': self.neutral_mass})
+        if group_annotation is not None:
+            annotation = np.full(self.n_peaks, '', dtype=object)
+            annotation[grouped] = np.asarray(group_annotation, dtype=object)[self.group[grouped]]
+            table['group_annotation'] = annotation
+        return table
+
+    def to_frame(self, mz, group_annotation=None):
+        '''
+        return: DataFrame per group: group, neutral_mass, peaks, m/z and adducts (';'-joined), spread_ppm
+        '''
+        mz = np.asarray(mz, dtype=float)
+        table = pd.DataFrame({
+            'group': np.arange(len(self.group_mass)), 'neutral_mass': self.group_mass,
+            'peaks': [len(v) for v in self.members],
+            'm/z': [';'.join('%.5f' % mz[i] for i in v) for v in self.members],
+            'adducts': [';'.join(self.adduct_names[self.adduct[v]]) for v in self.members],
+            'spread_ppm': self.spread_ppm})
+        if group_annotation is not None:
+            table['annotation'] = group_annotation
+        return table
+
+    def __len__(self):
+        return len(self.group_mass)
+
+
+def _split_wide_runs(sorted_mass, gap, ppm):
+    '''
+    return: boolean cluster boundaries between consecutive sorted masses: gaps above ppm, and the largest
+            gap of every cluster wider than ppm until none is
+    '''
+    boundary = gap > ppm
+    while True:
+        start = np.flatnonzero(np.r_[True, boundary])
+        end = np.r_[start[1:] - 1, len(sorted_mass) - 1]
+        wide = (sorted_mass[end] / sorted_mass[start] - 1) * 1e6 > ppm
+        if not wide.any():
+            return boundary
+        # 宽簇在最大间隔处一分为二，簇间边界不参与
+        inner = np.r_[np.where(boundary, -np.inf, gap), -np.inf]
+        largest = np.maximum.reduceat(inner, start)
+        run = np.cumsum(np.r_[True, boundary]) - 1
+        split = np.flatnonzero((inner[:-1] == largest[run[:-1]]) & wide[run[:-1]])
+        split = split[np.r_[True, np.diff(run[split]) != 0]]
+        boundary[split] = True
+
+
+def group_adducts(mz, adducts, ppm=5.0, intensity=None):
+    '''
+    Objective: group peaks whose m/z differences match adduct mass deltas, by inferred neutral mass
+    Every (peak, adduct) hypothesis gives a neutral mass m/z - delta. All hypotheses are sorted once and split
+    where the gap to the previous one exceeds ppm (clusters wider than ppm are split at their largest gap),
+    so two peaks pair up when their m/z difference matches the difference of two adduct deltas within the
+    tolerance: O(n log n) instead of comparing all peak pairs.
+    A cluster with at least two different adducts is a group. A peak supporting several groups is kept in
+    the one with the most adducts (then the highest intensity); groups left with one adduct are dropped.
+    Input:
+        adducts: dict {name: adduct m/z - neutral mass}, e.g. load_adducts()
+        intensity: peak intensities for the neutral mass average and the tie break (equal weights when None)
+    return: AdductGroups
+    '''
+    mz = np.atleast_1d(np.asarray(mz, dtype=float))
+    names = list(adducts)
+    delta = np.array([adducts[v] for v in names], dtype=float)
+    n, k = len(mz), len(delta)
+    weight = np.ones(n) if intensity is None else np.nan_to_num(np.asarray(intensity, dtype=float))
+    empty = AdductGroups(n, names, np.full(n, -1, dtype=np.int64), np.full(n, -1, dtype=np.int64),
+                         np.full(n, np.nan), np.zeros(0), [], np.zeros(0))
+    if not n or k < 2:
+        return empty
+
+    # 每个 (峰, 加合物) 假设对应一个中性质量，下标 = 峰 * k + 加合物
+    mass = (mz[:, None] - delta[None, :]).ravel()
+    entries = np.flatnonzero(np.isfinite(mass) & (mass > 0))
+    entries = entries[np.argsort(mass[entries], kind='stable')]
+    sorted_mass = mass[entries]
+    if len(entries) < 2:
+        return empty
+    gap = np.diff(sorted_mass) / sorted_mass[:-1] * 1e6
+    cluster = np.r_[0, np.cumsum(_split_wide_runs(sorted_mass, gap, ppm))]
+    peak, adduct = np.divmod(entries, k)
+
+    cluster_start = np.r_[0, np.flatnonzero(np.diff(cluster)) + 1]
+
+    def adduct_counts(keep):
+        # 每个簇中不同加合物的个数：簇在排序后连续，按位或合并加合物位掩码
+        if k > 64:
+            pairs = np.unique(cluster[keep] * k + adduct[keep])
+            return np.bincount(pairs // k, minlength=cluster[-1] + 1)
+        bits = np.where(keep, np.left_shift(np.uint64(1), adduct.astype(np.uint64)), np.uint64(0))
+        mask = np.bitwise_or.reduceat(bits, cluster_start)
+        return np.unpackbits(mask.view(np.uint8)).reshape(-1, 64).sum(axis=1)
+
+    candidate = adduct_counts(np.ones(len(entries), dtype=bool))[cluster] >= 2
+    # 一个峰只保留在加合物最多、强度最高的组中
+    strength = np.bincount(cluster[candidate], weights=weight[peak[candidate]], minlength=cluster[-1] + 1)
+    n_adducts = adduct_counts(candidate)
+    position = np.flatnonzero(candidate)
+    position = position[np.lexsort((-strength[cluster[position]], -n_adducts[cluster[position]], peak[position]))]
+    position = position[np.r_[True, np.diff(peak[position]) != 0]] if len(position) else position
+    assigned = np.zeros(len(entries), dtype=bool)
+    assigned[position] = True
+    assigned &= adduct_counts(assigned)[cluster] >= 2
+    if not assigned.any():
+        return empty
+
+    position = np.flatnonzero(assigned)
+    clusters, group = np.unique(cluster[position], return_inverse=True)
+    members_peak = peak[position]
+    w = np.maximum(weight[members_peak], 0)
+    w = np.where(np.bincount(group, weights=w)[group] > 0, w, 1.0)
+    group_mass = np.bincount(group, weights=w * sorted_mass[position]) / np.bincount(group, weights=w)
+    low = np.full(len(clusters), np.inf)
+    high = np.full(len(clusters), -np.inf)
+    np.minimum.at(low, group, sorted_mass[position])
+    np.maximum.at(high, group, sorted_mass[position])
+    bounds = np.r_[0, np.flatnonzero(np.diff(group)) + 1]
+    # 组内按 m/z 排序
+    members = [v[np.argsort(mz[v], kind='stable')] for v in np.split(members_peak, bounds[1:])]
+
+    peak_group = np.full(n, -1, dtype=np.int64)
+    peak_adduct = np.full(n, -1, dtype=np.int64)
+    peak_mass = np.full(n, np.nan)
+    peak_group[members_peak] = group
+    peak_adduct[members_peak] = adduct[position]
+    peak_mass[members_peak] = group_mass[group]
+    logger.info('adduct grouping: {} groups covering {} of {} peaks ({} ppm)',
+                len(clusters), len(members_peak), n, ppm)
+    return AdductGroups(n, names, peak_group, peak_adduct, peak_mass, group_mass, members,
+                        (high - low) / group_mass * 1e6)
+
+
+def annotate_groups(groups, data_base, ppm=5.0):
+    '''
+    Objective: one database lookup per group: compounds whose neutral mass ('Monoisotopic Molecular Weight',
+    third column) is within ppm of the group neutral mass
+    return: object array of ';'-joined compound names per group, '' where nothing matches
+    '''
+    result = np.full(len(groups), '', dtype=object)
+    if not len(groups):
+        return result
+    names = np.array([str(v) for v in data_base.iloc[:, 0]], dtype=object)
+    index = _ColumnIndex(data_base.iloc[:, 2].to_numpy(dtype=float))
+    query, rows, _ = DatabaseIndex._candidates(index, groups.group_mass, ppm / 1e6, -ppm / 1e6)
+    order = np.lexsort((rows, query))
+    query, rows = query[order], rows[order]
+    if len(query):
+        bounds = np.flatnonzero(np.diff(query)) + 1
+        for position, hit in zip(query[np.r_[0, bounds]], np.split(rows, bounds)):
+            result[position] = ';'.join(names[hit])
+    return result
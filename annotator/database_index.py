@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+from loguru import logger
+from ..tools.table_io import read_table
+
+
+class _ColumnIndex(object):
+    # 一个加合物列：按 m/z 排序的数据库值及其原始行号
+    def __init__(self, values):
+        values = np.asarray(values, dtype=float)
+        positive = np.flatnonzero(np.isfinite(values) & (values > 0))
+        self.order = positive[np.argsort(values[positive], kind='stable')]
+        self.sorted = values[self.order]
+        # 非正值不满足单调性，单独按原公式比较（通常为空）
+        self.other = np.flatnonzero(~np.isnan(values) & ~(values > 0))
+        self.values = values
+
+
+class DatabaseIndex(object):
+    """
+    Sorted in-memory index of an annotation database (the Annotator layout: compound name in the first
+    column, adduct m/z columns from the fifth column on).
+    A database m/z 'base' annotates a measured m/z when low_limit_ppm < (base - mz) / base * 1e6 < up_limit_ppm,
+    i.e. base lies in an interval around mz: the candidates of every query are found with two binary searches
+    and then checked with the same formula as Annotator.Annotator_ele, so the results are identical.
+    Built once, the index answers a query in O(log n) per adduct column instead of scanning the database.
+    """
+    def __init__(self, data_base):
+        self._data_base = data_base
+        self._names = np.array([str(v) for v in data_base.iloc[:, 0]], dtype=object)
+        self._adducts = [str(v) for v in data_base.columns[4:]]
+        self._columns = [_ColumnIndex(data_base.iloc[:, i].to_numpy(dtype=float))
+                         for i in range(4, data_base.shape[1])]
+        self._adduct_array = np.array(self._adducts, dtype=object)
+        # 所有加合物列合并成一个有序数组，单张谱图只需一次二分查找
+        values = data_base.iloc[:, 4:].to_numpy(dtype=float).ravel(order='F')
+        self._flat = _ColumnIndex(values)
+        self._n_rows = max(len(self._names), 1)
+        logger.info('database index: {} compounds x {} adduct columns', len(self._names), len(self._adducts))
+
+    @classmethod
+    def read(cls, path, sheet_name=0):
+        '''
+        Objective: prepare the index of a database file (any table_io format)
+        '''
+        return cls(read_table(path, sheet_name=sheet_name))
+
+    @staticmethod
+    def _candidates(index, mz, up, low):
+        # (query position, index.values 下标)：按 m/z 区间二分查找，再用 Annotator 的不等式精确判定
+        with np.errstate(divide='ignore', invalid='ignore'):
+            lower = mz / (1 - low) if low < 1 else np.full(len(mz), -np.inf)
+            upper = mz / (1 - up) if up < 1 else np.full(len(mz), np.inf)
+        lower = np.where(np.isnan(mz), np.inf, lower)
+        left = np.searchsorted(index.sorted, lower * (1 - 1e-12), side='left')
+        right = np.searchsorted(index.sorted, upper * (1 + 1e-12), side='right')
+        counts = np.maximum(right - left, 0)
+        query = np.repeat(np.arange(len(mz)), counts)
+        position = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(left, counts)
+        values = index.order[position]
+        if len(index.other):
+            other_query, other_values = np.nonzero(np.ones((len(mz), len(index.other)), dtype=bool))
+            query = np.r_[query, other_query]
+            values = np.r_[values, index.other[other_values]]
+        base = index.values[values]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rel = (base - mz[query]) / base
+        keep = (rel < up) & (rel > low)
+        return query[keep], values[keep], rel[keep]
+
+    def hits(self, column, mz, up_limit_ppm=10, low_limit_ppm=-10):
+        '''
+        Objective: database rows matching every measured m/z in one adduct column
+        return: (query position, database row) arrays, rows ascending within each query
+        '''
+        mz = np.atleast_1d(np.asarray(mz, dtype=float))
+        up, low = up_limit_ppm / 1e6, low_limit_ppm / 1e6
+        if not len(mz) or up <= low:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        query, rows, _ = self._candidates(self._columns[column], mz, up, low)
+        order = np.lexsort((rows, query))
+        return query[order], rows[order]
+
+    def annotate_column(self, column, mz, up_limit_ppm=10, low_limit_ppm=-10):
+        '''
+        return: object array of ';'-joined compound names per m/z, '' where nothing matches
+        '''
+        mz = np.atleast_1d(np.asarray(mz, dtype=float))
+        query, rows = self.hits(column, mz, up_limit_ppm, low_limit_ppm)
+        result = np.full(len(mz), '', dtype=object)
+        if len(query):
+            bounds = np.flatnonzero(np.diff(query)) + 1
+            for position, hit in zip(query[np.r_[0, bounds]], np.split(rows, bounds)):
+                result[position] = ';'.join(self._names[hit])
+        return result
+
+    def annotate(self, mz, up_limit_ppm=10, low_limit_ppm=-10, mz_column='m/z'):
+        '''
+        Objective: annotate measured m/z values against every adduct column
+        return: DataFrame in the Annotator output layout (m/z, one column per adduct, 'total')
+        '''
+        mz = np.atleast_1d(np.asarray(mz, dtype=float))
+        result = pd.DataFrame({mz_column: mz})
+        for column, adduct in enumerate(self._adducts):
+            result[adduct] = self.annotate_column(column, mz, up_limit_ppm, low_limit_ppm)
+        cells = result[self._adducts].to_numpy(dtype=object)
+        result['total'] = ['/'.join([';'.join([v, c]) for v, c in zip(row, self._adducts) if v != ''])
+                           for row in cells]
+        return result
+
+    def pairs(self, mz, up_limit_ppm=10, low_limit_ppm=-10):
+        '''
+        Objective: all matches of match_spectrum, unordered and without row / adduct split
+        return: (peak, flat position = adduct column * len(self) + database row, ppm) arrays
+        '''
+        mz = np.atleast_1d(np.asarray(mz, dtype=np.float64))
+        up, low = up_limit_ppm / 1e6, low_limit_ppm / 1e6
+        if not len(mz) or up <= low:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0)
+        peak, values, rel = self._candidates(self._flat, mz, up, low)
+        return peak, values, rel * 1e6
+
+    def match_spectrum(self, mz, intensity=None, up_limit_ppm=10, low_limit_ppm=-10):
+        '''
+        Objective: low-latency annotation of one spectrum, arrays in and arrays out (no file or DataFrame)
+        Same matches as annotate(), searched in all adduct columns at once.
+        Input:
+            mz, intensity: 1-D arrays of the peaks (intensity optional)
+        return: (peak, row, adduct, ppm, intensity) arrays with one entry per match, ordered by peak,
+                adduct column and database row:
+                peak index into mz, database row (names[row]), adduct column (adducts[adduct]),
+                (database m/z - mz) / database m/z in ppm, peak intensity (None without intensity)
+        '''
+        peak, values, ppm = self.pairs(mz, up_limit_ppm, low_limit_ppm)
+        adducts, rows = np.divmod(values, self._n_rows)
+        order = np.lexsort((rows, adducts, peak))
+        peak, rows, adducts, ppm = peak[order], rows[order], adducts[order], ppm[order]
+        return peak, rows, adducts, ppm, None if intensity is None else np.asarray(intensity)[peak]
+
+    def __len__(self):
+        return len(self._names)
+
+    @property
+    def adducts(self):
+        return self._adducts
+    @property
+    def adduct_array(self):
+        return self._adduct_array
+    @property
+    def names(self):
+        return self._names
+    @property
+    def data_base(self):
+        return self._data_base
@@ -0,0 +1,138 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from loguru import logger
+from .database_index import DatabaseIndex, _ColumnIndex
+
+ELEMENTS_MASS_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'elements_mass.json')
+DECOY_METHODS = ('adduct', 'shift')
+# 真实加合物中常见的元素不用作诱饵加合物
+PLAUSIBLE_ELEMENTS = ('H', 'C', 'N', 'O', 'Na', 'K', 'Cl', 'e+', 'e-')
+
+
+def q_values(target_scores, decoy_scores, n_decoy_sets):
+    '''
+    Objective: target-decoy FDR and q-value of every target hit, a lower score being better
+    FDR(s) = (decoy hits with score <= s / n_decoy_sets) / (target hits with score <= s), at most 1;
+    the q-value of a hit is the smallest FDR of any threshold that accepts it.
+    return: (fdr, q) arrays in target order
+    '''
+    target_scores = np.asarray(target_scores, dtype=float)
+    order = np.argsort(target_scores, kind='stable')
+    scores = target_scores[order]
+    # 相同得分一起计数
+    n_target = np.searchsorted(scores, scores, side='right')
+    n_decoy = np.searchsorted(np.sort(np.asarray(decoy_scores, dtype=float)), scores, side='right')
+    fdr_sorted = np.minimum(n_decoy / float(max(n_decoy_sets, 1)) / np.maximum(n_target, 1), 1.0)
+    q_sorted = np.minimum.accumulate(fdr_sorted[::-1])[::-1]
+    fdr, q = np.empty(len(scores)), np.empty(len(scores))
+    fdr[order], q[order] = fdr_sorted, q_sorted
+    return fdr, q
+
+
+class DecoySearch(object):
+    """
+    Target-decoy annotation: the database m/z values and n_decoys decoy copies of them are put into one
+    sorted index (the DatabaseIndex flat layout with the decoy set as an extra, outermost dimension), so
+    the target and all decoy sets are searched with the same two binary searches per peak. Decoy hits
+    estimate how many target hits of a ppm error are chance matches: every target hit gets the FDR and
+    q-value of its absolute ppm error (see q_values).
+    Decoy methods:
+        adduct: every adduct column of a decoy set is the neutral mass ('Monoisotopic Molecular Weight',
+                third column) plus an implausible element instead of the real adduct (one element per column
+                and set, drawn without the usual adduct elements; the electron mass follows the column polarity)
+        shift:  every decoy set is the database shifted by a random mass offset of shift_range Da, either sign
+    """
+    def __init__(self, data_base, n_decoys=10, method='adduct', seed=0, shift_range=(5.0, 40.0),
+                 elements_mass_file=ELEMENTS_MASS_FILE):
+        if method not in DECOY_METHODS:
+            raise ValueError('Unknown decoy method %s, expected one of %s' % (method, ', '.join(DECOY_METHODS)))
+        self._index = data_base if isinstance(data_base, DatabaseIndex) else DatabaseIndex(data_base)
+        self._n_decoys = max(int(n_decoys), 1)
+        self._method = method
+        df = self._index.data_base
+        target = df.iloc[:, 4:].to_numpy(dtype=float)
+        self._n_rows, self._n_columns = target.shape
+        rng = np.random.default_rng(seed)
+        if method == 'adduct':
+            decoys = self._adduct_decoys(df, rng, elements_mass_file)
+        else:
+            offsets = rng.uniform(*shift_range, self._n_decoys) * rng.choice([-1.0, 1.0], self._n_decoys)
+            decoys = target[None, :, :] + offsets[:, None, None]
+        decoys[~(decoys > 0)] = np.nan
+        # 下标 = 集合 * (列数 * 行数) + 列 * 行数 + 行，集合 0 为真实数据库
+        values = np.r_[target.ravel(order='F'), decoys.transpose(0, 2, 1).ravel()]
+        self._combined = _ColumnIndex(values)
+        logger.info('decoy search: {} x {} database values, {} {} decoy sets', self._n_rows, self._n_columns,
+                    self._n_decoys, method)
+
+    def _adduct_decoys(self, df, rng, elements_mass_file):
+        with open(elements_mass_file, 'r', encoding='utf-8') as f:
+            ele_mass = json.load(f)['ele_mass']
+        elements = np.array([mass for name, mass in ele_mass.items() if name not in PLAUSIBLE_ELEMENTS])
+        neutral = df.iloc[:, 2].to_numpy(dtype=float)
+        electron = np.array([ele_mass['e-'] if str(name).endswith('-') else ele_mass['e+']
+                             for name in self._index.adducts])
+        decoys = np.empty((self._n_decoys, self._n_rows, self._n_columns))
+        for s in range(self._n_decoys):
+            picked = rng.choice(elements, self._n_columns, replace=self._n_columns > len(elements))
+            decoys[s] = neutral[:, None] + (picked + electron)[None, :]
+        return decoys
+
+    def search(self, mz, up_limit_ppm=10, low_limit_ppm=-10):
+        '''
+        Objective: target hits of every peak with their FDR and q-value, from one search of the combined index
+        return: dict of arrays, one entry per target hit ordered by peak, adduct column and database row:
+                peak, row, adduct, ppm, fdr, q; and the hit counts 'targets' and 'decoys' (all decoy sets)
+        '''
+        mz = np.atleast_1d(np.asarray(mz, dtype=np.float64))
+        up, low = up_limit_ppm / 1e6, low_limit_ppm / 1e6
+        if not len(mz) or up <= low:
+            peak, values, rel = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+        else:
+            peak, values, rel = DatabaseIndex._candidates(self._combined, mz, up, low)
+        decoy_set, rest = np.divmod(values, self._n_rows * self._n_columns)
+        adduct, row = np.divmod(rest, self._n_rows)
+        target = decoy_set == 0
+        ppm = rel * 1e6
+        fdr, q = q_values(np.abs(ppm[target]), np.abs(ppm[~target]), self._n_decoys)
+        peak, row, adduct, ppm = peak[target], row[target], adduct[target], ppm[target]
+        order = np.lexsort((row, adduct, peak))
+        result = {'peak': peak[order], 'row': row[order], 'adduct': adduct[order], 'ppm': ppm[order],
+                  'fdr': fdr[order], 'q': q[order], 'targets': int(target.sum()), 'decoys': int((~target).sum())}
+        logger.info('decoy search: {} target hits, {} decoy hits in {} sets, estimated FDR {:.3f}',
+                    result['targets'], result['decoys'], self._n_decoys,
+                    min(result['decoys'] / float(self._n_decoys) / result['targets'], 1.0) if result['targets'] else 0.0)
+        return result
+
+    def hits_table(self, mz, up_limit_ppm=10, low_limit_ppm=-10, mz_column='m/z', search=None):
+        '''
+        Objective: one row per target hit: m/z, compound, adduct, ppm error, FDR and q-value
+        search: result of search() for the same arguments, searched again when None
+        '''
+        mz = np.atleast_1d(np.asarray(mz, dtype=float))
+        if search is None:
+            search = self.search(mz, up_limit_ppm, low_limit_ppm)
+        return pd.DataFrame({mz_column: mz[search['peak']], 'compound': self._index.names[search['row']],
+                             'adduct': self._index.adduct_array[search['adduct']], 'ppm': search['ppm'],
+                             'fdr': search['fdr'], 'q_value': search['q']})
+
+    def peak_q_values(self, n_peaks, search):
+        '''
+        return: best (smallest) q-value of every peak, NaN for peaks without a hit
+        '''
+        best = np.full(n_peaks, np.inf)
+        np.minimum.at(best, search['peak'], search['q'])
+        best[np.isinf(best)] = np.nan
+        return best
+
+    @property
+    def index(self):
+        return self._index
+    @property
+    def n_decoys(self):
+        return self._n_decoys
+    @property
+    def method(self):
+        return self._method
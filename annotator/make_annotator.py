@@ -1,10 +1,17 @@
 import os,sys
 import numpy as np
 import pandas as pd
+from loguru import logger
+from ..tools.table_io import read_table, write_table, table_path, StreamingTableWriter
+from ..tools.progress import ProgressReporter
+from .database_index import DatabaseIndex
+from .decoy import DecoySearch
+from .adduct_groups import ADDUCT_TYPE_FILE, load_adducts, database_polarity, group_adducts, annotate_groups
 
 class Annotator(object):
     def __init__(self,msidata_path=None,basedata_path=None,output_path=None,
-                 database_sheet=0,msidata_sheet=0,up_limit_ppm=10,low_limit_ppm=-10):
+                 database_sheet=0,msidata_sheet=0,up_limit_ppm=10,low_limit_ppm=-10,
+                 streaming=False,chunk_size=10000):
         self.database_path = basedata_path
         self.msidata_path = msidata_path
         self.database_sheet = database_sheet
@@ -12,38 +19,239 @@ class Annotator(object):
         self.output_path = output_path
         self.up_limit_ppm = up_limit_ppm
         self.low_limit_ppm = low_limit_ppm
+        self.reader = read_table
+        self.streaming = streaming
+        self.chunk_size = chunk_size
+        # progress_callback(ProgressEvent)，抛出 JobCancelled 即停止
+        self.progress_callback = None
+        # tools.result_cache.ResultCache，None 表示不缓存
+        self.result_cache = None
+        # 诱饵数据库组数，0 表示不估计 FDR
+        self.decoy_sets = 0
+        self.decoy_method = 'adduct'
+        self.hits = None
+        self._peak_q = None
+        # 按推断的中性质量对加合物峰分组，adduct_type_file 为 None 时使用 database/adduct_type.json
+        self.adduct_grouping = False
+        self.adduct_type_file = None
+        self.group_ppm = None
+        self.groups = None
+        self._peak_groups = None
     
+    def _cache_key(self, **inputs):
+        # 流式输出不在内存中保留结果，不缓存
+        if self.result_cache is None or not self.result_cache.enabled or self.streaming:
+            return None
+        if self.adduct_grouping:
+            # 加合物表按文件内容（修改时间与大小）计入键值，默认表也一样
+            inputs['files'] = list(inputs.get('files', [])) + [self.adduct_type_file or ADDUCT_TYPE_FILE]
+        return self.result_cache.key('annotation', params={'up_limit_ppm': self.up_limit_ppm,
+                                                           'low_limit_ppm': self.low_limit_ppm,
+                                                           'decoy_sets': self.decoy_sets,
+                                                           'decoy_method': self.decoy_method,
+                                                           'adduct_grouping': self.adduct_grouping,
+                                                           'group_ppm': self.group_ppm}, **inputs)
+
+    def _side_tables(self):
+        # 与注释一起写出的附加表 {输出后缀: DataFrame}
+        tables = {}
+        if self.decoy_sets and self.hits is not None:
+            tables['hits'] = self.hits
+        if self.adduct_grouping and self.groups is not None:
+            tables['groups'] = self.groups
+        return tables
+
+    def _output_paths(self):
+        return [self.output_path] + [table_path(self.output_path,suffix) for suffix in self._side_tables()]
+
+    def _from_cache(self, key):
+        # 缓存条目：{'annotation': 注释表, 'hits': 诱饵检索结果, 'groups': 加合物分组}
+        entry = self.result_cache.get(key) if key is not None else None
+        if not isinstance(entry, dict):
+            return False
+        self.Annotator = entry['annotation']
+        self.hits = entry.get('hits')
+        self.groups = entry.get('groups')
+        if self.output_path:
+            if not self.result_cache.output_current(key, self.output_path):
+                self._write_output()
+            for suffix, table in self._side_tables().items():
+                path = table_path(self.output_path,suffix)
+                if not self.result_cache.output_current(key, path):
+                    write_table(table,path)
+            self.result_cache.record_output(key, self._output_paths())
+        return True
+
     def make_annotator(self):
-        self.data_base = pd.read_excel(self.database_path,engine='openpyxl',sheet_name=self.database_sheet)
-        self.msi_data = pd.read_excel(self.msidata_path,engine='openpyxl',sheet_name=self.msidata_sheet)
+        # 输入文件与参数未变时直接返回缓存结果，不读取文件
+        key = self._cache_key(files=[(self.database_path, self.database_sheet),
+                                     (self.msidata_path, self.msidata_sheet)])
+        if self._from_cache(key):
+            return self.Annotator
+        progress = ProgressReporter(self.progress_callback,'annotation')
+        progress.start('read',2)
+        self.data_base = self.reader(self.database_path,sheet_name=self.database_sheet)
+        progress.update(1)
+        self.msi_data = self.reader(self.msidata_path,sheet_name=self.msidata_sheet)
+        progress.finish()
+        return self._annotate(key)
 
-        base_row, base_col = self.data_base.shape
-        msi_row, msi_col = self.msi_data.shape
+    def annotate(self, msi_data=None, data_base=None):
+        '''
+        Objective: annotate in-memory tables (the current msi_data / data_base when not given)
+        return: annotation DataFrame, written to output_path when it is set; None when streamed
+        '''
+        if msi_data is not None:
+            self.msi_data = msi_data
+        if data_base is not None:
+            self.data_base = data_base
+        key = self._cache_key(frames=[self.msi_data, self.data_base])
+        if self._from_cache(key):
+            return self.Annotator
+        return self._annotate(key)
+
+    def _write_output(self):
+        progress = ProgressReporter(self.progress_callback,'annotation')
+        progress.start('write',len(self.Annotator))
+        write_table(self.Annotator,self.output_path)
+        progress.finish()
 
-        self.Annotator = pd.DataFrame(np.zeros((msi_row,base_col-2),dtype=np.str_))
-        self.Annotator.columns = np.r_[[self.msi_data.columns[0]],self.data_base.columns[4:].to_numpy(),['total']]
-        self.Annotator[self.Annotator.columns[0]] = self.msi_data.iloc[:,0]
+    def estimate_fdr(self):
+        '''
+        Objective: target-decoy search of the MSI m/z against the database and decoy_sets decoy sets
+        (DecoySearch): per-hit FDR / q-values in self.hits, the best q-value of every peak is added to the
+        annotation as the 'q_value' column; the hits are written to <output stem>_hits<ext> with the output
+        return: hits DataFrame
+        '''
+        progress = ProgressReporter(self.progress_callback,'annotation')
+        progress.start('index',1)
+        decoy = DecoySearch(self.data_base,n_decoys=self.decoy_sets,method=self.decoy_method)
+        mz = self.msi_data.iloc[:,0].to_numpy(dtype=float)
+        search = decoy.search(mz,self.up_limit_ppm,self.low_limit_ppm)
+        self.hits = decoy.hits_table(mz,self.up_limit_ppm,self.low_limit_ppm,
+                                     mz_column=self.msi_data.columns[0],search=search)
+        self._peak_q = decoy.peak_q_values(len(mz),search)
+        progress.finish()
+        if self.output_path:
+            write_table(self.hits,table_path(self.output_path,'hits'))
+        return self.hits
 
-        [self.Annotator_ele(i,j) for i in range(4,base_col) for j in range(msi_row)]
+    def group_adducts(self):
+        '''
+        Objective: group the MSI peaks that are different adducts of one neutral mass (group_adducts, deltas
+        of the database polarity from adduct_type_file) and look every group mass up once in the database
+        neutral masses; the adduct_group / inferred_adduct / neutral_mass / group_annotation columns are added
+        to the annotation and the groups are written to <output stem>_groups<ext> with the output
+        return: groups DataFrame
+        '''
+        progress = ProgressReporter(self.progress_callback,'annotation')
+        progress.start('index',1)
+        ppm = self.group_ppm or max(abs(self.up_limit_ppm),abs(self.low_limit_ppm))
+        adducts = load_adducts(self.adduct_type_file,database_polarity(self.data_base))
+        mz = self.msi_data.iloc[:,0].to_numpy(dtype=float)
+        intensity = None
+        if self.msi_data.shape[1] > 1 and pd.api.types.is_numeric_dtype(self.msi_data.iloc[:,1]):
+            intensity = self.msi_data.iloc[:,1].to_numpy(dtype=float)
+        groups = group_adducts(mz,adducts,ppm=ppm,intensity=intensity)
+        annotation = annotate_groups(groups,self.data_base,ppm=ppm)
+        self._peak_groups = groups.peak_table(annotation)
+        self.groups = groups.to_frame(mz,annotation)
+        progress.finish()
+        if self.output_path:
+            write_table(self.groups,table_path(self.output_path,'groups'))
+        return self.groups
 
-        for i in range(msi_row):
-            str2adduct = ''
-            str3adduct = ''
-            for j in range(1,base_col-3):
-                if self.Annotator.iloc[i,j] != '':
-                    str2adduct = ';'.join([str(self.Annotator.iloc[i,j]),self.Annotator.columns[j]])
-                    str3adduct = '/'.join([str3adduct,str2adduct]) if str3adduct else str2adduct
-                    self.Annotator.iloc[i,base_col-3] = str3adduct
+    def _annotate(self, key=None):
+        self._peak_q = None
+        self.hits = None
+        self.groups = None
+        self._peak_groups = None
+        if self.decoy_sets:
+            self.estimate_fdr()
+        if self.adduct_grouping:
+            self.group_adducts()
+        if self.streaming:
+            # 边计算边写出，结果不在内存中保留
+            with StreamingTableWriter(self.output_path) as writer:
+                writer.add_table('Sheet1')
+                for chunk in self.iter_annotator():
+                    writer.write_frame(chunk)
+            logger.info('Annotation streamed to {} ({} rows)', self.output_path, writer.rows_written)
+            self.Annotator = None
+            return self.Annotator
 
-        self.Annotator.to_excel(self.output_path,index=False)
+        self.Annotator = pd.concat(list(self.iter_annotator()),ignore_index=True)
+        if self.output_path:
+            self._write_output()
+        if key is not None:
+            self.result_cache.put(key,{'annotation': self.Annotator, 'hits': self.hits,
+                                         'groups': self.groups})
+            if self.output_path:
+                self.result_cache.record_output(key,self._output_paths())
         return self.Annotator
 
+    def prepare(self, data_base=None):
+        '''
+        Objective: database index for in-memory spectrum annotation (DatabaseIndex.match_spectrum),
+        from data_base, the current data_base or the database file
+        '''
+        if data_base is None:
+            data_base = getattr(self, 'data_base', None)
+        if data_base is None:
+            data_base = self.reader(self.database_path, sheet_name=self.database_sheet)
+        self.data_base = data_base
+        return DatabaseIndex(data_base)
+
+    def iter_annotator(self):
+        '''
+        Objective: annotate the MSI data block by block
+        return: generator of annotation DataFrames of at most chunk_size rows
+        '''
+        base_row, base_col = self.data_base.shape
+        msi_row, msi_col = self.msi_data.shape
+        self._names = np.array([str(v) for v in self.data_base.iloc[:,0]],dtype=object)
+        columns = np.r_[[self.msi_data.columns[0]],self.data_base.columns[4:].to_numpy(),['total']]
+        # 控制 (MSI行 x 数据库行) 比较矩阵的大小
+        step = max(1,min(self.chunk_size,int(4e6//max(base_row,1))))
+
+        progress = ProgressReporter(self.progress_callback,'annotation')
+        progress.start('compute',msi_row)
+        for start in range(0,max(msi_row,1),step):
+            progress.update(start)
+            stop = min(start+step,msi_row)
+            chunk = pd.DataFrame(np.zeros((stop-start,base_col-2),dtype=np.str_))
+            chunk.columns = columns
+            chunk[columns[0]] = self.msi_data.iloc[start:stop,0].to_numpy()
+            for i in range(4,base_col):
+                chunk[columns[i-3]] = self.Annotator_ele(i,slice(start,stop))
+
+            cells = chunk.iloc[:,1:base_col-3].to_numpy(dtype=object)
+            adducts = columns[1:base_col-3]
+            chunk[columns[-1]] = ['/'.join([';'.join([str(v),c]) for v,c in zip(row,adducts) if v != ''])
+                                  for row in cells]
+            if self._peak_q is not None:
+                chunk['q_value'] = self._peak_q[start:stop]
+            if self._peak_groups is not None:
+                for name in self._peak_groups.columns:
+                    chunk[name] = self._peak_groups[name].to_numpy()[start:stop]
+            yield chunk
+        progress.finish()
+
     def Annotator_ele(self,i,j):
-        index = np.nonzero(
-            (((self.data_base.iloc[:,i] - self.msi_data.iloc[j,0])/self.data_base.iloc[:,i]).to_numpy() < self.up_limit_ppm/1e6) &
-            (((self.data_base.iloc[:,i] - self.msi_data.iloc[j,0])/self.data_base.iloc[:,i]).to_numpy() > self.low_limit_ppm/1e6))
-        if len(index[0]):
-            self.Annotator.iloc[j,i-3] = ';'.join([str(v) for v in self.data_base.iloc[index[0],0]])
+        '''
+        Objective: match MSI rows j (a row index or a slice) against database column i
+        return: array of ';'-joined compound names, '' where nothing falls in the ppm window
+        '''
+        base = self.data_base.iloc[:,i].to_numpy(dtype=float)
+        mz = np.atleast_1d(np.asarray(self.msi_data.iloc[j,0],dtype=float))
+        rel = (base[None,:] - mz[:,None])/base[None,:]
+        rows, cols = np.nonzero((rel < self.up_limit_ppm/1e6) & (rel > self.low_limit_ppm/1e6))
+        result = np.full(len(mz),'',dtype=object)
+        if len(rows):
+            bounds = np.flatnonzero(np.diff(rows)) + 1
+            for row, hit in zip(rows[np.r_[0,bounds]],np.split(cols,bounds)):
+                result[row] = ';'.join(self._names[hit])
+        return result
 
     @property
     def database_path(self):
@@ -87,6 +295,29 @@ class Annotator(object):
     def database_sheet(self, value):
         self._database_sheet = value
     
+    @property
+    def streaming(self):
+        '''write the result chunk by chunk instead of keeping it in memory'''
+        return self._streaming
+    @streaming.setter
+    def streaming(self, value):
+        self._streaming = value
+
+    @property
+    def chunk_size(self):
+        return self._chunk_size
+    @chunk_size.setter
+    def chunk_size(self, value):
+        self._chunk_size = value
+
+    @property
+    def reader(self):
+        '''table reader called as reader(path, sheet_name=...), e.g. DatasetCache.read'''
+        return self._reader
+    @reader.setter
+    def reader(self, value):
+        self._reader = value
+
     @property
     def msidata_sheet(self):
         return self._msidata_sheet
@@ -0,0 +1,77 @@
+import numpy as np
+from loguru import logger
+from .database_index import DatabaseIndex
+
+
+def error_summary(errors, low, up, bins=40, sums=None):
+    '''
+    Objective: statistics and histogram of ppm errors inside (low, up)
+    Input:
+        errors: ascending ppm errors, all inside (low, up)
+        sums: (sum, sum of squares) of errors when known, e.g. from prefix sums
+    return: dict with count, avg, median, std, min, max (None when empty) and histogram (counts, edges)
+    '''
+    n = len(errors)
+    total, total_sq = (errors.sum(), np.square(errors).sum()) if sums is None else sums
+    summary = {'count': int(n), 'avg': None, 'median': None, 'std': None, 'min': None, 'max': None}
+    if n:
+        summary['avg'] = float(total / n)
+        summary['median'] = float(errors[n // 2] if n % 2 else (errors[n // 2 - 1] + errors[n // 2]) / 2)
+        summary['min'], summary['max'] = float(errors[0]), float(errors[-1])
+    if n > 1:
+        summary['std'] = float(np.sqrt(max(total_sq - total * total / n, 0) / (n - 1)))
+    # 已排序：每个分箱的计数由两次二分查找得到
+    edges = np.linspace(low, up, bins + 1) if up > low else np.zeros(bins + 1)
+    summary['histogram'] = (np.diff(np.searchsorted(errors, edges, side='left')), edges)
+    return summary
+
+
+class AnnotationPreview(object):
+    """
+    Live preview of the annotation for changing ppm limits.
+    All (peak, database m/z) pairs within the widest window seen so far are searched once with the
+    DatabaseIndex and sorted by ppm error, with prefix sums of the errors. A preview for limits inside
+    that window is two binary searches, O(1) statistics, one binary search per histogram bin and one
+    pass over the peaks of the window for the annotated peak count. A wider window triggers one new search.
+    """
+    def __init__(self, data_base, mz, window_ppm=50):
+        self._index = data_base if isinstance(data_base, DatabaseIndex) else DatabaseIndex(data_base)
+        self._mz = np.asarray(mz, dtype=float)
+        self._annotated = np.zeros(len(self._mz), dtype=bool)
+        self._search(-abs(window_ppm), abs(window_ppm))
+
+    def _search(self, low, up):
+        # 略微放宽窗口，保证边界上的候选不丢失
+        low, up = low - 1e-6, up + 1e-6
+        peak, _, ppm = self._index.pairs(self._mz, up, low)
+        order = np.argsort(ppm, kind='stable')
+        self._peak, self._ppm = peak[order], ppm[order]
+        self._cumsum = np.r_[0.0, np.cumsum(self._ppm)]
+        self._cumsum_sq = np.r_[0.0, np.cumsum(np.square(self._ppm))]
+        self._window = (low, up)
+        logger.debug('annotation preview: {} candidates in {:.1f} to {:.1f} ppm', len(self._peak), low, up)
+
+    def summary(self, up_limit_ppm, low_limit_ppm, bins=40):
+        '''
+        return: dict with peaks, annotated (peaks with at least one match), matches and the ppm error summary
+        '''
+        if low_limit_ppm < self._window[0] or up_limit_ppm > self._window[1]:
+            self._search(min(low_limit_ppm, self._window[0]), max(up_limit_ppm, self._window[1]))
+        # Annotator 的判定为严格不等式 low < ppm < up
+        lo = np.searchsorted(self._ppm, low_limit_ppm, side='right')
+        hi = max(np.searchsorted(self._ppm, up_limit_ppm, side='left'), lo)
+        sums = (self._cumsum[hi] - self._cumsum[lo], self._cumsum_sq[hi] - self._cumsum_sq[lo])
+        summary = error_summary(self._ppm[lo:hi], low_limit_ppm, up_limit_ppm, bins, sums)
+        self._annotated[:] = False
+        self._annotated[self._peak[lo:hi]] = True
+        summary['peaks'] = len(self._mz)
+        summary['matches'] = summary['count']
+        summary['annotated'] = int(self._annotated.sum())
+        return summary
+
+    @property
+    def index(self):
+        return self._index
+    @property
+    def window(self):
+        return self._window
@@ -0,0 +1,4 @@
+from .suite import BenchmarkSuite, compare_results, load_results, save_results
+from . import synthetic
+
+__all__ = ['BenchmarkSuite', 'compare_results', 'load_results', 'save_results', 'synthetic']
\ No newline at end of file
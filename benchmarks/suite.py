@@ -0,0 +1,280 @@
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+import tempfile
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from loguru import logger
+from ..tools.table_io import read_table, write_table, EXCEL_MAX_ROWS
+from ..molar_mass.cal_molar_mass import MolarMassCalculator
+from ..match.compound_match import CompoundMatch
+from ..annotator.make_annotator import Annotator
+from ..annotator.database_index import DatabaseIndex
+from . import synthetic
+
+CASES = ('compound_split', 'find_all', 'find_once', 'annotator', 'database_index', 'table_io', 'consensus_peaks')
+FORMATS = ('.csv', '.parquet', '.feather', '.xlsx')
+DEFAULT_SIZES = ('1k', '10k', '100k')
+
+
+def git_commit(path=None):
+    '''
+    Objective: short hash of the checked-out commit of the repository containing path, None outside git
+    '''
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                             cwd=path or os.path.dirname(os.path.dirname(os.path.abspath(__file__))), timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def best_time(fn, repeat=3):
+    '''
+    Objective: best wall time of repeat calls of fn()
+    return: (seconds, result of the last call)
+    '''
+    best, result = np.inf, None
+    for _ in range(max(repeat, 1)):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+# ---- 暴力参考实现：逐个元素比较，不使用排序或向量化的快速路径 ----
+
+def reference_nearest(source_mz, intensity, theoretical, tolerance, threshold):
+    '''
+    Objective: CompoundMatch.find_once by a full scan: closest source m/z (first row on ties), accepted
+    when within tolerance and above the intensity threshold
+    '''
+    rel = np.abs((source_mz - theoretical) / theoretical)
+    rel = np.where(np.isnan(rel), np.inf, rel)
+    row = int(np.argmin(rel))
+    if not np.isfinite(rel[row]) or rel[row] >= tolerance or intensity[row] <= threshold:
+        return np.nan
+    return source_mz[row]
+
+
+def reference_annotation(mz, data_base, up_limit_ppm, low_limit_ppm):
+    '''
+    Objective: Annotator cells of one peak by looping over every database row of every adduct column
+    return: list of ';'-joined names, one per adduct column
+    '''
+    names = [str(v) for v in data_base.iloc[:, 0]]
+    cells = []
+    for i in range(4, data_base.shape[1]):
+        hits = []
+        for name, base in zip(names, data_base.iloc[:, i].to_numpy(dtype=float)):
+            rel = (base - mz) / base
+            if low_limit_ppm / 1e6 < rel < up_limit_ppm / 1e6:
+                hits.append(name)
+        cells.append(';'.join(hits))
+    return cells
+
+
+class BenchmarkSuite(object):
+    """
+    Times the engines on deterministic synthetic data (benchmarks.synthetic) across sizes and table formats
+    and checks every fast path against a brute-force reference on a random sample of check_size items.
+    The size of a case is its main dimension: formulas (compound_split), source peaks (find_all, find_once;
+    find_all matches size / 10 targets, find_once 1000 targets one by one), MSI peaks against a database of
+    database_size compounds (annotator, database_index), table rows (table_io, per format) and total peaks
+    of an imaging data set of 100 peaks per pixel (consensus_peaks).
+    """
+    def __init__(self, sizes=DEFAULT_SIZES, cases=CASES, formats=FORMATS, database_size=1000,
+                 repeat=3, check=True, check_size=100, seed=0):
+        self.sizes = [synthetic.parse_size(v) for v in sizes]
+        self.cases = list(cases)
+        self.formats = list(formats)
+        self.database_size = database_size
+        self.repeat = repeat
+        self.check = check
+        self.check_size = check_size
+        self.seed = seed
+        self.results = []
+        unknown = set(self.cases) - set(CASES)
+        if unknown:
+            raise ValueError('unknown benchmark cases: %s' % ', '.join(sorted(unknown)))
+
+    def _sample(self, n):
+        rng = np.random.default_rng(self.seed + 7)
+        return np.sort(rng.choice(n, min(n, self.check_size), replace=False))
+
+    def _record(self, case, size, seconds, check, fmt=None, **params):
+        record = {'case': case, 'size': size, 'format': fmt, 'seconds': round(seconds, 6),
+                  'items_per_s': round(size / seconds, 1) if seconds > 0 else None, 'check': check}
+        record.update(params)
+        self.results.append(record)
+        logger.info('benchmark {} {}{}: {:.4f} s, check {}', case, size, ' ' + fmt if fmt else '', seconds,
+                    {True: 'ok', False: 'FAILED', None: '-'}[check])
+        return record
+
+    def bench_compound_split(self, size, workdir):
+        library, counts = synthetic.formula_library(size, seed=self.seed)
+        adduct_file = synthetic.write_adduct_table(synthetic.adduct_table(), os.path.join(workdir, 'adducts.json'))
+        calculator = MolarMassCalculator(elements_mass_file=synthetic.ELEMENTS_MASS_FILE, adduct_type_file=adduct_file)
+        seconds, frames = best_time(lambda: calculator.calculate(df=library), self.repeat)
+        check = None
+        if self.check:
+            expected = counts @ synthetic.element_masses()
+            found = frames['positive']['Monoisotopic Molecular Weight'].to_numpy(dtype=float)
+            check = bool(np.allclose(found, expected, rtol=0, atol=1e-6))
+        return self._record('compound_split', size, seconds, check)
+
+    def _compound_match(self, size):
+        source = synthetic.peak_list(size, seed=self.seed)
+        compound_match = CompoundMatch(source, synthetic.target_list(source, max(size // 10, 10), seed=self.seed))
+        compound_match.intensity_threshold = float(np.median(source['Intensity']))
+        return compound_match
+
+    def _check_nearest(self, compound_match, theoretical, measured):
+        source_mz = compound_match.df_source[compound_match.source_mz].to_numpy(dtype=float)
+        intensity = compound_match.df_source[compound_match.source_intensity].to_numpy(dtype=float)
+        sample = self._sample(len(theoretical))
+        expected = np.array([reference_nearest(source_mz, intensity, theoretical[i], compound_match.mz_tolerance,
+                                               compound_match.intensity_threshold) for i in sample])
+        return bool(np.array_equal(measured[sample], expected, equal_nan=True))
+
+    def bench_find_all(self, size, workdir):
+        compound_match = self._compound_match(size)
+        theoretical = compound_match.df_target[compound_match.target_mz].to_numpy(dtype=float)
+        seconds, measured = best_time(lambda: compound_match.find_all(theoretical), self.repeat)
+        check = self._check_nearest(compound_match, theoretical, measured) if self.check else None
+        return self._record('find_all', size, seconds, check, targets=len(theoretical))
+
+    def bench_find_once(self, size, workdir):
+        compound_match = self._compound_match(size)
+        theoretical = compound_match.df_target[compound_match.target_mz].to_numpy(dtype=float)[:1000]
+        seconds, measured = best_time(lambda: np.array([compound_match.find_once(v) for v in theoretical]),
+                                      self.repeat)
+        check = self._check_nearest(compound_match, theoretical, measured) if self.check else None
+        return self._record('find_once', size, seconds, check, targets=len(theoretical))
+
+    def _annotation_inputs(self, size):
+        data_base = synthetic.database_table(self.database_size, seed=self.seed)
+        return data_base, synthetic.peak_list(size, data_base=data_base, seed=self.seed)
+
+    def _check_annotation(self, result, msi_data, data_base, annotator):
+        sample = self._sample(len(msi_data))
+        mz = msi_data.iloc[:, 0].to_numpy(dtype=float)
+        for i in sample:
+            expected = reference_annotation(mz[i], data_base, annotator.up_limit_ppm, annotator.low_limit_ppm)
+            if list(result.iloc[i, 1:1 + len(expected)]) != expected:
+                return False
+        return True
+
+    def bench_annotator(self, size, workdir):
+        data_base, msi_data = self._annotation_inputs(size)
+        annotator = Annotator()
+        seconds, result = best_time(lambda: annotator.annotate(msi_data, data_base), self.repeat)
+        check = self._check_annotation(result, msi_data, data_base, annotator) if self.check else None
+        return self._record('annotator', size, seconds, check, database_size=self.database_size)
+
+    def bench_database_index(self, size, workdir):
+        data_base, msi_data = self._annotation_inputs(size)
+        annotator = Annotator()
+        seconds, result = best_time(lambda: DatabaseIndex(data_base).annotate(
+            msi_data.iloc[:, 0], annotator.up_limit_ppm, annotator.low_limit_ppm,
+            mz_column=msi_data.columns[0]), self.repeat)
+        check = self._check_annotation(result, msi_data, data_base, annotator) if self.check else None
+        return self._record('database_index', size, seconds, check, database_size=self.database_size)
+
+    def bench_table_io(self, size, workdir):
+        df = synthetic.peak_list(size, seed=self.seed)
+        records = []
+        for ext in self.formats:
+            if ext in ('.xlsx', '.xls', '.xlsm') and size >= EXCEL_MAX_ROWS:
+                logger.info('benchmark table_io {} {}: skipped, above the Excel row limit', size, ext)
+                continue
+            path = os.path.join(workdir, 'table%s' % ext)
+            try:
+                write_seconds, _ = best_time(lambda: write_table(df, path), self.repeat)
+                read_seconds, back = best_time(lambda: read_table(path), self.repeat)
+            except ImportError as e:
+                logger.warning('benchmark table_io {}: skipped ({})', ext, e)
+                continue
+            check = bool(back.shape == df.shape and np.allclose(back.to_numpy(dtype=float), df.to_numpy(dtype=float),
+                                                                rtol=1e-12)) if self.check else None
+            records.append(self._record('table_write', size, write_seconds, None, fmt=ext,
+                                        file_mb=round(os.path.getsize(path) / 1024.0 ** 2, 3)))
+            records.append(self._record('table_read', size, read_seconds, check, fmt=ext))
+            os.remove(path)
+        return records
+
+    def bench_consensus_peaks(self, size, workdir):
+        from ..imaging.peak_alignment import consensus_peaks
+        spectra = synthetic.imaging_cube(max(size // 100, 1), peaks_per_pixel=100, seed=self.seed)
+        seconds, aligned = best_time(lambda: consensus_peaks(spectra, ppm=5), self.repeat)
+        return self._record('consensus_peaks', size, seconds, None, pixels=len(spectra), features=len(aligned))
+
+    def run(self):
+        '''
+        Objective: run every case at every size
+        return: result dict (see to_dict)
+        '''
+        started = time.perf_counter()
+        with tempfile.TemporaryDirectory(prefix='msidat_bench_') as workdir:
+            for case in self.cases:
+                for size in self.sizes:
+                    getattr(self, 'bench_' + case)(size, workdir)
+        failed = [r for r in self.results if r['check'] is False]
+        if failed:
+            logger.error('benchmark: {} results differ from the brute-force reference', len(failed))
+        logger.info('benchmark: {} results in {:.1f} s', len(self.results), time.perf_counter() - started)
+        return self.to_dict()
+
+    def to_dict(self):
+        return {
+            'commit': git_commit(),
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'settings': {'repeat': self.repeat, 'seed': self.seed, 'database_size': self.database_size,
+                         'check_size': self.check_size if self.check else 0},
+            'results': self.results,
+        }
+
+
+def save_results(results, directory='benchmark_results'):
+    '''
+    Objective: store a run as <directory>/<commit>_<date>.json for later comparison
+    return: file path
+    '''
+    os.makedirs(directory, exist_ok=True)
+    stamp = results['date'].replace(':', '').replace('-', '')
+    path = os.path.join(directory, '%s_%s.json' % (results.get('commit') or 'nogit', stamp))
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"Benchmark results saved to {path}")
+    return path
+
+
+def load_results(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare_results(baseline, current, tolerance=0.2):
+    '''
+    Objective: compare two runs case by case (same case, size and format)
+    Input: tolerance, relative slowdown reported as a regression (0.2: 20 % slower)
+    return: DataFrame with baseline / current seconds, ratio (current / baseline) and regression flag
+    '''
+    key = ['case', 'size', 'format']
+    old = pd.DataFrame(baseline['results'])[key + ['seconds']].fillna({'format': ''})
+    new = pd.DataFrame(current['results'])[key + ['seconds', 'check']].fillna({'format': ''})
+    table = old.merge(new, on=key, suffixes=('_baseline', '_current'))
+    table['ratio'] = table['seconds_current'] / table['seconds_baseline']
+    table['regression'] = table['ratio'] > 1 + tolerance
+    for row in table[table['regression']].itertuples():
+        logger.warning('regression {} {} {}: {:.4f} s -> {:.4f} s ({:.2f}x)', row.case, row.size, row.format,
+                       row.seconds_baseline, row.seconds_current, row.ratio)
+    return table
@@ -0,0 +1,142 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+DATABASE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database')
+ELEMENTS_MASS_FILE = os.path.join(DATABASE_DIR, 'elements_mass.json')
+
+# 合成分子式使用的元素及计数范围 [low, high)
+ELEMENTS = ('C', 'H', 'N', 'O', 'P', 'S')
+COUNT_RANGES = ((1, 60), (0, 120), (0, 10), (0, 20), (0, 3), (0, 3))
+
+
+def element_masses(path=ELEMENTS_MASS_FILE):
+    '''
+    Objective: monoisotopic masses of ELEMENTS from an elements mass file
+    return: float array in ELEMENTS order
+    '''
+    with open(path, 'r', encoding='utf-8') as f:
+        ele_mass = json.load(f)['ele_mass']
+    return np.array([ele_mass[e] for e in ELEMENTS], dtype=float)
+
+
+def parse_size(text):
+    '''
+    Objective: '1k', '250k', '10M' or '5000' -> int
+    '''
+    text = str(text).strip()
+    scale = {'k': 10 ** 3, 'm': 10 ** 6}.get(text[-1:].lower(), 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+def formula_library(n, seed=0, group_fraction=0.2):
+    '''
+    Objective: deterministic library of n molecular formulas for MolarMassCalculator
+    A group_fraction of the formulas carry a repeated group, e.g. C12H20O4(CH2)3, to exercise
+    the bracket handling of compound_split.
+    return: (DataFrame with 'Name' and 'Formula', element count array n x len(ELEMENTS) for the reference masses)
+    '''
+    rng = np.random.default_rng(seed)
+    counts = np.column_stack([rng.integers(low, high, n) for low, high in COUNT_RANGES])
+    repeat = np.where(rng.random(n) < group_fraction, rng.integers(2, 6, n), 0)
+    formulas = []
+    for row, k in zip(counts.tolist(), repeat.tolist()):
+        text = ''.join(e + ('' if c == 1 else str(c)) for e, c in zip(ELEMENTS, row) if c)
+        formulas.append(text + '(CH2)%d' % k if k else text)
+    # 括号基团计入元素总数
+    counts[:, 0] += repeat
+    counts[:, 1] += 2 * repeat
+    df = pd.DataFrame({'Name': ['cmp%d' % i for i in range(n)], 'Formula': formulas})
+    return df, counts
+
+
+def adduct_table(n_positive=6, n_negative=5, seed=0):
+    '''
+    Objective: adduct type table in the adduct_type.json layout ({'positve': {...}, 'negative': {...}})
+    The first entries are the shipped adducts, further ones get synthetic mass deltas.
+    '''
+    with open(os.path.join(DATABASE_DIR, 'adduct_type.json'), 'r', encoding='utf-8') as f:
+        shipped = json.load(f)
+    rng = np.random.default_rng(seed)
+    table = {}
+    for key, n in (('positve', n_positive), ('negative', n_negative)):
+        adducts = dict(list(shipped[key].items())[:n])
+        for i in range(len(adducts), n):
+            adducts['M+X%d' % i] = float(np.round(rng.uniform(-50, 100), 7))
+        table[key] = adducts
+    return table
+
+
+def write_adduct_table(table, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(table, f, indent=4)
+    return path
+
+
+def database_table(n, seed=0, adducts=None, polarity='positve'):
+    '''
+    Objective: annotation database of n compounds in the Annotator layout (name, formula,
+    'Monoisotopic Molecular Weight', 'ID', one m/z column per adduct), built from the reference masses
+    without running MolarMassCalculator, so it scales to millions of rows
+    '''
+    adducts = (adducts or adduct_table())[polarity]
+    library, counts = formula_library(n, seed=seed)
+    mass = counts @ element_masses()
+    df = library.copy()
+    df['Monoisotopic Molecular Weight'] = mass
+    df['ID'] = np.arange(1, n + 1)
+    sign = '+' if polarity == 'positve' else '-'
+    for adduct, delta in adducts.items():
+        df['[%s]%s' % (adduct, sign)] = mass + delta
+    return df
+
+
+def peak_list(n, data_base=None, hit_fraction=0.3, ppm=2.0, seed=0):
+    '''
+    Objective: centroided peak list ('m/z', 'Intensity') of n peaks
+    A hit_fraction of the peaks are database m/z values (fifth column on) shifted by N(0, ppm) ppm,
+    the rest is uniform over the same m/z range (100 - 1000 without a database).
+    '''
+    rng = np.random.default_rng(seed)
+    low, high = 100.0, 1000.0
+    mz = rng.uniform(low, high, n)
+    if data_base is not None:
+        values = data_base.iloc[:, 4:].to_numpy(dtype=float).ravel()
+        values = values[np.isfinite(values) & (values > 0)]
+        if len(values):
+            mz = rng.uniform(values.min(), values.max(), n)
+            hits = rng.random(n) < hit_fraction
+            mz[hits] = rng.choice(values, hits.sum()) * (1 + rng.normal(0, ppm, hits.sum()) * 1e-6)
+    intensity = np.round(rng.lognormal(8, 1.5, n), 1)
+    return pd.DataFrame({'m/z': mz, 'Intensity': intensity})
+
+
+def target_list(source, n, seed=0, hit_fraction=0.8, ppm=3.0):
+    '''
+    Objective: CompoundMatch target list ('Theoretical m/z') of n m/z values, a hit_fraction of them
+    within about ppm of a source peak
+    '''
+    rng = np.random.default_rng(seed + 1)
+    mz = source['m/z'].to_numpy(dtype=float)
+    theoretical = rng.uniform(mz.min(), mz.max(), n)
+    hits = rng.random(n) < hit_fraction
+    theoretical[hits] = rng.choice(mz, hits.sum()) * (1 + rng.normal(0, ppm, hits.sum()) * 1e-6)
+    return pd.DataFrame({'Name': ['std%d' % i for i in range(n)], 'Theoretical m/z': theoretical})
+
+
+def imaging_cube(n_pixels, peaks_per_pixel=100, n_features=None, ppm=1.0, seed=0):
+    '''
+    Objective: centroided imaging data set, a list of (m/z, intensity) arrays, one per pixel
+    Every pixel holds peaks_per_pixel of n_features shared ion m/z values (default 2 x peaks_per_pixel)
+    with N(0, ppm) ppm jitter, the input of imaging.consensus_peaks / align_peaks.
+    '''
+    rng = np.random.default_rng(seed)
+    n_features = n_features or 2 * peaks_per_pixel
+    features = np.sort(rng.uniform(100, 1000, n_features))
+    spectra = []
+    for _ in range(n_pixels):
+        mz = rng.choice(features, min(peaks_per_pixel, n_features), replace=False)
+        mz = np.sort(mz * (1 + rng.normal(0, ppm, len(mz)) * 1e-6))
+        spectra.append((mz, rng.lognormal(6, 1, len(mz))))
+    return spectra
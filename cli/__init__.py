@@ -0,0 +1,6 @@
+from .cli import main
+from .batch import run_batch, Manifest
+from .pipeline import load_config, build_database, evaluate_shift, recalibrate, annotate, run_pipeline
+
+__all__ = ['main', 'load_config', 'build_database', 'evaluate_shift', 'recalibrate', 'annotate', 'run_pipeline',
+           'run_batch', 'Manifest']
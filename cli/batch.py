@@ -0,0 +1,201 @@
+import os
+import glob
+import json
+import time
+import copy
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from loguru import logger
+from ..tools.table_io import read_table, SUPPORTED_EXTENSIONS, READ_ONLY_EXTENSIONS
+from ..tools.progress import ProgressReporter
+from . import pipeline
+
+TASKS = ('annotate', 'shift', 'pipeline')
+MANIFEST_NAME = 'manifest.json'
+
+# 工作进程共享的数据（数据库、目标表），每个进程只传入一次
+_shared = {}
+
+
+def find_inputs(patterns):
+    '''
+    Objective: expand directories (all supported table / imzML files in them) and glob patterns
+    return: sorted list of absolute paths without duplicates
+    '''
+    extensions = SUPPORTED_EXTENSIONS + READ_ONLY_EXTENSIONS
+    found = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            names = [os.path.join(pattern, v) for v in os.listdir(pattern)]
+            found.update(v for v in names if os.path.isfile(v) and v.lower().endswith(extensions)
+                         and not os.path.basename(v).startswith('~$'))
+        else:
+            found.update(v for v in glob.glob(pattern) if os.path.isfile(v))
+    return sorted(os.path.abspath(v) for v in found)
+
+
+def output_file(input_path, output_dir, task, ext):
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    suffix = {'annotate': 'annotation', 'shift': 'shift', 'pipeline': 'annotation'}[task]
+    return os.path.join(output_dir, '%s_%s%s' % (stem, suffix, ext))
+
+
+class Manifest(object):
+    """
+    Per-input record of a batch run (status, timings, output path, error), saved as JSON after
+    every finished job. A job is done when its status is 'done', the input file is unchanged
+    (size, mtime) and its output still exists; everything else is run again on resume.
+    """
+    def __init__(self, path):
+        self._path = path
+        self._jobs = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self._jobs = json.load(f).get('jobs', {})
+
+    @staticmethod
+    def _signature(input_path):
+        stat = os.stat(input_path)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def is_done(self, input_path, output_path):
+        job = self._jobs.get(input_path)
+        return bool(job) and job.get('status') == 'done' and job.get('output') == output_path \
+            and job.get('input') == self._signature(input_path) and os.path.exists(output_path)
+
+    def update(self, input_path, **fields):
+        job = self._jobs.setdefault(input_path, {})
+        job.update(fields)
+        job['input'] = self._signature(input_path)
+
+    def save(self):
+        # 先写临时文件再替换，中断时清单不会损坏
+        tmp = self._path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'jobs': self._jobs}, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, self._path)
+
+    def summary(self):
+        counts = {}
+        for job in self._jobs.values():
+            counts[job.get('status')] = counts.get(job.get('status'), 0) + 1
+        return counts
+
+    @property
+    def jobs(self):
+        return self._jobs
+    @property
+    def path(self):
+        return self._path
+
+
+def _init_worker(shared):
+    _shared.clear()
+    _shared.update(shared)
+
+
+def run_job(task, config, input_path, output_path):
+    '''
+    Objective: run one input file through a task with the shared database / target tables
+    return: dict with status, elapsed and cpu seconds, rows, shift statistics or error
+    '''
+    start, cpu_start = time.perf_counter(), time.process_time()
+    result = {'output': output_path}
+    try:
+        config = copy.deepcopy(config)
+        if task == 'shift':
+            section = config['CompoundMatch']
+            df_source = read_table(input_path, sheet_name=section.get('Source Sheet', 0))
+            section['Output File'] = output_path
+            compound_match = pipeline.evaluate_shift(config, df_source=df_source, write=True,
+                                                     df_target=_shared.get('target'))
+            result['rows'] = len(compound_match.df_output)
+            result['median_rel_error'] = float(compound_match.median_rel_error)
+        else:
+            msi_data = read_table(input_path, sheet_name=config['Annotator'].get('MSI Data Sheet', 0))
+            if task == 'annotate':
+                annotation = pipeline.annotate(config, msi_data=msi_data, data_base=_shared['database'],
+                                               output=output_path)
+            else:
+                recalibrate = 'target' in _shared
+                config.setdefault('Pipeline', {}).pop('Recalibrated File', None)
+                config['Pipeline']['Recalibrate'] = recalibrate
+                annotation = pipeline.run_pipeline(config, output=output_path, msi_data=msi_data,
+                                                   data_base=_shared['database'],
+                                                   df_source=msi_data if recalibrate else None,
+                                                   df_target=_shared.get('target'))
+            result['rows'] = len(msi_data) if annotation is None else len(annotation)
+        result['status'] = 'done'
+    except Exception as e:
+        logger.error(f"{os.path.basename(input_path)}: {str(e)}")
+        result['status'] = 'failed'
+        result['error'] = str(e)
+    result['elapsed'] = round(time.perf_counter() - start, 3)
+    result['cpu'] = round(time.process_time() - cpu_start, 3)
+    return result
+
+
+def run_batch(config, inputs, output_dir, task='annotate', n_jobs=None, manifest_path=None,
+              ext='.xlsx', force=False, progress_callback=None):
+    '''
+    Objective: run many input files through one task in a process pool
+        annotate: every input is an MSI data file, annotated against the Annotator database
+        shift:    every input is a CompoundMatch source file, matched against the target list
+        pipeline: every input is an MSI data file, its own shift is evaluated (against the target list,
+                  when the CompoundMatch section has a 'Target File'), corrected and annotated
+    The database (read from the Annotator 'Database File', or built when there is none) and the
+    target list are loaded once in this process and handed to every worker once.
+    Inputs recorded as finished in the manifest are skipped.
+    Input:
+        inputs: list of files, directories or glob patterns
+        n_jobs: worker processes, None for os.cpu_count(), 1 to run in this process
+        manifest_path: default <output_dir>/manifest.json
+        force: run every input again, ignoring the manifest
+        progress_callback: receives a ProgressEvent ('batch', 'compute', finished inputs) after every input
+    return: Manifest
+    '''
+    if task not in TASKS:
+        raise ValueError('Invalid batch task: %s' % task)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = Manifest(manifest_path or os.path.join(output_dir, MANIFEST_NAME))
+    files = find_inputs(inputs)
+    jobs = [(v, output_file(v, output_dir, task, ext)) for v in files]
+    todo = [job for job in jobs if force or not manifest.is_done(*job)]
+    logger.info('batch {}: {} inputs, {} done before, {} to run', task, len(jobs), len(jobs) - len(todo), len(todo))
+    if not todo:
+        return manifest
+
+    shared = {}
+    if task != 'shift':
+        shared['database'] = pipeline.load_database(
+            config, build=not config.get('Annotator', {}).get('Database File'), progress_callback=progress_callback)
+    if task == 'shift' or (task == 'pipeline' and config.get('CompoundMatch', {}).get('Target File')
+                           and config.get('Pipeline', {}).get('Recalibrate', True)):
+        shared['target'] = pipeline.read_target(config)
+    for input_path, output_path in todo:
+        manifest.update(input_path, status='pending', output=output_path)
+    manifest.save()
+
+    progress = ProgressReporter(progress_callback, 'batch', min_interval=0)
+    progress.start('compute', len(todo))
+
+    def finish(input_path, result, done):
+        manifest.update(input_path, finished=time.strftime('%Y-%m-%d %H:%M:%S'), **result)
+        manifest.save()
+        progress.update(done)
+        logger.info('batch {}/{}: {} {} ({:.1f} s)', done, len(todo), os.path.basename(input_path),
+                    result['status'], result['elapsed'])
+
+    n_jobs = n_jobs or os.cpu_count()
+    if n_jobs == 1:
+        _init_worker(shared)
+        for done, (input_path, output_path) in enumerate(todo, 1):
+            finish(input_path, run_job(task, config, input_path, output_path), done)
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(todo)), initializer=_init_worker,
+                                 initargs=(shared,)) as executor:
+            futures = {executor.submit(run_job, task, config, input_path, output_path): input_path
+                       for input_path, output_path in todo}
+            for done, future in enumerate(as_completed(futures), 1):
+                finish(futures[future], future.result(), done)
+    logger.info('batch {} finished: {}', task, manifest.summary())
+    return manifest
@@ -0,0 +1,111 @@
+import os
+import sys
+import argparse
+from loguru import logger
+from . import pipeline
+from . import batch as batch_module
+from ..tools.msidat_logger import setup_msidat_logger
+from ..tools.progress import log_progress
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='msidat', description='MSI data analysis without the GUI, driven by the GUI config.json')
+    parser.add_argument('-c', '--config', default=pipeline.DEFAULT_CONFIG,
+                        help='config file (default: database/config.json)')
+    parser.add_argument('--log-level', default='INFO', help='console log level (default: INFO)')
+    parser.add_argument('--no-log-files', action='store_true', help='do not write the rotating files under log/')
+    parser.add_argument('--log-performance', action='store_true',
+                        help='enqueued log sinks, INFO file level and no variable values in tracebacks')
+    parser.add_argument('--file-log-level', help='level of log/msidat.log (default: DEBUG, INFO with --log-performance)')
+    parser.add_argument('--progress', action='store_true', help='log phase, progress, throughput and ETA')
+    parser.add_argument('--progress-interval', type=float, default=2.0, metavar='SECONDS',
+                        help='at most one progress line every SECONDS (default: 2)')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    build = commands.add_parser('build', help='calculate the m/z database (MolarMassCalculator)')
+    build.add_argument('-o', '--output', help='output file, overrides "Output File"')
+
+    shift = commands.add_parser('shift', help='evaluate the mass shift (CompoundMatch)')
+    shift.add_argument('-o', '--output', help='output file, overrides "Output File"')
+
+    recalibrate = commands.add_parser('recalibrate',
+                                      help='evaluate the mass shift and correct the MSI data m/z by it')
+    recalibrate.add_argument('-o', '--output', required=True, help='recalibrated MSI data file')
+
+    annotate = commands.add_parser('annotate', help='annotate the MSI data (Annotator)')
+    annotate.add_argument('-o', '--output', help='output file, overrides "Output File"')
+
+    run = commands.add_parser('pipeline', help='build -> shift evaluation -> recalibration -> annotation')
+    run.add_argument('-o', '--output', help='annotation output file, overrides the Annotator "Output File"')
+    run.add_argument('--keep-intermediates', action='store_true',
+                     help='also write the output of every stage to its configured file')
+    run.add_argument('--no-recalibrate', action='store_true', help='skip shift evaluation and recalibration')
+
+    batch = commands.add_parser('batch', help='run many input files in a process pool with a resumable manifest')
+    batch.add_argument('inputs', nargs='+', help='input files, directories or glob patterns')
+    batch.add_argument('-d', '--output-dir', required=True, help='output directory')
+    batch.add_argument('-t', '--task', choices=batch_module.TASKS, default='annotate',
+                       help='annotate (default), shift or pipeline')
+    batch.add_argument('-j', '--jobs', type=int, default=None, help='worker processes (default: all cores)')
+    batch.add_argument('--manifest', help='manifest file (default: <output-dir>/manifest.json)')
+    batch.add_argument('--ext', default='.xlsx', help='output file extension (default: .xlsx)')
+    batch.add_argument('--force', action='store_true', help='run finished inputs again')
+
+    serve = commands.add_parser('serve', help='local annotation service with the database loaded once')
+    serve.add_argument('--host', default='127.0.0.1', help='listen address (default: 127.0.0.1)')
+    serve.add_argument('--port', type=int, default=8765, help='port (default: 8765)')
+    serve.add_argument('--socket', help='listen on this Unix socket instead of a TCP port')
+    return parser
+
+
+def run(args):
+    config = pipeline.load_config(args.config)
+    output = os.path.abspath(args.output) if getattr(args, 'output', None) else None
+    progress = log_progress(args.progress_interval) if args.progress else None
+    if args.command == 'build':
+        if output:
+            config['MolarMassCalculator']['Output File'] = output
+        pipeline.build_database(config, write=True, progress_callback=progress)
+    elif args.command == 'shift':
+        if output:
+            config['CompoundMatch']['Output File'] = output
+        pipeline.evaluate_shift(config, write=True, progress_callback=progress)
+    elif args.command == 'recalibrate':
+        compound_match = pipeline.evaluate_shift(config, progress_callback=progress)
+        pipeline.recalibrate(config, compound_match, output=output)
+    elif args.command == 'annotate':
+        pipeline.annotate(config, output=output, progress_callback=progress)
+    elif args.command == 'batch':
+        manifest = batch_module.run_batch(config, args.inputs, os.path.abspath(args.output_dir), task=args.task,
+                                          n_jobs=args.jobs, manifest_path=args.manifest, ext=args.ext,
+                                          force=args.force, progress_callback=progress)
+        if manifest.summary().get('failed'):
+            raise RuntimeError('%d inputs failed, see %s' % (manifest.summary()['failed'], manifest.path))
+    elif args.command == 'serve':
+        from ..service.server import serve
+        serve(config, host=args.host, port=args.port, socket_path=args.socket)
+    else:
+        if args.no_recalibrate:
+            config.setdefault('Pipeline', {})['Recalibrate'] = False
+        pipeline.run_pipeline(config, output=output, keep_intermediates=args.keep_intermediates,
+                              progress_callback=progress)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    setup_msidat_logger(console_level=args.log_level.upper(), log_files=not args.no_log_files,
+                        performance=args.log_performance,
+                        file_level=args.file_log_level.upper() if args.file_log_level else None)
+    try:
+        run(args)
+    except Exception as e:
+        logger.error(f"Error: {str(e)}")
+        return 1
+    logger.info(f"{args.command} completed")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,255 @@
+import os
+import json
+from loguru import logger
+from ..tools.table_io import read_table, write_table, table_path, file_format
+from ..tools.run_report import RunReport
+from ..tools.result_cache import ResultCache
+from ..molar_mass.cal_molar_mass import MolarMassCalculator
+from ..match.compound_match import CompoundMatch
+from ..annotator.make_annotator import Annotator
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'config.json')
+
+# config.json 键 -> CompoundMatch 属性
+COMPOUND_MATCH_KEYS = {
+    'Source m/z Column': 'source_mz',
+    'Source Intensity Column': 'source_intensity',
+    'Target m/z Column': 'target_mz',
+    'Output m/z Column': 'output_mz',
+    'Output Relative Error Column': 'output_rel_error',
+    'Output Intensity Column': 'output_intensity',
+    'Intensity Threshold': 'intensity_threshold',
+}
+
+
+def load_config(path=None):
+    '''
+    Objective: read a config.json (the GUI config file), the bundled one when path is None
+    '''
+    path = path or DEFAULT_CONFIG
+    logger.info(f"config from {path} ...")
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _path(section, key):
+    value = section.get(key)
+    return os.path.abspath(value) if value else None
+
+
+def _report(config, task, report):
+    # 外部传入的报告由调用者写出；否则按 "Run Report" 配置新建，由本阶段写在输出旁边
+    if report is not None:
+        return report, False
+    return RunReport.from_config(config, task), True
+
+
+def build_database(config, write=False, progress_callback=None, report=None):
+    '''
+    Objective: MolarMassCalculator stage, m/z tables of every compound and adduct
+    progress_callback: receives the tools.progress.ProgressEvent of every stage below (also for the other stages)
+    report: tools.run_report.RunReport collecting the stage timings (also for the other stages); when None
+        a report is created from the "Run Report" section and written next to the output
+    return: dict {'positive': DataFrame, 'negative': DataFrame}, also written to 'Output File' when write
+    '''
+    section = config['MolarMassCalculator']
+    report, own = _report(config, 'database', report)
+    calculator = MolarMassCalculator(input_file=_path(section, 'Input File'),
+                                     output_file=_path(section, 'Output File'),
+                                     compounds_col=section.get('Formula Column', 'Formula'),
+                                     input_sheet=section.get('Input Sheet', 0),
+                                     elements_mass_file=_path(section, 'Elements Mass File'),
+                                     adduct_type_file=_path(section, 'Adduct Type File'),
+                                     streaming=bool(section.get('Streaming Output', False)))
+    calculator.progress_callback = report.progress_callback(progress_callback)
+    calculator.result_cache = ResultCache.from_config(config)
+    positive_list = section.get('Positive Adducts')
+    negative_list = section.get('Negative Adducts')
+    kwargs = dict(positive_list=positive_list or [], negative_list=negative_list or [],
+                  all=positive_list is None and negative_list is None)
+    frames = calculator.process_file(**kwargs) if write else calculator.calculate(**kwargs)
+    if own and write:
+        report.write(calculator.output_file)
+    return frames
+
+
+def _read_streamed_database(section, sheet):
+    positive, negative = section.get('Positive Adducts'), section.get('Negative Adducts')
+    all = positive is None and negative is None
+    sheets = [name for name, adducts in (('positive', positive), ('negative', negative)) if all or adducts]
+    name = sheets[sheet] if isinstance(sheet, int) else sheet
+    output = _path(section, 'Output File')
+    if file_format(output) in ('excel', 'hdf5'):
+        return read_table(output, sheet_name=name)
+    return read_table(table_path(output, name))
+
+
+def load_database(config, build=False, write=False, progress_callback=None, report=None):
+    '''
+    Objective: annotation database, built by the MolarMassCalculator stage (its 'Database Sheet' of the
+    Annotator section, 'positive' / 'negative' or index) or read from the Annotator 'Database File'
+    return: DataFrame
+    '''
+    sheet = config.get('Annotator', {}).get('Database Sheet', 0)
+    if build:
+        frames = build_database(config, write=write, progress_callback=progress_callback, report=report)
+        if not frames:
+            # 流式输出的数据库不在内存中保留：从输出文件读回
+            return _read_streamed_database(config['MolarMassCalculator'], sheet)
+        return list(frames.values())[sheet] if isinstance(sheet, int) else frames[sheet]
+    with (report or RunReport(None, enabled=False)).stage('read database') as record:
+        df = read_table(_path(config['Annotator'], 'Database File'), sheet_name=sheet)
+        record['rows'] = len(df)
+    return df
+
+
+def read_target(config):
+    section = config['CompoundMatch']
+    return read_table(_path(section, 'Target File'), sheet_name=section.get('Target Sheet', 0))
+
+
+def evaluate_shift(config, df_source=None, write=False, df_target=None, progress_callback=None, report=None):
+    '''
+    Objective: CompoundMatch stage, mass shift of the internal standards in the source spectrum
+    return: CompoundMatch after match(), with its output written to 'Output File' when write
+    '''
+    section = config['CompoundMatch']
+    report, own = _report(config, 'shift', report)
+    if df_source is None:
+        with report.stage('read source') as record:
+            df_source = read_table(_path(section, 'Source File'), sheet_name=section.get('Source Sheet', 0))
+            record['rows'] = len(df_source)
+    if df_target is None:
+        with report.stage('read target') as record:
+            df_target = read_target(config)
+            record['rows'] = len(df_target)
+    compound_match = CompoundMatch(df_source, df_target)
+    compound_match.progress_callback = report.progress_callback(progress_callback)
+    compound_match.result_cache = ResultCache.from_config(config)
+    for key, attr in COMPOUND_MATCH_KEYS.items():
+        if key in section:
+            setattr(compound_match, attr, section[key])
+    if 'm/z Tolerance (ppm)' in section:
+        compound_match.mz_tolerance = section['m/z Tolerance (ppm)'] * 1e-6
+    compound_match.streaming = bool(section.get('Streaming Output', False))
+    if section.get('Output File'):
+        compound_match.output_file = _path(section, 'Output File')
+    if section.get('Profile Source', False):
+        compound_match.centroid_source()
+
+    compound_match.match()
+    logger.info(f"Average relative error: {compound_match.avg_rel_error:.2f} ppm")
+    logger.info(f"Median relative error: {compound_match.median_rel_error:.2f} ppm")
+    logger.info(f"Standard deviation: {compound_match.std_rel_error:.2f} ppm")
+    if write:
+        compound_match.output_process()
+        if own:
+            report.write(compound_match.output_file)
+    return compound_match
+
+
+def read_msi_data(config, report=None):
+    section = config['Annotator']
+    with (report or RunReport(None, enabled=False)).stage('read msi data') as record:
+        df = read_table(_path(section, 'MSI Data File'), sheet_name=section.get('MSI Data Sheet', 0))
+        record['rows'] = len(df)
+    return df
+
+
+def recalibrate(config, compound_match, msi_data=None, output=None, report=None):
+    '''
+    Objective: correct the MSI data m/z (first column) by the mass shift of the CompoundMatch stage
+    The shift is the median relative error, or the mean with "Shift Statistic": "mean", or a fixed
+    "Shift (ppm)", all in the "Pipeline" section of the config.
+    return: recalibrated MSI data, also written to output when given
+    '''
+    section = config.get('Pipeline', {})
+    report, own = _report(config, 'recalibrate', report)
+    msi_data = read_msi_data(config, report) if msi_data is None else msi_data
+    shift_ppm = section.get('Shift (ppm)')
+    if shift_ppm is None:
+        shift_ppm = compound_match.avg_rel_error if section.get('Shift Statistic', 'median') == 'mean' \
+            else compound_match.median_rel_error
+    with report.stage('recalibrate', rows=len(msi_data)):
+        msi_data = compound_match.recalibrate(msi_data, mz_column=msi_data.columns[0], shift_ppm=shift_ppm)
+    if output:
+        with report.stage('write recalibrated', rows=len(msi_data)):
+            write_table(msi_data, output)
+        logger.info(f"Recalibrated MSI data saved to {output}")
+        if own:
+            report.write(output)
+    return msi_data
+
+
+def annotate(config, msi_data=None, data_base=None, output=None, progress_callback=None, report=None):
+    '''
+    Objective: Annotator stage on in-memory tables, read from the Annotator section files when None
+    return: annotation DataFrame (None when streamed), written to output or the 'Output File'
+    '''
+    section = config['Annotator']
+    report, own = _report(config, 'annotation', report)
+    annotator = Annotator(output_path=output or _path(section, 'Output File'),
+                          up_limit_ppm=section.get('Up Limit (ppm)', 10),
+                          low_limit_ppm=section.get('Low Limit (ppm)', -10),
+                          streaming=bool(section.get('Streaming Output', False)))
+    annotator.progress_callback = report.progress_callback(progress_callback)
+    annotator.result_cache = ResultCache.from_config(config)
+    annotator.decoy_sets = int(section.get('Decoy Sets', 0))
+    annotator.decoy_method = section.get('Decoy Method', 'adduct')
+    annotator.adduct_grouping = bool(section.get('Adduct Grouping', False))
+    annotator.group_ppm = section.get('Grouping Tolerance (ppm)')
+    # 默认使用生成数据库时的加合物表
+    adduct_files = [_path(section, 'Adduct Type File'), _path(config.get('MolarMassCalculator', {}), 'Adduct Type File')]
+    annotator.adduct_type_file = next((v for v in adduct_files if v and os.path.exists(v)), None)
+    if msi_data is None:
+        msi_data = read_msi_data(config, report)
+    if data_base is None:
+        data_base = load_database(config, report=report)
+    logger.info(f"Using limits: {annotator.low_limit_ppm} ppm to {annotator.up_limit_ppm} ppm")
+    result = annotator.annotate(msi_data, data_base)
+    logger.info(f"Results saved to: {annotator.output_path}")
+    if own:
+        report.write(annotator.output_path)
+    return result
+
+
+def run_pipeline(config, output=None, keep_intermediates=False,
+                 msi_data=None, data_base=None, df_source=None, df_target=None, progress_callback=None):
+    '''
+    Objective: build -> shift evaluation -> recalibration -> annotation, intermediates passed in memory
+        1. build: the annotation database comes from MolarMassCalculator when that section has an
+           'Input File' (see load_database); otherwise the Annotator 'Database File' is read
+        2. shift evaluation and 3. recalibration run when the CompoundMatch section has a 'Source File'
+           and "Recalibrate" (Pipeline section) is not false
+        4. annotation of the (recalibrated) MSI data
+    Input:
+        keep_intermediates: also write every stage output to its configured file
+        msi_data, data_base, df_source, df_target: tables already in memory, read from the config when None
+        progress_callback: receives the ProgressEvent of every stage
+    return: annotation DataFrame; with "Run Report" enabled one report of all stages is written next to it
+    '''
+    section = config.get('Pipeline', {})
+    report = RunReport.from_config(config, 'pipeline')
+    if data_base is None:
+        build = bool(config.get('MolarMassCalculator', {}).get('Input File'))
+        logger.info('pipeline: {} database', 'build' if build else 'read')
+        data_base = load_database(config, build=build, write=keep_intermediates, progress_callback=progress_callback,
+                                  report=report)
+
+    msi_data = read_msi_data(config, report) if msi_data is None else msi_data
+    if (df_source is not None or config.get('CompoundMatch', {}).get('Source File')) \
+            and section.get('Recalibrate', True):
+        logger.info('pipeline: shift evaluation')
+        compound_match = evaluate_shift(config, df_source=df_source, write=keep_intermediates, df_target=df_target,
+                                        progress_callback=progress_callback, report=report)
+        logger.info('pipeline: recalibration')
+        recalibrated_file = _path(section, 'Recalibrated File') or \
+            table_path(output or _path(config['Annotator'], 'Output File'), 'recalibrated')
+        msi_data = recalibrate(config, compound_match, msi_data,
+                               output=recalibrated_file if keep_intermediates else None, report=report)
+
+    logger.info('pipeline: annotation')
+    result = annotate(config, msi_data=msi_data, data_base=data_base, output=output,
+                      progress_callback=progress_callback, report=report)
+    report.write(output or _path(config['Annotator'], 'Output File'))
+    return result
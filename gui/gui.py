@@ -10,30 +10,52 @@ sys.path.insert(0, parent_dir)
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                            QHBoxLayout, QLabel, QLineEdit, QPushButton, 
                            QFileDialog, QSpinBox, QDoubleSpinBox, QMessageBox,
-                           QTextEdit, QComboBox, QGroupBox, QFormLayout,
+                           QTextEdit, QPlainTextEdit, QComboBox, QGroupBox, QFormLayout,
                            QTabWidget,QListWidget,QListWidgetItem)
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, pyqtSignal, QUrl
 import pandas as pd
-from PyQt5.QtGui import QIcon
+from PyQt5.QtGui import QIcon, QDesktopServices
 
 # 导入自定义模块
 from msidat.match.compound_match import CompoundMatch
 from msidat.molar_mass.cal_molar_mass import MolarMassCalculator
 from msidat.annotator.make_annotator import Annotator
+from msidat.tools.table_io import SUPPORTED_EXTENSIONS, READ_ONLY_EXTENSIONS
+from msidat.tools.dataset_cache import DatasetCache
+from msidat.tools.result_cache import ResultCache
+from msidat.tools.progress import ProgressReporter
+from msidat.tools.run_report import RunReport
+from msidat.gui.worker import JobPanel
+from msidat.gui.log_sink import QueuedLogSink
+from msidat.gui.result_view import ResultView
+from msidat.gui.preview import PreviewPanel
+from msidat.annotator.preview import AnnotationPreview
+from msidat.match.preview import ShiftPreview
+
+TABLE_PATTERNS = ' '.join('*' + ext for ext in SUPPORTED_EXTENSIONS)
+INPUT_PATTERNS = ' '.join('*' + ext for ext in SUPPORTED_EXTENSIONS + READ_ONLY_EXTENSIONS)
+# 会话级数据缓存：列名探测只读表头，完整数据每个文件只解析一次
+DATASET_CACHE = DatasetCache()
+# 跨会话的结果缓存，输入与参数未变时直接返回上次的结果
+RESULT_CACHE = ResultCache()
 
 # 初始化logger
 from loguru import logger
 import sys
 
-class QTextEditLogger:
-    """Custom loguru handler to redirect logs to QTextEdit"""
-    def __init__(self, widget):
-        self.widget = widget
-
-    def write(self, message):
-        # if self.widget and self.widget.isVisible():
-        self.widget.append(message.strip())
-
+def open_output_dir(path):
+    '''
+    Objective: show the directory of an output file in the system file manager
+    os.startfile only exists on Windows; an error raised in a finished slot would abort the app
+    '''
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        if hasattr(os, 'startfile'):
+            os.startfile(directory)
+        elif not QDesktopServices.openUrl(QUrl.fromLocalFile(directory)):
+            logger.warning(f"could not open output directory {directory}")
+    except Exception as e:
+        logger.warning(f"could not open output directory {directory}: {str(e)}")
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -41,6 +63,8 @@ class MainWindow(QMainWindow):
         self.compound_match = CompoundMatch()
         self.mol_calculator = MolarMassCalculator()
         self.annotator = Annotator()
+        self.annotator.reader = DATASET_CACHE.read
+        self.set_result_cache(RESULT_CACHE)
         
         # 设置应用程序图标
         if getattr(sys, 'frozen', False):
@@ -146,7 +170,7 @@ class MainWindow(QMainWindow):
             QTabBar::tab:hover {
                 background-color: #e6e6e6;
             }
-            QTextEdit {
+            QTextEdit, QPlainTextEdit {
                 border: 1px solid #ddd;
                 border-radius: 4px;
                 padding: 10px;
@@ -195,6 +219,12 @@ class MainWindow(QMainWindow):
         self.annotator_tab = AnnotatorTab(self.annotator)
         tab_widget.addTab(self.annotator_tab, "Annotation")
         
+        # Create results tab, filled by the other tabs when their jobs finish
+        self.result_view = ResultView()
+        tab_widget.addTab(self.result_view, "Results")
+        for tab in (self.molar_mass_tab, self.compound_match_tab, self.annotator_tab):
+            tab.result_ready.connect(self.result_view.add_result)
+        
         # Create log tab
         self.log_tab = LogTab()
         tab_widget.addTab(self.log_tab, "Log")
@@ -231,13 +261,17 @@ class MainWindow(QMainWindow):
     
     def browse_file(self, line_edit, callback=None):
         file_name, _ = QFileDialog.getOpenFileName(
-            self, 'Open File', '', 'Excel Files (*.xlsx *.xls *.json);;All Files (*)'
+            self, 'Open File', '', 'Table Files (%s *.json);;All Files (*)' % TABLE_PATTERNS
         )
         if file_name:
             line_edit.setText(file_name)
             if callback:
                 callback()
 
+    def set_result_cache(self, result_cache):
+        for engine in (self.compound_match, self.mol_calculator, self.annotator):
+            engine.result_cache = result_cache
+
     def update_config(self):
         if not os.path.exists(self.config_file.text()):
             QMessageBox.warning(self, "Warning", "Config file not found. Please select a valid file.")
@@ -245,6 +279,12 @@ class MainWindow(QMainWindow):
         else:
             logger.info(f"config from {self.config_file.text()} ...")
             self.config_dict = json.load(open(self.config_file.text(), 'r', encoding='utf-8'))
+            for tab in (self.molar_mass_tab, self.compound_match_tab, self.annotator_tab):
+                tab.run_report_config = self.config_dict
+            if 'Result Cache' in self.config_dict.keys():
+                self.set_result_cache(ResultCache.from_config(self.config_dict, enabled=True))
+                logger.info(f"set result cache to {self.compound_match.result_cache.directory} "
+                            f"(enabled: {self.compound_match.result_cache.enabled})")
             if 'MolarMassCalculator' in self.config_dict.keys():
                 temp_dict = self.config_dict['MolarMassCalculator']
                 if 'Elements Mass File' in temp_dict.keys():
@@ -261,6 +301,9 @@ class MainWindow(QMainWindow):
                 if 'Output File' in temp_dict.keys():
                     self.molar_mass_tab.output_path.setText(os.path.abspath(temp_dict['Output File']))
                     logger.info(f"set output file to {os.path.abspath(temp_dict['Output File'])}")
+                if 'Streaming Output' in temp_dict.keys():
+                    self.mol_calculator.streaming = bool(temp_dict['Streaming Output'])
+                    logger.info(f"set streaming output to {bool(temp_dict['Streaming Output'])}")
             if 'CompoundMatch' in self.config_dict.keys():
                 temp_dict = self.config_dict['CompoundMatch']
                 if 'Source File' in temp_dict.keys():
@@ -289,6 +332,12 @@ class MainWindow(QMainWindow):
                 if 'm/z Tolerance (ppm)' in temp_dict.keys():
                     self.compound_match_tab.tolerance_spin.setValue(temp_dict['m/z Tolerance (ppm)'])
                     logger.info(f"set m/z tolerance to {temp_dict['m/z Tolerance (ppm)']}")
+                if 'Streaming Output' in temp_dict.keys():
+                    self.compound_match.streaming = bool(temp_dict['Streaming Output'])
+                    logger.info(f"set streaming output to {bool(temp_dict['Streaming Output'])}")
+                if 'Profile Source' in temp_dict.keys():
+                    self.compound_match.source_profile = bool(temp_dict['Profile Source'])
+                    logger.info(f"set profile source to {bool(temp_dict['Profile Source'])}")
                     
             if 'Annotator' in self.config_dict.keys():
                 temp_dict = self.config_dict['Annotator']
@@ -309,6 +358,19 @@ class MainWindow(QMainWindow):
                 if 'Low Limit (ppm)' in temp_dict.keys():
                     self.annotator_tab.low_limit_ppm.setValue(temp_dict['Low Limit (ppm)'])
                     logger.info(f"set low limit to {temp_dict['Low Limit (ppm)']}")
+                if 'Streaming Output' in temp_dict.keys():
+                    self.annotator.streaming = bool(temp_dict['Streaming Output'])
+                    logger.info(f"set streaming output to {bool(temp_dict['Streaming Output'])}")
+                if 'Decoy Sets' in temp_dict.keys():
+                    self.annotator.decoy_sets = int(temp_dict['Decoy Sets'])
+                    self.annotator.decoy_method = temp_dict.get('Decoy Method', 'adduct')
+                    logger.info(f"set decoy sets to {self.annotator.decoy_sets} ({self.annotator.decoy_method})")
+                if 'Adduct Grouping' in temp_dict.keys():
+                    self.annotator.adduct_grouping = bool(temp_dict['Adduct Grouping'])
+                    self.annotator.group_ppm = temp_dict.get('Grouping Tolerance (ppm)')
+                    if temp_dict.get('Adduct Type File'):
+                        self.annotator.adduct_type_file = os.path.abspath(temp_dict['Adduct Type File'])
+                    logger.info(f"set adduct grouping to {self.annotator.adduct_grouping}")
 class LogTab(QWidget):
     def __init__(self):
         super().__init__()
@@ -320,10 +382,10 @@ class LogTab(QWidget):
         layout.setSpacing(15)
         
         # Log display area
-        self.log_text = QTextEdit()
+        self.log_text = QPlainTextEdit()
         self.log_text.setReadOnly(True)
         self.log_text.setStyleSheet("""
-            QTextEdit {
+            QPlainTextEdit {
                 font-size: 12pt;
                 padding: 10px;
             }
@@ -360,8 +422,10 @@ class LogTab(QWidget):
             print(f"GUI logger reset failed: {str(e)}")
         try:
             # 添加GUI输出处理器
+            # 日志先进入环形缓冲区，由 UI 线程的定时器批量写入控件
+            self.gui_logger = QueuedLogSink(self.log_text)
             gui_handler_id = logger.add(
-                QTextEditLogger(self.log_text).write,
+                self.gui_logger.write,
                 format="<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | <level>{message}</level>",
                 level="INFO"
             )
@@ -384,7 +448,8 @@ class LogTab(QWidget):
                     rotation="1 day",
                     retention="30 days",
                     level="DEBUG",
-                    encoding="utf-8"
+                    encoding="utf-8",
+                    enqueue=True  # 文件写入由后台线程完成，不阻塞 UI 线程
                 )
                 
                 logger.info("日志系统初始化成功")
@@ -397,9 +462,12 @@ class LogTab(QWidget):
             
     def clear_log(self):
         """Clear the log display"""
+        self.gui_logger.flush()
         self.log_text.clear()
 
 class CompoundMatchTab(QWidget):
+    result_ready = pyqtSignal(str, object)
+
     def __init__(self, compound_match):
         super().__init__()
         self.compound_match = compound_match
@@ -596,6 +664,19 @@ class CompoundMatchTab(QWidget):
         
         stats_group.setLayout(stats_layout)
         right_column.addWidget(stats_group)
+        
+        # Live preview of tolerance / threshold changes
+        self.preview_panel = PreviewPanel(
+            self.preview_loader,
+            lambda preview: preview.summary(self.tolerance_spin.value(), self.intensity_spin.value()),
+            lambda summary: 'Matched targets: %d / %d' % (summary['matched'], summary['targets']))
+        self.tolerance_spin.valueChanged.connect(self.preview_panel.schedule)
+        self.intensity_spin.valueChanged.connect(self.preview_panel.schedule)
+        for edit in (self.source_path, self.target_path):
+            edit.textChanged.connect(self.preview_panel.reset)
+        for combo in (self.source_mz_combo, self.source_intensity_combo, self.target_mz_combo):
+            combo.currentIndexChanged.connect(self.preview_panel.reset)
+        right_column.addWidget(self.preview_panel)
         right_column.addStretch()
         
         # Add right column to two-column layout with stretch factor 45
@@ -605,29 +686,32 @@ class CompoundMatchTab(QWidget):
         layout.addWidget(two_column_widget)
         
         # Run button
-        run_btn = QPushButton('Run Evaluation')
-        run_btn.setMinimumSize(300, 50)
-        run_btn.setStyleSheet("""
+        self.run_btn = QPushButton('Run Evaluation')
+        self.run_btn.setMinimumSize(300, 50)
+        self.run_btn.setStyleSheet("""
             QPushButton {
                 font-size: 12pt;
                 padding: 10px;
             }
         """)
-        run_btn.clicked.connect(self.run_match)
-        layout.addWidget(run_btn)
+        self.run_btn.clicked.connect(self.run_match)
+        layout.addWidget(self.run_btn)
+        self.job_panel = JobPanel(self.run_btn)
+        self.run_report_config = {}  # 全局配置文件的 "Run Report" 设置
+        layout.addWidget(self.job_panel)
         
     def update_source_columns(self):
         """Update source data column selection dropdowns"""
         try:
-            df = pd.read_excel(self.source_path.text(),engine='openpyxl')
+            columns = DATASET_CACHE.columns(self.source_path.text()).astype(str)
             self.source_mz_combo.clear()
             self.source_intensity_combo.clear()
-            self.source_mz_combo.addItems(df.columns)
-            self.source_intensity_combo.addItems(df.columns)
+            self.source_mz_combo.addItems(columns)
+            self.source_intensity_combo.addItems(columns)
             
             # Try to auto-select default columns
-            mz_index = df.columns.str.lower().str.contains('m/z').argmax()
-            intensity_index = df.columns.str.lower().str.contains('intensity').argmax()
+            mz_index = columns.str.lower().str.contains('m/z').argmax()
+            intensity_index = columns.str.lower().str.contains('intensity').argmax()
             self.source_mz_combo.setCurrentIndex(mz_index)
             self.source_intensity_combo.setCurrentIndex(intensity_index)
         except Exception as e:
@@ -636,19 +720,19 @@ class CompoundMatchTab(QWidget):
     def update_target_columns(self):
         """Update target data column selection dropdown"""
         try:
-            df = pd.read_excel(self.target_path.text(),engine='openpyxl')
+            columns = DATASET_CACHE.columns(self.target_path.text()).astype(str)
             self.target_mz_combo.clear()
-            self.target_mz_combo.addItems(df.columns)
+            self.target_mz_combo.addItems(columns)
             
             # Try to auto-select default column
-            mz_index = df.columns.str.lower().str.contains('m/z').argmax()
+            mz_index = columns.str.lower().str.contains('m/z').argmax()
             self.target_mz_combo.setCurrentIndex(mz_index)
         except Exception as e:
             logger.error(f"Failed to update target columns: {str(e)}")
         
     def browse_file(self, line_edit, callback=None):
         file_name, _ = QFileDialog.getOpenFileName(
-            self, 'Select File', '', 'Excel Files (*.xlsx *.xls);;All Files (*)'
+            self, 'Select File', '', 'Table Files (%s);;All Files (*)' % INPUT_PATTERNS
         )
         if file_name:
             line_edit.setText(file_name)
@@ -657,10 +741,10 @@ class CompoundMatchTab(QWidget):
                 
     def browse_save_file(self, line_edit):
         file_name, _ = QFileDialog.getSaveFileName(
-            self, 'Save File', '', 'Excel Files (*.xlsx *.xls);;All Files (*)'
+            self, 'Save File', '', 'Table Files (%s);;All Files (*)' % TABLE_PATTERNS
         )
         if file_name:
-            if not file_name.endswith('.xlsx') and not file_name.endswith('.xls'):
+            if not file_name.lower().endswith(SUPPORTED_EXTENSIONS):
                 file_name += '.xlsx'
             line_edit.setText(file_name)
             
@@ -673,16 +757,8 @@ class CompoundMatchTab(QWidget):
             
             if not all([source_path, target_path, output_path]):
                 raise ValueError("Please select all required files")
-                
-            # Read data
-            logger.info("Reading source file...")
-            df_source = pd.read_excel(source_path,engine='openpyxl')
-            logger.info("Reading target file...")
-            df_target = pd.read_excel(target_path,engine='openpyxl')
             
-            # Set parameters
-            self.compound_match.df_source = df_source
-            self.compound_match.df_target = df_target
+            # Set parameters (UI thread), the job itself runs on a worker thread
             self.compound_match.source_mz = self.source_mz_combo.currentText()
             self.compound_match.source_intensity = self.source_intensity_combo.currentText()
             self.compound_match.target_mz = self.target_mz_combo.currentText()
@@ -692,39 +768,83 @@ class CompoundMatchTab(QWidget):
             self.compound_match.intensity_threshold = self.intensity_spin.value()
             self.compound_match.mz_tolerance = self.tolerance_spin.value() * 1e-6
             self.compound_match.output_file = output_path
-            
-            # Execute matching
-            logger.info("Starting matching process...")
-            self.compound_match.match()
-            
-            # Update statistics display
-            self.avg_error_label.setText(f"{self.compound_match.avg_rel_error:.2f}")
-            self.max_error_label.setText(f"{self.compound_match.max_rel_error:.2f}")
-            self.min_error_label.setText(f"{self.compound_match.min_rel_error:.2f}")
-            self.std_error_label.setText(f"{self.compound_match.std_rel_error:.2f}")
-            
-            # Log statistics
-            logger.info("Matching completed!")
-            logger.info(f"Average relative error: {self.compound_match.avg_rel_error:.2f} ppm")
-            logger.info(f"Maximum relative error: {self.compound_match.max_rel_error:.2f} ppm")
-            logger.info(f"Minimum relative error: {self.compound_match.min_rel_error:.2f} ppm")
-            logger.info(f"Standard deviation: {self.compound_match.std_rel_error:.2f} ppm")
-            
-            # Save results
-            logger.info("Saving results...")
-            self.compound_match.output_process()
-            
-            # Show success message
-            QMessageBox.information(self, 'Success', 'Matching completed. Results have been saved to the specified file.')
-            
-            # Open output directory
-            os.startfile(os.path.dirname(output_path))
+            self.job_panel.start(lambda progress: self.match_job(source_path, target_path, progress),
+                                 on_finished=self.match_finished, on_failed=self.job_failed)
             
         except Exception as e:
             logger.error(f"Error: {str(e)}")
             QMessageBox.critical(self, 'Error', f'Operation failed: {str(e)}')
+    
+    def preview_loader(self):
+        source_path, target_path = self.source_path.text(), self.target_path.text()
+        if not source_path or not target_path:
+            raise ValueError("Please select the source and target files")
+        columns = (self.source_mz_combo.currentText(), self.source_intensity_combo.currentText(),
+                   self.target_mz_combo.currentText())
+        profile = self.compound_match.source_profile
+        
+        def load():
+            compound_match = CompoundMatch(DATASET_CACHE.read(source_path), DATASET_CACHE.read(target_path))
+            compound_match.source_mz, compound_match.source_intensity, compound_match.target_mz = columns
+            if profile:
+                compound_match.centroid_source()
+            return ShiftPreview(compound_match)
+        return load
+    
+    def match_job(self, source_path, target_path, progress_callback):
+        """Read, match and save on the worker thread"""
+        report = RunReport.from_config(self.run_report_config, 'shift')
+        progress_callback = report.progress_callback(progress_callback)
+        self.compound_match.progress_callback = progress_callback
+        progress = ProgressReporter(progress_callback, 'shift')
+        progress.start('read', 2)
+        logger.info("Reading source file...")
+        self.compound_match.df_source = DATASET_CACHE.read(source_path)
+        progress.update(1)
+        logger.info("Reading target file...")
+        self.compound_match.df_target = DATASET_CACHE.read(target_path)
+        progress.finish()
+        if self.compound_match.source_profile:
+            self.compound_match.centroid_source()
+        
+        # Execute matching
+        logger.info("Starting matching process...")
+        self.compound_match.match()
+        
+        # Log statistics
+        logger.info("Matching completed!")
+        logger.info(f"Average relative error: {self.compound_match.avg_rel_error:.2f} ppm")
+        logger.info(f"Maximum relative error: {self.compound_match.max_rel_error:.2f} ppm")
+        logger.info(f"Minimum relative error: {self.compound_match.min_rel_error:.2f} ppm")
+        logger.info(f"Standard deviation: {self.compound_match.std_rel_error:.2f} ppm")
+        
+        # Save results
+        logger.info("Saving results...")
+        self.compound_match.output_process()
+        report.write(self.compound_match.output_file)
+        return self.compound_match
+    
+    def match_finished(self, compound_match):
+        self.result_ready.emit('MS shift evaluation', compound_match.df_output)
+        # Update statistics display
+        self.avg_error_label.setText(f"{compound_match.avg_rel_error:.2f}")
+        self.max_error_label.setText(f"{compound_match.max_rel_error:.2f}")
+        self.min_error_label.setText(f"{compound_match.min_rel_error:.2f}")
+        self.std_error_label.setText(f"{compound_match.std_rel_error:.2f}")
+        
+        # Show success message
+        QMessageBox.information(self, 'Success', 'Matching completed. Results have been saved to the specified file.')
+        
+        # Open output directory
+        open_output_dir(compound_match.output_file)
+    
+    def job_failed(self, message):
+        logger.error(f"Error: {message}")
+        QMessageBox.critical(self, 'Error', f'Operation failed: {message}')
 
 class MolarMassTab(QWidget):
+    result_ready = pyqtSignal(str, object)
+
     def __init__(self, calculator):
         super().__init__()
         self.calculator = calculator
@@ -840,16 +960,19 @@ class MolarMassTab(QWidget):
         layout.addWidget(settings_group)
         
         # Run button area
-        run_btn = QPushButton('Construct Database')
-        run_btn.setMinimumHeight(50)  # 只设置高度
-        run_btn.setStyleSheet("""
+        self.run_btn = QPushButton('Construct Database')
+        self.run_btn.setMinimumHeight(50)  # 只设置高度
+        self.run_btn.setStyleSheet("""
             QPushButton {
                 font-size: 12pt;
                 padding: 10px;
             }
         """)
-        run_btn.clicked.connect(self.run_calculation)
-        layout.addWidget(run_btn)
+        self.run_btn.clicked.connect(self.run_calculation)
+        layout.addWidget(self.run_btn)
+        self.job_panel = JobPanel(self.run_btn)
+        self.run_report_config = {}  # 全局配置文件的 "Run Report" 设置
+        layout.addWidget(self.job_panel)
         layout.addStretch()
 
     def update_adduct_type(self):
@@ -877,19 +1000,19 @@ class MolarMassTab(QWidget):
     def update_input_columns(self):
         """Update input file column selection dropdown"""
         try:
-            df = pd.read_excel(self.input_path.text(),engine='openpyxl')
+            columns = DATASET_CACHE.columns(self.input_path.text()).astype(str)
             self.column_combo.clear()
-            self.column_combo.addItems(df.columns)
+            self.column_combo.addItems(columns)
             
             # Try to auto-select formula column
-            formula_index = df.columns.str.lower().str.contains('formula').argmax()
+            formula_index = columns.str.lower().str.contains('formula').argmax()
             self.column_combo.setCurrentIndex(formula_index)
         except Exception as e:
             logger.error(f"Failed to update columns: {str(e)}")
             
     def browse_file(self, line_edit, callback=None):
         file_name, _ = QFileDialog.getOpenFileName(
-            self, 'Select File', '', 'Excel Files (*.xlsx *.xls *.json);;All Files (*)'
+            self, 'Select File', '', 'Table Files (%s *.json);;All Files (*)' % TABLE_PATTERNS
         )
         if file_name:
             line_edit.setText(file_name)
@@ -898,10 +1021,10 @@ class MolarMassTab(QWidget):
             
     def browse_save_file(self, line_edit):
         file_name, _ = QFileDialog.getSaveFileName(
-            self, 'Save File', '', 'Excel Files (*.xlsx *.xls);;All Files (*)'
+            self, 'Save File', '', 'Table Files (%s);;All Files (*)' % TABLE_PATTERNS
         )
         if file_name:
-            if not file_name.endswith('.xlsx') and not file_name.endswith('.xls'):
+            if not file_name.lower().endswith(SUPPORTED_EXTENSIONS):
                 file_name += '.xlsx'
             line_edit.setText(file_name)
             
@@ -916,26 +1039,44 @@ class MolarMassTab(QWidget):
             if not all([input_path, output_path, elements_path, formula_column]):
                 raise ValueError("Please select all required files and formula column")
                 
-            # Process file
+            # Process file (on a worker thread)
             self.calculator.input_file = input_path
             self.calculator.output_file = output_path
             self.calculator.elements_mass_file = elements_path
             self.calculator.compounds_col = formula_column
             positive_selected_text = [self.positive_list.item(i).text() for i in range(self.positive_list.count()) if self.positive_list.item(i).isSelected()]
             negative_selected_text = [self.negative_list.item(i).text() for i in range(self.negative_list.count()) if self.negative_list.item(i).isSelected()]
-            self.calculator.process_file(positive_list=positive_selected_text, negative_list=negative_selected_text, all=False)
-            
-            # Show success message
-            QMessageBox.information(self, 'Success', 'Calculation completed. Results have been saved to the specified file.')
-            
-            # Open output directory
-            os.startfile(os.path.dirname(output_path))
+            self.job_panel.start(lambda progress: self.calculation_job(positive_selected_text, negative_selected_text, progress),
+                                 on_finished=self.calculation_finished, on_failed=self.job_failed)
             
         except Exception as e:
             logger.error(f"Error: {str(e)}")
             QMessageBox.critical(self, 'Error', f'Operation failed: {str(e)}')
+    
+    def calculation_job(self, positive_list, negative_list, progress_callback):
+        report = RunReport.from_config(self.run_report_config, 'database')
+        self.calculator.progress_callback = report.progress_callback(progress_callback)
+        frames = self.calculator.process_file(positive_list=positive_list, negative_list=negative_list, all=False)
+        report.write(self.calculator.output_file)
+        return self.calculator.output_file, frames
+    
+    def calculation_finished(self, result):
+        output_path, frames = result
+        for sheet, df in frames.items():
+            self.result_ready.emit('Database: %s' % sheet, df)
+        # Show success message
+        QMessageBox.information(self, 'Success', 'Calculation completed. Results have been saved to the specified file.')
+        
+        # Open output directory
+        open_output_dir(output_path)
+    
+    def job_failed(self, message):
+        logger.error(f"Error: {message}")
+        QMessageBox.critical(self, 'Error', f'Operation failed: {message}')
 
 class AnnotatorTab(QWidget):
+    result_ready = pyqtSignal(str, object)
+
     def __init__(self, annotator):
         super().__init__()
         self.annotator = annotator
@@ -1025,22 +1166,39 @@ class AnnotatorTab(QWidget):
         param_group.setLayout(param_layout)
         layout.addWidget(param_group)
         
+        # Live preview of ppm limit changes
+        self.preview_panel = PreviewPanel(
+            self.preview_loader,
+            lambda preview: preview.summary(self.up_limit_ppm.value(), self.low_limit_ppm.value()),
+            lambda summary: 'Annotated peaks: %d / %d, matches: %d' % (
+                summary['annotated'], summary['peaks'], summary['matches']))
+        self.up_limit_ppm.valueChanged.connect(self.preview_panel.schedule)
+        self.low_limit_ppm.valueChanged.connect(self.preview_panel.schedule)
+        for edit in (self.msi_path, self.database_path):
+            edit.textChanged.connect(self.preview_panel.reset)
+        for combo in (self.msi_sheet_combo, self.database_sheet_combo):
+            combo.currentIndexChanged.connect(self.preview_panel.reset)
+        layout.addWidget(self.preview_panel)
+        
         # Add spacing between parameter group and run button
         spacer = QWidget()
         spacer.setFixedHeight(20)
         layout.addWidget(spacer)
         
         # Run button
-        run_btn = QPushButton('Run Annotation')
-        run_btn.setMinimumSize(300, 50)
-        run_btn.setStyleSheet("""
+        self.run_btn = QPushButton('Run Annotation')
+        self.run_btn.setMinimumSize(300, 50)
+        self.run_btn.setStyleSheet("""
             QPushButton {
                 font-size: 12pt;
                 padding: 10px;
             }
         """)
-        run_btn.clicked.connect(self.run_annotation)
-        layout.addWidget(run_btn)
+        self.run_btn.clicked.connect(self.run_annotation)
+        layout.addWidget(self.run_btn)
+        self.job_panel = JobPanel(self.run_btn)
+        self.run_report_config = {}  # 全局配置文件的 "Run Report" 设置
+        layout.addWidget(self.job_panel)
         
         # Add spacing at the bottom
         layout.addStretch(1)
@@ -1049,10 +1207,10 @@ class AnnotatorTab(QWidget):
         """Update MSI file sheet selection dropdown"""
         try:
             if self.msi_path.text():
-                excel_file = pd.ExcelFile(self.msi_path.text())
+                sheets = DATASET_CACHE.sheet_names(self.msi_path.text())
                 self.msi_sheet_combo.clear()
-                self.msi_sheet_combo.addItems(excel_file.sheet_names)
-                logger.info(f"Found {len(excel_file.sheet_names)} sheets in MSI file")
+                self.msi_sheet_combo.addItems(sheets)
+                logger.info(f"Found {len(sheets)} sheets in MSI file")
         except Exception as e:
             logger.error(f"Failed to update MSI sheets: {str(e)}")
             
@@ -1060,10 +1218,10 @@ class AnnotatorTab(QWidget):
         """Update database file sheet selection dropdown"""
         try:
             if self.database_path.text():
-                excel_file = pd.ExcelFile(self.database_path.text())
+                sheets = DATASET_CACHE.sheet_names(self.database_path.text())
                 self.database_sheet_combo.clear()
-                self.database_sheet_combo.addItems(excel_file.sheet_names)
-                logger.info(f"Found {len(excel_file.sheet_names)} sheets in database file")
+                self.database_sheet_combo.addItems(sheets)
+                logger.info(f"Found {len(sheets)} sheets in database file")
         except Exception as e:
             logger.error(f"Failed to update database sheets: {str(e)}")
         
@@ -1072,7 +1230,7 @@ class AnnotatorTab(QWidget):
             self,
             "Select File",
             "",
-            "Excel Files (*.xlsx *.xls);;All Files (*.*)"
+            "Table Files (%s);;All Files (*.*)" % INPUT_PATTERNS
         )
         if file_name:
             line_edit.setText(file_name)
@@ -1084,10 +1242,10 @@ class AnnotatorTab(QWidget):
             self,
             "Save File",
             "",
-            "Excel Files (*.xlsx *.xls);;All Files (*.*)"
+            "Table Files (%s);;All Files (*.*)" % TABLE_PATTERNS
         )
         if file_name:
-            if not file_name.endswith('.xlsx') and not file_name.endswith('.xls'):
+            if not file_name.lower().endswith(SUPPORTED_EXTENSIONS):
                 file_name += '.xlsx'
             line_edit.setText(file_name)
             
@@ -1109,20 +1267,48 @@ class AnnotatorTab(QWidget):
             self.annotator.msidata_sheet = self.msi_sheet_combo.currentIndex()
             self.annotator.database_sheet = self.database_sheet_combo.currentIndex()
             
-            # Run annotation
+            # Run annotation (on a worker thread)
             logger.info("Starting annotation process...")
             logger.info(f"Using MSI sheet: {self.msi_sheet_combo.currentText()}")
             logger.info(f"Using database sheet: {self.database_sheet_combo.currentText()}")
             logger.info(f"Using limits: {self.low_limit_ppm.value()} ppm to {self.up_limit_ppm.value()} ppm")
-            result = self.annotator.make_annotator()
-            logger.info("Annotation completed successfully!")
-            logger.info(f"Results saved to: {self.output_path.text()}")
-            
-            QMessageBox.information(self, "Success", "Annotation completed successfully!")
+            self.job_panel.start(self.annotation_job, on_finished=self.annotation_finished,
+                                 on_failed=self.annotation_failed)
             
         except Exception as e:
             logger.error(f"Error during annotation: {str(e)}")
             QMessageBox.critical(self, "Error", f"An error occurred: {str(e)}")
+    
+    def preview_loader(self):
+        msi_path, database_path = self.msi_path.text(), self.database_path.text()
+        if not msi_path or not database_path:
+            raise ValueError("Please select the MSI data and database files")
+        msi_sheet = max(self.msi_sheet_combo.currentIndex(), 0)
+        database_sheet = max(self.database_sheet_combo.currentIndex(), 0)
+        window = max(50, abs(self.up_limit_ppm.value()), abs(self.low_limit_ppm.value()))
+        
+        def load():
+            msi_data = DATASET_CACHE.read(msi_path, sheet_name=msi_sheet)
+            data_base = DATASET_CACHE.read(database_path, sheet_name=database_sheet)
+            return AnnotationPreview(data_base, msi_data.iloc[:, 0], window_ppm=window)
+        return load
+    
+    def annotation_job(self, progress_callback):
+        report = RunReport.from_config(self.run_report_config, 'annotation')
+        self.annotator.progress_callback = report.progress_callback(progress_callback)
+        result = self.annotator.make_annotator()
+        report.write(self.annotator.output_path)
+        return result
+    
+    def annotation_finished(self, result):
+        self.result_ready.emit('Annotation', result)
+        logger.info("Annotation completed successfully!")
+        logger.info(f"Results saved to: {self.annotator.output_path}")
+        QMessageBox.information(self, "Success", "Annotation completed successfully!")
+    
+    def annotation_failed(self, message):
+        logger.error(f"Error during annotation: {message}")
+        QMessageBox.critical(self, "Error", f"An error occurred: {message}")
 
 def main():
     app = QApplication(sys.argv)
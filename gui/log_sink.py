@@ -0,0 +1,78 @@
+import threading
+from collections import deque
+from PyQt5.QtCore import QObject, QTimer
+
+
+class QueuedLogSink(QObject):
+    """
+    loguru sink for the log tab. write() may be called from any thread and only appends the formatted
+    record to a bounded ring buffer; a QTimer on the GUI thread moves the buffer to the widget in one
+    batch every interval_ms.
+        - when more than capacity records arrive between two flushes the oldest are dropped and a
+          single "records dropped" line is shown instead
+        - consecutive records with the same level and message are collapsed into one line plus a
+          "repeated N times" line
+        - at most max_batch records are written per flush, the widget keeps the last max_lines lines
+    The widget must be a QPlainTextEdit (block count limit).
+    """
+    def __init__(self, widget, capacity=10000, interval_ms=100, max_batch=2000, max_lines=5000):
+        super().__init__(widget)
+        self.widget = widget
+        self.widget.setMaximumBlockCount(max_lines)
+        self.max_batch = max_batch
+        self._buffer = deque(maxlen=capacity)
+        self._dropped = 0
+        self._lock = threading.Lock()
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.flush)
+        self._timer.start(interval_ms)
+
+    def write(self, message):
+        record = getattr(message, 'record', None)
+        key = (record['level'].name, record['message']) if record is not None else message
+        with self._lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                self._dropped += 1
+            self._buffer.append((key, message.rstrip('\n')))
+
+    def _take(self):
+        with self._lock:
+            records = [self._buffer.popleft() for _ in range(min(len(self._buffer), self.max_batch))]
+            dropped, self._dropped = self._dropped, 0
+        return records, dropped
+
+    @staticmethod
+    def collapse(records, dropped=0):
+        '''
+        return: display lines of a batch, with dropped and repeated records summarised
+        '''
+        lines = []
+        if dropped:
+            lines.append('... %d log records dropped (burst) ...' % dropped)
+        last_key, repeated = None, 0
+        for key, text in records:
+            if key == last_key:
+                repeated += 1
+                continue
+            if repeated:
+                lines.append('    (last message repeated %d times)' % repeated)
+            lines.append(text)
+            last_key, repeated = key, 0
+        if repeated:
+            lines.append('    (last message repeated %d times)' % repeated)
+        return lines
+
+    def flush(self):
+        records, dropped = self._take()
+        if not records and not dropped:
+            return
+        scroll_bar = self.widget.verticalScrollBar()
+        at_bottom = scroll_bar.value() >= scroll_bar.maximum() - 4
+        self.widget.appendPlainText('\n'.join(self.collapse(records, dropped)))
+        # 用户向上翻看时不自动滚动到底部
+        if at_bottom:
+            scroll_bar.setValue(scroll_bar.maximum())
+
+    @property
+    def pending(self):
+        return len(self._buffer)
@@ -0,0 +1,131 @@
+import time
+import numpy as np
+from PyQt5.QtCore import Qt, QTimer, QThreadPool, QRectF
+from PyQt5.QtGui import QPainter, QColor
+from PyQt5.QtWidgets import QGroupBox, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QWidget, QMessageBox
+from loguru import logger
+from msidat.gui.worker import JobWorker
+
+
+class HistogramWidget(QWidget):
+    """
+    Bar chart of a (counts, edges) histogram, painted directly.
+    """
+    def __init__(self):
+        super().__init__()
+        self.setMinimumHeight(120)
+        self._counts = np.zeros(0)
+        self._edges = np.zeros(0)
+
+    def set_histogram(self, counts, edges):
+        self._counts, self._edges = np.asarray(counts), np.asarray(edges)
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor('white'))
+        if not len(self._counts) or self._counts.max() <= 0:
+            painter.setPen(QColor('#999999'))
+            painter.drawText(self.rect(), Qt.AlignCenter, 'no matches')
+            return
+        margin = 18
+        width, height = self.width(), self.height() - margin
+        bar = width / len(self._counts)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor('#4a90d9'))
+        for i, count in enumerate(self._counts / self._counts.max()):
+            painter.drawRect(QRectF(i * bar + 1, height * (1 - count), max(bar - 2, 1), height * count))
+        painter.setPen(QColor('#333333'))
+        painter.drawText(QRectF(0, height, width, margin), Qt.AlignLeft | Qt.AlignVCenter,
+                         '%.1f ppm' % self._edges[0])
+        painter.drawText(QRectF(0, height, width, margin), Qt.AlignRight | Qt.AlignVCenter,
+                         '%.1f ppm' % self._edges[-1])
+
+
+class PreviewPanel(QGroupBox):
+    """
+    Live preview of a tab: "Load Preview" reads and indexes the inputs once on a worker thread
+    (loader() is called on the UI thread to collect the widget values and returns the job that builds the
+    preview object, which is kept in memory); afterwards every parameter change schedules a
+    debounced update that calls summarize(preview) on the UI thread and shows headline(summary),
+    the ppm error statistics and the histogram.
+    """
+    def __init__(self, loader, summarize, headline, delay_ms=150):
+        super().__init__('Live Preview')
+        self.loader = loader
+        self.summarize = summarize
+        self.headline = headline
+        self.preview = None
+        self._worker = None
+        layout = QVBoxLayout(self)
+        bar = QHBoxLayout()
+        self.load_button = QPushButton('Load Preview')
+        self.load_button.setMinimumHeight(35)
+        self.load_button.clicked.connect(self.load)
+        self.status_label = QLabel('Load the inputs to preview the parameters')
+        bar.addWidget(self.load_button)
+        bar.addWidget(self.status_label, 1)
+        layout.addLayout(bar)
+        self.summary_label = QLabel('')
+        self.summary_label.setWordWrap(True)
+        layout.addWidget(self.summary_label)
+        self.histogram = HistogramWidget()
+        layout.addWidget(self.histogram)
+        # 参数停止变化 delay_ms 后再计算
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay_ms)
+        self._timer.timeout.connect(self.refresh)
+
+    def load(self):
+        if self._worker is not None:
+            return
+        try:
+            job = self.loader()
+        except Exception as e:
+            QMessageBox.warning(self, 'Warning', str(e))
+            return
+        self.load_button.setEnabled(False)
+        self.status_label.setText('Loading...')
+        self._worker = JobWorker(lambda progress: job())
+        self._worker.signals.finished.connect(self._loaded)
+        self._worker.signals.failed.connect(self._failed)
+        QThreadPool.globalInstance().start(self._worker)
+
+    def _loaded(self, preview):
+        self._worker = None
+        self.preview = preview
+        self.load_button.setEnabled(True)
+        self.refresh()
+
+    def _failed(self, message):
+        self._worker = None
+        self.load_button.setEnabled(True)
+        self.status_label.setText('Preview failed')
+        logger.error(f"Preview failed: {message}")
+        QMessageBox.critical(self, 'Error', f'Preview failed: {message}')
+
+    def schedule(self, *args):
+        if self.preview is not None:
+            self._timer.start()
+
+    def reset(self, *args):
+        # 输入文件改变后缓存失效
+        self.preview = None
+        self.summary_label.setText('')
+        self.histogram.set_histogram([], [])
+        self.status_label.setText('Inputs changed, load the preview again')
+
+    def refresh(self):
+        if self.preview is None:
+            return
+        start = time.perf_counter()
+        summary = self.summarize(self.preview)
+        text = self.headline(summary)
+        if summary['count']:
+            text += '\nppm error: mean %.3f, median %.3f, std %s, range %.3f to %.3f' % (
+                summary['avg'], summary['median'], '--' if summary['std'] is None else '%.3f' % summary['std'],
+                summary['min'], summary['max'])
+        self.summary_label.setText(text)
+        self.histogram.set_histogram(*summary['histogram'])
+        self.status_label.setText('Updated in %.1f ms' % ((time.perf_counter() - start) * 1e3))
@@ -0,0 +1,216 @@
+import numpy as np
+import pandas as pd
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QTimer
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QComboBox,
+                             QTableView, QHeaderView)
+from loguru import logger
+
+
+class DataFrameModel(QAbstractTableModel):
+    """
+    Read-only table model over a DataFrame, for browsing result tables of millions of rows.
+    The model keeps one array of row positions (the current filter and sort order) and converts a cell
+    to text only when the view paints it; rows are handed to the view in blocks of fetch_size
+    (canFetchMore / fetchMore), so a new table shows immediately. Sorting and filtering are vectorized
+    over whole columns and only replace the row position array.
+    """
+    def __init__(self, df=None, fetch_size=2000):
+        super().__init__()
+        self.fetch_size = fetch_size
+        self._df = pd.DataFrame()
+        self._columns = []
+        self._text = {}
+        self._view = np.zeros(0, dtype=np.int64)
+        self._loaded = 0
+        if df is not None:
+            self.set_frame(df)
+
+    def set_frame(self, df):
+        self.beginResetModel()
+        self._df = df
+        self._columns = [df.iloc[:, i].to_numpy() for i in range(df.shape[1])]
+        self._text = {}
+        self._view = np.arange(len(df), dtype=np.int64)
+        self._loaded = min(len(self._view), self.fetch_size)
+        self.endResetModel()
+
+    def _set_view(self, view):
+        self.beginResetModel()
+        self._view = view
+        self._loaded = min(len(view), self.fetch_size)
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._loaded
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._columns)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._loaded < len(self._view)
+
+    def fetchMore(self, parent=QModelIndex()):
+        count = min(self.fetch_size, len(self._view) - self._loaded)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._loaded, self._loaded + count - 1)
+        self._loaded += count
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.ToolTipRole, Qt.TextAlignmentRole):
+            return None
+        value = self._columns[index.column()][self._view[index.row()]]
+        if role == Qt.TextAlignmentRole:
+            return int(Qt.AlignRight | Qt.AlignVCenter) if isinstance(value, (int, float, np.number)) \
+                else int(Qt.AlignLeft | Qt.AlignVCenter)
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            return ''
+        if isinstance(value, (float, np.floating)):
+            return '%.10g' % value
+        return str(value)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return str(self._df.columns[section])
+        return str(int(self._view[section]) + 1)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if column < 0 or not len(self._view):
+            return
+        values = self._columns[column][self._view]
+        if values.dtype.kind in 'fiub':
+            # 数值列：numpy 稳定排序，NaN 总在最后
+            values = values.astype(float)
+            position = np.argsort(values if order == Qt.AscendingOrder else -values, kind='stable')
+            self._set_view(self._view[position])
+            return
+        values = pd.Series(values)
+        try:
+            position = values.sort_values(ascending=order == Qt.AscendingOrder, kind='stable',
+                                          na_position='last').index.to_numpy()
+        except TypeError:
+            # 混合类型列按文本排序
+            position = values.astype(str).sort_values(ascending=order == Qt.AscendingOrder,
+                                                      kind='stable').index.to_numpy()
+        self._set_view(self._view[position])
+
+    def column_text(self, column):
+        # 过滤用的文本列，每列只转换一次
+        if column not in self._text:
+            self._text[column] = pd.Series(self._columns[column]).astype(str).str.lower().to_numpy(dtype=object)
+        return self._text[column]
+
+    def set_filter(self, text, column=None):
+        '''
+        Objective: keep the rows whose cell in column (any column when None) contains text (case-insensitive),
+        in the original row order; an empty text shows every row
+        '''
+        text = text.strip().lower()
+        if not text:
+            self._set_view(np.arange(len(self._df), dtype=np.int64))
+            return
+        columns = range(len(self._columns)) if column is None else [column]
+        keep = np.zeros(len(self._df), dtype=bool)
+        for i in columns:
+            keep |= pd.Series(self.column_text(i)).str.contains(text, regex=False).to_numpy()
+        self._set_view(np.flatnonzero(keep))
+
+    @property
+    def df(self):
+        return self._df
+    @property
+    def row_positions(self):
+        return self._view
+
+
+class ResultView(QWidget):
+    """
+    Results tab: one entry per result table of the last runs (database, shift evaluation, annotation),
+    a debounced filter box and a lazily filled, sortable table.
+    """
+    def __init__(self):
+        super().__init__()
+        self._results = {}
+        self.model = DataFrameModel()
+        layout = QVBoxLayout(self)
+        layout.setSpacing(10)
+
+        bar = QHBoxLayout()
+        self.result_combo = QComboBox()
+        self.result_combo.setMinimumHeight(35)
+        self.result_combo.setMinimumWidth(250)
+        self.result_combo.currentTextChanged.connect(self.show_result)
+        self.column_combo = QComboBox()
+        self.column_combo.setMinimumHeight(35)
+        self.column_combo.setMinimumWidth(180)
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setMinimumHeight(35)
+        self.filter_edit.setPlaceholderText('Filter (contains)...')
+        self.row_label = QLabel('')
+        bar.addWidget(QLabel('Result:'))
+        bar.addWidget(self.result_combo)
+        bar.addWidget(QLabel('Column:'))
+        bar.addWidget(self.column_combo)
+        bar.addWidget(self.filter_edit, 1)
+        bar.addWidget(self.row_label)
+        layout.addLayout(bar)
+
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSortingEnabled(True)
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.table.verticalHeader().setDefaultSectionSize(24)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.setAlternatingRowColors(True)
+        layout.addWidget(self.table)
+
+        # 输入停止 300 ms 后再过滤
+        self._filter_timer = QTimer(self)
+        self._filter_timer.setSingleShot(True)
+        self._filter_timer.setInterval(300)
+        self._filter_timer.timeout.connect(self.apply_filter)
+        self.filter_edit.textChanged.connect(lambda text: self._filter_timer.start())
+        self.column_combo.currentIndexChanged.connect(lambda index: self._filter_timer.start())
+
+    def add_result(self, name, df):
+        '''
+        Objective: add (or replace) a result table and show it
+        '''
+        if df is None:
+            logger.info(f"{name}: no table in memory (streamed output)")
+            return
+        self._results[name] = df
+        if self.result_combo.findText(name) < 0:
+            self.result_combo.addItem(name)
+        if self.result_combo.currentText() == name:
+            self.show_result(name)
+        else:
+            self.result_combo.setCurrentText(name)
+
+    def show_result(self, name):
+        df = self._results.get(name)
+        if df is None:
+            return
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.model.set_frame(df)
+        self.column_combo.blockSignals(True)
+        self.column_combo.clear()
+        self.column_combo.addItem('All columns')
+        self.column_combo.addItems([str(v) for v in df.columns])
+        self.column_combo.blockSignals(False)
+        if self.filter_edit.text():
+            self.apply_filter()
+        self.update_row_label()
+
+    def apply_filter(self):
+        column = self.column_combo.currentIndex() - 1
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.model.set_filter(self.filter_edit.text(), None if column < 0 else column)
+        self.update_row_label()
+
+    def update_row_label(self):
+        self.row_label.setText('%d / %d rows' % (len(self.model.row_positions), len(self.model.df)))
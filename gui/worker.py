@@ -0,0 +1,132 @@
+import threading
+import traceback
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot
+from PyQt5.QtWidgets import QWidget, QHBoxLayout, QLabel, QProgressBar, QPushButton
+from loguru import logger
+from msidat.tools.progress import JobCancelled
+
+
+class WorkerSignals(QObject):
+    """
+    Signals of a JobWorker, delivered to the UI thread by the Qt event loop.
+    """
+    progress = pyqtSignal(int, int, str)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+
+class JobWorker(QRunnable):
+    """
+    Runs fn(progress_callback) on the global QThreadPool.
+    progress_callback(ProgressEvent) is the engines' progress_callback: it forwards the progress
+    to the UI and raises JobCancelled once cancel() was called, which stops the engine at its next checkpoint.
+    The return value of fn is passed to finished; fn must not touch widgets.
+    """
+    def __init__(self, fn):
+        super().__init__()
+        self.fn = fn
+        self.signals = WorkerSignals()
+        self._cancel = threading.Event()
+
+    def progress_callback(self, event):
+        if self._cancel.is_set():
+            raise JobCancelled()
+        self.signals.progress.emit(int(event.done), int(event.total), str(event))
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def is_cancelled(self):
+        return self._cancel.is_set()
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            result = self.fn(self.progress_callback)
+        except JobCancelled:
+            logger.warning('job cancelled')
+            self.signals.cancelled.emit()
+        except Exception as e:
+            logger.debug(traceback.format_exc())
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.finished.emit(result)
+
+
+class JobPanel(QWidget):
+    """
+    Progress bar, status text and cancel button of one tab. start() runs a job on the thread pool,
+    disables the run button while it runs and calls on_finished / on_failed in the UI thread.
+    Each tab has its own panel, so the jobs of different tabs run at the same time.
+    """
+    def __init__(self, run_button=None):
+        super().__init__()
+        self.run_button = run_button
+        self.worker = None
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setMinimumHeight(30)
+        self.progress_bar.setValue(0)
+        self.status_label = QLabel('')
+        self.status_label.setMinimumWidth(150)
+        self.cancel_button = QPushButton('Cancel')
+        self.cancel_button.setMinimumHeight(35)
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel)
+        layout.addWidget(self.progress_bar, 1)
+        layout.addWidget(self.status_label)
+        layout.addWidget(self.cancel_button)
+
+    def start(self, fn, on_finished=None, on_failed=None):
+        if self.is_running:
+            logger.warning('a job is already running in this tab')
+            return None
+        self.worker = JobWorker(fn)
+        self.worker.signals.progress.connect(self.update_progress)
+        self.worker.signals.finished.connect(lambda result: self._done('Done', 100))
+        self.worker.signals.failed.connect(lambda message: self._done('Failed', 0))
+        self.worker.signals.cancelled.connect(lambda: self._done('Cancelled', 0))
+        if on_finished:
+            self.worker.signals.finished.connect(on_finished)
+        if on_failed:
+            self.worker.signals.failed.connect(on_failed)
+        self.progress_bar.setRange(0, 0)
+        self.status_label.setText('Running...')
+        self.cancel_button.setEnabled(True)
+        if self.run_button is not None:
+            self.run_button.setEnabled(False)
+        pool = QThreadPool.globalInstance()
+        # 每个标签页一个任务，保证三个任务可同时运行
+        pool.setMaxThreadCount(max(pool.maxThreadCount(), 3))
+        pool.start(self.worker)
+        return self.worker
+
+    def update_progress(self, done, total, message):
+        if total > 0:
+            self.progress_bar.setRange(0, 100)
+            self.progress_bar.setValue(int(100 * min(done, total) / total))
+        else:
+            self.progress_bar.setRange(0, 0)
+        self.status_label.setText(message)
+
+    def cancel(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.status_label.setText('Cancelling...')
+            self.cancel_button.setEnabled(False)
+
+    def _done(self, status, value):
+        self.worker = None
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(value)
+        self.status_label.setText(status)
+        self.cancel_button.setEnabled(False)
+        if self.run_button is not None:
+            self.run_button.setEnabled(True)
+
+    @property
+    def is_running(self):
+        return self.worker is not None
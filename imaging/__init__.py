@@ -0,0 +1,9 @@
+from .imzml_reader import ImzMLReader
+from .ion_image import extract_ion_images, ion_images_from_annotation, save_ion_images
+from .peak_alignment import AlignedPeaks, align_peaks, consensus_peaks
+from .peak_picking import pick_peaks, pick_peaks_batch
+from .recalibration import PixelRecalibration
+
+__all__ = ['ImzMLReader', 'extract_ion_images', 'ion_images_from_annotation', 'save_ion_images',
+           'AlignedPeaks', 'align_peaks', 'consensus_peaks', 'pick_peaks', 'pick_peaks_batch',
+           'PixelRecalibration']
\ No newline at end of file
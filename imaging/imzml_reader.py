@@ -0,0 +1,250 @@
+import os
+import numpy as np
+from xml.etree.ElementTree import iterparse
+from loguru import logger
+
+# imzML/mzML 受控词表 (cvParam accession)
+CONTINUOUS = 'IMS:1000030'
+PROCESSED = 'IMS:1000031'
+MZ_ARRAY = 'MS:1000514'
+INTENSITY_ARRAY = 'MS:1000515'
+POSITION_X = 'IMS:1000050'
+POSITION_Y = 'IMS:1000051'
+POSITION_Z = 'IMS:1000052'
+EXTERNAL_OFFSET = 'IMS:1000102'
+EXTERNAL_ARRAY_LENGTH = 'IMS:1000103'
+NO_COMPRESSION = 'MS:1000576'
+DATA_TYPES = {
+    'MS:1000521': '<f4',
+    'MS:1000523': '<f8',
+    'MS:1000519': '<i4',
+    'MS:1000522': '<i8',
+    'IMS:1000141': '<i4',
+    'IMS:1000142': '<i8',
+}
+
+
+def _tag(element):
+    return element.tag.rsplit('}', 1)[-1]
+
+
+class ImzMLReader(object):
+    """
+    Reader for imzML imaging data (XML metadata + binary .ibd file).
+    The XML is parsed once for the spectrum offsets; the .ibd file is memory-mapped and
+    every spectrum is returned as zero-copy NumPy views into it.
+    Both continuous (one shared m/z axis) and processed (m/z array per pixel) modes are supported.
+    """
+    def __init__(self, imzml_path, ibd_path=None):
+        self._imzml_path = imzml_path
+        self._ibd_path = ibd_path or self.find_ibd(imzml_path)
+        self._mode = None
+        self._mz_dtype = None
+        self._intensity_dtype = None
+        self.parse()
+        self._ibd = np.memmap(self._ibd_path, dtype=np.uint8, mode='r')
+        logger.info('imzML: {} spectra, {} mode, image {} x {}',
+                    len(self), self._mode, self.shape[1], self.shape[0])
+
+    @staticmethod
+    def find_ibd(imzml_path):
+        stem = os.path.splitext(imzml_path)[0]
+        for ext in ('.ibd', '.IBD', '.Ibd'):
+            if os.path.exists(stem + ext):
+                return stem + ext
+        raise ValueError('ibd file not found for %s' % imzml_path)
+
+    def parse(self):
+        '''
+        Objective: read mode, data types, pixel coordinates and binary offsets from the imzML XML
+        '''
+        param_groups = {}
+        group_params = None
+        coords = []
+        mz_offsets, mz_lengths = [], []
+        int_offsets, int_lengths = [], []
+        spectrum_coord = None
+        array_params = None
+
+        for event, element in iterparse(self._imzml_path, events=('start', 'end')):
+            tag = _tag(element)
+            if event == 'start':
+                if tag == 'referenceableParamGroup':
+                    group_params = {}
+                    param_groups[element.get('id')] = group_params
+                elif tag == 'spectrum':
+                    spectrum_coord = [0, 0, 1]
+                elif tag == 'binaryDataArray':
+                    array_params = {}
+                continue
+
+            if tag == 'cvParam':
+                accession = element.get('accession')
+                value = element.get('value')
+                if array_params is not None:
+                    array_params[accession] = value
+                elif group_params is not None:
+                    group_params[accession] = value
+                elif spectrum_coord is not None:
+                    if accession == POSITION_X:
+                        spectrum_coord[0] = int(value)
+                    elif accession == POSITION_Y:
+                        spectrum_coord[1] = int(value)
+                    elif accession == POSITION_Z:
+                        spectrum_coord[2] = int(value)
+                elif accession in (CONTINUOUS, PROCESSED):
+                    self._mode = 'continuous' if accession == CONTINUOUS else 'processed'
+            elif tag == 'referenceableParamGroupRef':
+                params = param_groups.get(element.get('ref'), {})
+                if array_params is not None:
+                    array_params.update(params)
+                elif spectrum_coord is None and group_params is None:
+                    for accession in params:
+                        if accession in (CONTINUOUS, PROCESSED):
+                            self._mode = 'continuous' if accession == CONTINUOUS else 'processed'
+            elif tag == 'referenceableParamGroup':
+                group_params = None
+            elif tag == 'binaryDataArray':
+                # 只支持未压缩的数组 (MS:1000576)，zlib (MS:1000574) 等压缩数据无法直接映射
+                if NO_COMPRESSION not in array_params:
+                    raise ValueError('compressed imzML binary arrays are not supported')
+                dtype = next((DATA_TYPES[k] for k in array_params if k in DATA_TYPES), None)
+                offset = int(array_params[EXTERNAL_OFFSET])
+                length = int(array_params[EXTERNAL_ARRAY_LENGTH])
+                if MZ_ARRAY in array_params:
+                    self._mz_dtype = self._mz_dtype or dtype
+                    mz_offsets.append(offset)
+                    mz_lengths.append(length)
+                elif INTENSITY_ARRAY in array_params:
+                    self._intensity_dtype = self._intensity_dtype or dtype
+                    int_offsets.append(offset)
+                    int_lengths.append(length)
+                array_params = None
+            elif tag == 'spectrum':
+                coords.append(spectrum_coord)
+                spectrum_coord = None
+                element.clear()
+
+        if self._mode is None:
+            raise ValueError('imzML file does not declare continuous or processed mode')
+        if self._mz_dtype is None or self._intensity_dtype is None:
+            raise ValueError('imzML file does not declare the binary data types')
+        self._coordinates = np.array(coords, dtype=np.int64).reshape(-1, 3)
+        self._mz_offsets = np.array(mz_offsets, dtype=np.int64)
+        self._mz_lengths = np.array(mz_lengths, dtype=np.int64)
+        self._intensity_offsets = np.array(int_offsets, dtype=np.int64)
+        self._intensity_lengths = np.array(int_lengths, dtype=np.int64)
+        if not (len(self._coordinates) == len(self._mz_offsets) == len(self._intensity_offsets)):
+            raise ValueError('imzML spectra must each hold one m/z and one intensity array')
+
+    def _view(self, offset, length, dtype):
+        itemsize = np.dtype(dtype).itemsize
+        return self._ibd[offset:offset + length * itemsize].view(dtype)
+
+    def get_spectrum(self, index):
+        '''
+        Objective: get one pixel spectrum
+        return: (m/z array, intensity array), read-only views into the memory-mapped .ibd file
+        '''
+        mz = self._view(self._mz_offsets[index], self._mz_lengths[index], self._mz_dtype)
+        intensity = self._view(self._intensity_offsets[index], self._intensity_lengths[index],
+                               self._intensity_dtype)
+        return mz, intensity
+
+    def iter_spectra(self, start=0, stop=None):
+        stop = len(self) if stop is None else min(stop, len(self))
+        for index in range(start, stop):
+            yield self.get_spectrum(index)
+
+    def pixel_index(self, x, y):
+        '''
+        Objective: find the spectrum index of pixel (x, y), 1-based as in imzML
+        return: int, -1 if the pixel has no spectrum
+        '''
+        hit = np.flatnonzero((self._coordinates[:, 0] == x) & (self._coordinates[:, 1] == y))
+        return int(hit[0]) if len(hit) else -1
+
+    def mz_range(self):
+        '''
+        return: (lowest, highest) m/z over all spectra
+        '''
+        if self.is_continuous:
+            mz = self.get_spectrum(0)[0]
+            return float(mz.min()), float(mz.max())
+        low, high = np.inf, -np.inf
+        for mz, _ in self.iter_spectra():
+            if len(mz):
+                low, high = min(low, mz.min()), max(high, mz.max())
+        return float(low), float(high)
+
+    def mean_spectrum(self, bin_ppm=2.0, chunk_size=1000, drop_zeros=True):
+        '''
+        Objective: average spectrum over all pixels
+        Continuous data are averaged on the shared m/z axis; processed data are summed into
+        log-spaced bins bin_ppm wide, each bin reporting its intensity-weighted m/z.
+        return: (m/z array, mean intensity array), zero-intensity points removed unless drop_zeros is False
+        '''
+        n = max(len(self), 1)
+        if self.is_continuous:
+            mz_axis = np.asarray(self.get_spectrum(0)[0], dtype=np.float64)
+            total = np.zeros(len(mz_axis), dtype=np.float64)
+            for mz, intensity in self.iter_spectra():
+                total += intensity
+            keep = total > 0 if drop_zeros else slice(None)
+            return mz_axis[keep], total[keep] / n
+
+        low, high = self.mz_range()
+        step = np.log1p(bin_ppm * 1e-6)
+        n_bins = int(np.log(high / low) / step) + 1
+        total = np.zeros(n_bins, dtype=np.float64)
+        weighted = np.zeros(n_bins, dtype=np.float64)
+        for start in range(0, len(self), chunk_size):
+            spectra = list(self.iter_spectra(start, start + chunk_size))
+            mz = np.concatenate([v[0] for v in spectra]).astype(np.float64)
+            intensity = np.concatenate([v[1] for v in spectra]).astype(np.float64)
+            bins = np.minimum((np.log(mz / low) / step).astype(np.int64), n_bins - 1)
+            total += np.bincount(bins, weights=intensity, minlength=n_bins)
+            weighted += np.bincount(bins, weights=intensity * mz, minlength=n_bins)
+        keep = total > 0
+        return weighted[keep] / total[keep], total[keep] / n
+
+    def to_peak_table(self, ppm=5, snr=3.0):
+        '''
+        Objective: summarise the data set as an 'm/z' / 'Intensity' table
+        that CompoundMatch (df_source) and Annotator (MSI data) accept
+        Continuous (profile) data give the peaks picked from the mean spectrum, processed
+        (centroided) data the consensus list of the cross-pixel peak alignment.
+        return: DataFrame
+        '''
+        if not self.is_continuous:
+            from .peak_alignment import consensus_peaks
+            return consensus_peaks(self, ppm=ppm).to_peak_table()[['m/z', 'Intensity']]
+        from .peak_picking import pick_peaks
+        mz, intensity = self.mean_spectrum(drop_zeros=False)
+        return pick_peaks(mz, intensity, snr=snr)[['m/z', 'Intensity']]
+
+    def __len__(self):
+        return len(self._coordinates)
+
+    @property
+    def mode(self):
+        return self._mode
+    @property
+    def is_continuous(self):
+        return self._mode == 'continuous'
+    @property
+    def coordinates(self):
+        '''(n_spectra, 3) array of 1-based (x, y, z) pixel positions'''
+        return self._coordinates
+    @property
+    def shape(self):
+        '''(height, width) of the image'''
+        if not len(self._coordinates):
+            return (0, 0)
+        return (int(self._coordinates[:, 1].max()), int(self._coordinates[:, 0].max()))
+    @property
+    def imzml_path(self):
+        return self._imzml_path
+    @property
+    def ibd_path(self):
+        return self._ibd_path
@@ -0,0 +1,107 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from loguru import logger
+
+
+def _window_sums_continuous(reader, start, stop, lo_idx, hi_idx):
+    # 只取窗口内的点，再用累加和求各窗口之和
+    lengths = hi_idx - lo_idx
+    idx = np.repeat(lo_idx - np.r_[0, np.cumsum(lengths)[:-1]], lengths) + np.arange(lengths.sum())
+    block = np.stack([intensity[idx] for _, intensity in reader.iter_spectra(start, stop)]).astype(np.float64)
+    cs = np.concatenate([np.zeros((len(block), 1)), np.cumsum(block, axis=1)], axis=1)
+    ends = np.cumsum(lengths)
+    return cs[:, ends] - cs[:, ends - lengths]
+
+
+def _window_sums_processed(reader, start, stop, lo, hi):
+    spectra = list(reader.iter_spectra(start, stop))
+    span = max(hi.max(), max((float(mz[-1]) for mz, _ in spectra if len(mz)), default=0.0)) + 1.0
+    keys, values = [], []
+    for k, (mz, intensity) in enumerate(spectra):
+        mz = np.asarray(mz, dtype=np.float64)
+        intensity = np.asarray(intensity, dtype=np.float64)
+        if len(mz) > 1 and np.any(mz[1:] < mz[:-1]):
+            order = np.argsort(mz, kind='stable')
+            mz, intensity = mz[order], intensity[order]
+        # 各像素的 m/z 加上偏移后首尾相接，整体有序，可一次 searchsorted
+        keys.append(mz + k * span)
+        values.append(intensity)
+    keys = np.concatenate(keys) if keys else np.zeros(0)
+    cs = np.r_[0.0, np.cumsum(np.concatenate(values))] if values else np.zeros(1)
+    offsets = (np.arange(len(spectra)) * span)[:, None]
+    left = np.searchsorted(keys, lo[None, :] + offsets, side='left')
+    right = np.searchsorted(keys, hi[None, :] + offsets, side='right')
+    return cs[right] - cs[left]
+
+
+def extract_ion_images(reader, mz_values, ppm=10, chunk_size=1000, n_jobs=None):
+    '''
+    Objective: build ion images for a list of m/z values in one pass over the spectra
+    Input:
+        reader: ImzMLReader (memory-mapped data set)
+        mz_values: m/z of each image, e.g. the annotated m/z column
+        ppm: half width of the m/z window, intensities in [mz(1-ppm), mz(1+ppm)] are summed
+        chunk_size: number of pixels processed per block
+        n_jobs: worker threads, None for os.cpu_count()
+    return: float64 array (n_mz, height, width), 0 where a pixel has no spectrum
+    '''
+    mz_values = np.asarray(mz_values, dtype=np.float64)
+    lo = mz_values * (1 - ppm * 1e-6)
+    hi = mz_values * (1 + ppm * 1e-6)
+    n_pixels = len(reader)
+    if reader.is_continuous:
+        axis = np.asarray(reader.get_spectrum(0)[0], dtype=np.float64)
+        lo_idx = np.searchsorted(axis, lo, side='left')
+        hi_idx = np.searchsorted(axis, hi, side='right')
+        work = lambda start: _window_sums_continuous(reader, start, start + chunk_size, lo_idx, hi_idx)
+    else:
+        work = lambda start: _window_sums_processed(reader, start, start + chunk_size, lo, hi)
+
+    sums = np.zeros((n_pixels, len(mz_values)), dtype=np.float64)
+    starts = range(0, n_pixels, chunk_size)
+    with ThreadPoolExecutor(max_workers=n_jobs or os.cpu_count()) as executor:
+        for start, block in zip(starts, executor.map(work, starts)):
+            sums[start:start + len(block)] = block
+
+    height, width = reader.shape
+    images = np.zeros((len(mz_values), height, width), dtype=np.float64)
+    x = reader.coordinates[:, 0] - 1
+    y = reader.coordinates[:, 1] - 1
+    images[:, y, x] = sums.T
+    logger.info('{} ion images extracted ({} x {}, +/-{} ppm)', len(mz_values), width, height, ppm)
+    return images
+
+
+def ion_images_from_annotation(reader, annotation, ppm=10, annotated_only=True, **kwargs):
+    '''
+    Objective: ion images for the rows of an Annotator result
+    Input:
+        annotation: Annotator output (first column m/z, the 'total' column with the compounds of each row;
+                    columns after it, e.g. q_value or the adduct group columns, are ignored)
+        annotated_only: skip rows without any compound assigned
+    return: (images, keys, rows) with keys '<m/z>|<total annotation>' and the annotation row numbers
+    '''
+    total = annotation['total'].fillna('').astype(str).to_numpy()
+    rows = np.flatnonzero(total != '') if annotated_only else np.arange(len(annotation))
+    mz = annotation.iloc[rows, 0].to_numpy(dtype=np.float64)
+    keys = ['%.6f|%s' % (v, t) for v, t in zip(mz, total[rows])]
+    return extract_ion_images(reader, mz, ppm=ppm, **kwargs), keys, rows
+
+
+def save_ion_images(path, images, keys, rows=None, name='ion_images'):
+    '''
+    Objective: save an ion image stack as compressed .npz, or into an HDF5 result store
+    (.h5/.hdf5, requires h5py) as the image stack name, chunked per image tile for region reads
+    '''
+    keys = np.asarray(keys, dtype=str)
+    rows = np.arange(len(keys)) if rows is None else np.asarray(rows)
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.h5', '.hdf5'):
+        from ..tools.result_store import ResultStore
+        with ResultStore(path) as store:
+            store.write_images(name, images, keys=keys, rows=rows)
+    else:
+        np.savez_compressed(path, images=images, keys=keys, rows=rows)
+    logger.info('ion images saved to {}', path)
+    return path
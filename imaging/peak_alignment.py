@@ -0,0 +1,184 @@
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+
+class _SpectrumList(object):
+    # 让 [(mz, intensity, ...), ...] 列表与 ImzMLReader 用法一致
+    def __init__(self, spectra):
+        self._spectra = spectra
+
+    def __len__(self):
+        return len(self._spectra)
+
+    def iter_spectra(self, start=0, stop=None):
+        for spectrum in self._spectra[start:stop]:
+            yield np.asarray(spectrum[0]), np.asarray(spectrum[1])
+
+
+def _as_reader(spectra):
+    return spectra if hasattr(spectra, 'iter_spectra') else _SpectrumList(list(spectra))
+
+
+def _iter_chunks(reader, chunk_size):
+    # return: (first pixel, pixel number of each peak, m/z, intensity) per block of pixels
+    for start in range(0, len(reader), chunk_size):
+        spectra = list(reader.iter_spectra(start, start + chunk_size))
+        lengths = np.array([len(mz) for mz, _ in spectra], dtype=np.int64)
+        if not lengths.sum():
+            continue
+        pixels = np.repeat(np.arange(start, start + len(spectra)), lengths)
+        mz = np.concatenate([mz for mz, _ in spectra]).astype(np.float64)
+        intensity = np.concatenate([intensity for _, intensity in spectra]).astype(np.float64)
+        yield start, pixels, mz, intensity
+
+
+class AlignedPeaks(object):
+    """
+    Result of a cross-pixel peak alignment.
+    mz: consensus m/z of each feature (sorted)
+    frequency: number of peaks clustered into the feature (one per pixel for resolved peaks)
+    intensity: summed intensity of the feature over all pixels
+    matrix: scipy.sparse CSR matrix (pixels x features), None when only the consensus was computed
+    """
+    def __init__(self, mz, frequency, intensity, n_pixels, matrix=None):
+        self.mz = mz
+        self.frequency = frequency
+        self.intensity = intensity
+        self.n_pixels = n_pixels
+        self.matrix = matrix
+
+    def to_peak_table(self):
+        '''
+        Objective: consensus list as an 'm/z' / 'Intensity' table for Annotator and CompoundMatch
+        return: DataFrame with the mean intensity over all pixels and the pixel frequency
+        '''
+        n = max(self.n_pixels, 1)
+        return pd.DataFrame({'m/z': self.mz, 'Intensity': self.intensity / n,
+                             'Frequency': self.frequency / n})
+
+    def save(self, path, name='features'):
+        '''
+        Objective: store the feature matrix and consensus list in an HDF5 result store (.h5/.hdf5)
+        '''
+        from ..tools.result_store import ResultStore
+        with ResultStore(path) as store:
+            if self.matrix is not None:
+                store.write_matrix(name, self)
+            store.write_table(name, self.to_peak_table())
+        return path
+
+    def __len__(self):
+        return len(self.mz)
+
+
+def consensus_peaks(spectra, ppm=5, min_pixels=1, bin_ppm=None, chunk_size=1000):
+    '''
+    Objective: cluster centroided m/z values of all pixels into consensus features
+    The peaks are accumulated into a log-spaced histogram (bin_ppm wide, default ppm/4) in one pass,
+    so memory depends on the m/z range and not on the number of pixels. Occupied bins are then merged
+    in m/z order while the gap to the previous bin is within ppm, and clusters wider than 2*ppm are cut
+    into 2*ppm wide pieces so dense regions do not chain together.
+    Input:
+        spectra: ImzMLReader or list of (m/z, intensity) arrays, one per pixel/sample,
+                 e.g. the output of pick_peaks_batch
+        min_pixels: drop features seen in fewer pixels
+    return: AlignedPeaks without matrix
+    '''
+    reader = _as_reader(spectra)
+    bin_ppm = bin_ppm or ppm / 4.0
+    step = np.log1p(bin_ppm * 1e-6)
+
+    low, high = np.inf, -np.inf
+    for _, _, mz, _ in _iter_chunks(reader, chunk_size):
+        low, high = min(low, mz.min()), max(high, mz.max())
+    if not np.isfinite(low):
+        return AlignedPeaks(np.zeros(0), np.zeros(0, dtype=np.int64), np.zeros(0), len(reader))
+
+    n_bins = int(np.log(high / low) / step) + 1
+    counts = np.zeros(n_bins, dtype=np.int64)
+    total = np.zeros(n_bins, dtype=np.float64)
+    weighted = np.zeros(n_bins, dtype=np.float64)
+    for _, _, mz, intensity in _iter_chunks(reader, chunk_size):
+        bins = np.minimum((np.log(mz / low) / step).astype(np.int64), n_bins - 1)
+        counts += np.bincount(bins, minlength=n_bins)
+        total += np.bincount(bins, weights=intensity, minlength=n_bins)
+        weighted += np.bincount(bins, weights=intensity * mz, minlength=n_bins)
+
+    occupied = np.flatnonzero(counts)
+    center = np.where(total[occupied] > 0, weighted[occupied] / np.where(total[occupied] > 0, total[occupied], 1),
+                      low * np.exp((occupied + 0.5) * step))
+    # 相邻非空 bin 的 ppm 间隔超过容差则断开
+    gap = np.diff(center) / center[:-1] * 1e6
+    group = np.r_[0, np.cumsum(gap > ppm)]
+    # 过宽的簇按 ppm 宽度再切分
+    group_start = np.r_[0, np.flatnonzero(np.diff(group)) + 1]
+    first = center[group_start][group]
+    piece = (np.log(center / first) / np.log1p(ppm * 1e-6) / 2).astype(np.int64)
+    cluster = np.cumsum(np.r_[True, (np.diff(group) != 0) | (np.diff(piece) != 0)]) - 1
+
+    n_clusters = cluster.max() + 1
+    frequency = np.bincount(cluster, weights=counts[occupied], minlength=n_clusters).astype(np.int64)
+    intensity = np.bincount(cluster, weights=total[occupied], minlength=n_clusters)
+    mz_sum = np.bincount(cluster, weights=weighted[occupied], minlength=n_clusters)
+    mz_mean = np.bincount(cluster, weights=center * counts[occupied], minlength=n_clusters) / frequency
+    consensus = np.where(intensity > 0, mz_sum / np.where(intensity > 0, intensity, 1), mz_mean)
+
+    keep = frequency >= min_pixels
+    order = np.argsort(consensus[keep], kind='stable')
+    logger.info('peak alignment: {} consensus features from {} pixels ({} ppm)',
+                int(keep.sum()), len(reader), ppm)
+    return AlignedPeaks(consensus[keep][order], frequency[keep][order], intensity[keep][order], len(reader))
+
+
+def assign_peaks(mz, consensus, ppm):
+    '''
+    Objective: assign peaks to the nearest consensus m/z within ppm
+    return: feature index of each peak, -1 when no feature is close enough
+    '''
+    if not len(consensus):
+        return np.full(len(mz), -1, dtype=np.int64)
+    right = np.clip(np.searchsorted(consensus, mz), 1, len(consensus) - 1) if len(consensus) > 1 \
+        else np.zeros(len(mz), dtype=np.int64)
+    left = np.maximum(right - 1, 0)
+    nearest = np.where(np.abs(consensus[left] - mz) <= np.abs(consensus[right] - mz), left, right)
+    within = np.abs(consensus[nearest] - mz) <= consensus[nearest] * ppm * 1e-6
+    return np.where(within, nearest, -1)
+
+
+def align_peaks(spectra, ppm=5, min_pixels=1, bin_ppm=None, chunk_size=1000, dtype=np.float32):
+    '''
+    Objective: align centroided peaks across pixels into a sparse pixels x features intensity matrix
+    A first pass builds the consensus list (consensus_peaks), a second pass assigns every peak to its
+    nearest feature and collects the matrix block by block; peaks of one pixel falling on the same
+    feature are summed. Requires scipy.
+    Input:
+        spectra: ImzMLReader or list of (m/z, intensity) arrays, one per pixel/sample
+    return: AlignedPeaks with matrix (scipy.sparse.csr_matrix, n_pixels x n_features)
+    '''
+    try:
+        from scipy import sparse
+    except ImportError:
+        raise ImportError('scipy is required for the sparse feature matrix, '
+                          'use consensus_peaks for the consensus list only')
+    reader = _as_reader(spectra)
+    result = consensus_peaks(reader, ppm=ppm, min_pixels=min_pixels, bin_ppm=bin_ppm, chunk_size=chunk_size)
+    n_features = len(result)
+    blocks = []
+    done = 0
+    for start, pixels, mz, intensity in _iter_chunks(reader, chunk_size):
+        if start > done:
+            blocks.append(sparse.csr_matrix((start - done, n_features), dtype=dtype))
+        stop = min(start + chunk_size, len(reader))
+        feature = assign_peaks(mz, result.mz, ppm)
+        hit = feature >= 0
+        blocks.append(sparse.coo_matrix(
+            (intensity[hit].astype(dtype), (pixels[hit] - start, feature[hit])),
+            shape=(stop - start, n_features)).tocsr())
+        done = stop
+    if done < len(reader):
+        blocks.append(sparse.csr_matrix((len(reader) - done, n_features), dtype=dtype))
+    result.matrix = sparse.vstack(blocks, format='csr') if blocks else \
+        sparse.csr_matrix((len(reader), n_features), dtype=dtype)
+    logger.info('feature matrix: {} x {}, {} non-zero', result.matrix.shape[0], n_features, result.matrix.nnz)
+    return result
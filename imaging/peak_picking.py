@@ -0,0 +1,163 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+PEAK_COLUMNS = ['m/z', 'Intensity', 'SNR', 'FWHM']
+
+
+def estimate_noise(intensity):
+    '''
+    Objective: robust noise level of a spectrum (scaled MAD of the non-zero intensities)
+    return: (baseline, noise)
+    '''
+    values = intensity[intensity > 0]
+    if not len(values):
+        return 0.0, 1.0
+    baseline = float(np.median(values))
+    noise = 1.4826 * float(np.median(np.abs(values - baseline)))
+    if noise <= 0:
+        noise = float(values.mean()) or 1.0
+    return baseline, noise
+
+
+def _half_max_crossing(mz, y, peaks, half, direction):
+    # 从峰顶向一侧逐点推进（对所有峰同时进行），直到强度低于半高
+    pos = peaks.copy()
+    active = np.ones(len(peaks), dtype=bool)
+    last = len(y) - 1
+    while active.any():
+        nxt = pos + direction
+        inside = (nxt >= 0) & (nxt <= last)
+        move = active & inside
+        move[move] = y[nxt[move]] >= half[move]
+        pos[move] = nxt[move]
+        active = move
+    nxt = np.clip(pos + direction, 0, last)
+    crossing = mz[pos].astype(np.float64)
+    edge = (nxt != pos)
+    y0, y1 = y[pos][edge], y[nxt][edge]
+    frac = np.where(y0 != y1, (y0 - half[edge]) / np.where(y0 != y1, y0 - y1, 1), 0)
+    crossing[edge] = mz[pos][edge] + frac * (mz[nxt][edge] - mz[pos][edge])
+    return crossing
+
+
+def pick_peak_arrays(mz, intensity, snr=3.0, min_intensity=0.0):
+    '''
+    Objective: centroid a profile spectrum
+        1. local maxima of the intensity array
+        2. signal-to-noise ratio against a MAD noise estimate
+        3. m/z from a parabola through the apex and its two neighbours
+        4. full width at half maximum from linearly interpolated half-height crossings
+    return: (m/z, intensity, SNR, FWHM) arrays of the accepted peaks
+    '''
+    mz = np.asarray(mz, dtype=np.float64)
+    y = np.asarray(intensity, dtype=np.float64)
+    if len(y) < 3:
+        empty = np.zeros(0)
+        return empty, empty, empty, empty
+    baseline, noise = estimate_noise(y)
+    peaks = np.flatnonzero((y[1:-1] > y[:-2]) & (y[1:-1] >= y[2:])) + 1
+    peak_snr = (y[peaks] - baseline) / noise
+    keep = (peak_snr >= snr) & (y[peaks] >= min_intensity)
+    peaks, peak_snr = peaks[keep], peak_snr[keep]
+
+    # 抛物线插值求质心，以峰顶为原点避免大数相减
+    a = mz[peaks - 1] - mz[peaks]
+    b = mz[peaks + 1] - mz[peaks]
+    d0 = y[peaks - 1] - y[peaks]
+    d2 = y[peaks + 1] - y[peaks]
+    det = a * b * (a - b)
+    safe = det != 0
+    det = np.where(safe, det, 1)
+    curv = (d0 * b - d2 * a) / det
+    slope = (d2 * a * a - d0 * b * b) / det
+    offset = np.where(safe & (curv < 0), -slope / (2 * np.where(curv < 0, curv, -1)), 0)
+    centroid = mz[peaks] + np.clip(offset, a, b)
+
+    half = y[peaks] / 2
+    fwhm = _half_max_crossing(mz, y, peaks, half, 1) - _half_max_crossing(mz, y, peaks, half, -1)
+    return centroid, y[peaks], peak_snr, fwhm
+
+
+def pick_peaks(mz, intensity, snr=3.0, min_intensity=0.0):
+    '''
+    Objective: centroid a profile spectrum (see pick_peak_arrays)
+    return: DataFrame with 'm/z', 'Intensity', 'SNR' and 'FWHM' columns
+    '''
+    return pd.DataFrame(dict(zip(PEAK_COLUMNS, pick_peak_arrays(mz, intensity, snr, min_intensity))))
+
+
+_worker_reader = None
+
+
+def _init_worker(imzml_path, ibd_path, coefficients=None):
+    global _worker_reader
+    from .imzml_reader import ImzMLReader
+    _worker_reader = ImzMLReader(imzml_path, ibd_path)
+    if coefficients is not None:
+        # 工作进程中重新打开数据，按父进程拟合的系数校正
+        from .recalibration import PixelRecalibration
+        _worker_reader = PixelRecalibration.from_coefficients(_worker_reader, coefficients)
+
+
+def _pick_range(args):
+    start, stop, snr, min_intensity = args
+    return [pick_peak_arrays(mz, intensity, snr, min_intensity)
+            for mz, intensity in _worker_reader.iter_spectra(start, stop)]
+
+
+def _pick_list(args):
+    spectra, snr, min_intensity = args
+    return [pick_peak_arrays(mz, intensity, snr, min_intensity) for mz, intensity in spectra]
+
+
+def _worker_source(spectra):
+    # return: (imzML path, ibd path, recalibration coefficients or None) when workers can open the data themselves
+    if hasattr(spectra, 'imzml_path'):
+        return spectra.imzml_path, spectra.ibd_path, None
+    reader = getattr(spectra, 'reader', None)
+    coefficients = getattr(spectra, 'coefficients', None)
+    if hasattr(reader, 'imzml_path') and coefficients is not None:
+        return reader.imzml_path, reader.ibd_path, coefficients
+    return None
+
+
+def pick_peaks_batch(spectra, snr=3.0, min_intensity=0.0, n_jobs=None, chunk_size=256):
+    '''
+    Objective: centroid many profile spectra in a process pool
+    Input:
+        spectra: ImzMLReader or fitted PixelRecalibration of one (each worker memory-maps the same files),
+                 another reader with len() and iter_spectra(start, stop), or list of (m/z, intensity)
+        n_jobs: worker processes, None for os.cpu_count(), 1 to run in this process
+    Other readers are read block by block in this process, with at most 2 * n_jobs blocks in flight.
+    return: list of (m/z, intensity, SNR, FWHM) tuples in input order,
+            accepted by align_peaks as centroided spectra
+    '''
+    n_jobs = n_jobs or os.cpu_count()
+    if not hasattr(spectra, 'iter_spectra'):
+        spectra = list(spectra)
+        if n_jobs == 1:
+            return _pick_list((spectra, snr, min_intensity))
+        blocks = (spectra[start:start + chunk_size] for start in range(0, len(spectra), chunk_size))
+    else:
+        if n_jobs == 1:
+            return [pick_peak_arrays(mz, intensity, snr, min_intensity) for mz, intensity in spectra.iter_spectra()]
+        source = _worker_source(spectra)
+        if source is not None:
+            tasks = [(start, start + chunk_size, snr, min_intensity) for start in range(0, len(spectra), chunk_size)]
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=source) as executor:
+                return [peaks for block in executor.map(_pick_range, tasks) for peaks in block]
+        blocks = (list(spectra.iter_spectra(start, start + chunk_size)) for start in range(0, len(spectra), chunk_size))
+
+    result = []
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        for block in blocks:
+            pending.append(executor.submit(_pick_list, (block, snr, min_intensity)))
+            if len(pending) >= 2 * n_jobs:
+                result.extend(pending.popleft().result())
+        while pending:
+            result.extend(pending.popleft().result())
+    return result
@@ -0,0 +1,195 @@
+import os
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from loguru import logger
+from ..match.compound_match import nearest_peaks
+
+
+def _lock_errors(spectra, lock_mz, tolerance, intensity_threshold):
+    # 一个像素块内，每个像素、每个锁定质量的最近峰及其 ppm 误差（与 CompoundMatch.find_once 规则一致）
+    lengths = np.array([len(mz) for mz, _ in spectra], dtype=np.int64)
+    errors = np.full((len(spectra), len(lock_mz)), np.nan)
+    if not lengths.sum() or not len(lock_mz):
+        return errors
+    mz = np.concatenate([np.asarray(v, dtype=np.float64) for v, _ in spectra])
+    intensity = np.concatenate([np.asarray(v, dtype=np.float64) for _, v in spectra])
+    theoretical = np.tile(lock_mz, len(spectra))
+    # 按像素分组，所有像素的锁定质量一次查完
+    position, rel_diff = nearest_peaks(mz, theoretical, np.repeat(np.arange(len(spectra)), lengths),
+                                       np.repeat(np.arange(len(spectra)), len(lock_mz)))
+    found = np.flatnonzero(position >= 0)
+    accept = found[(rel_diff[found] < tolerance) & (intensity[position[found]] > intensity_threshold)]
+    errors.ravel()[accept] = (mz[position[accept]] - theoretical[accept]) / theoretical[accept] * 1e6
+    return errors
+
+
+class PixelRecalibration(object):
+    """
+    Per-pixel lock-mass recalibration of an imaging data set.
+    For every pixel the lock (internal standard) masses are located as in CompoundMatch (closest peak
+    within mz_tolerance and above intensity_threshold), a correction is fitted and applied to that
+    pixel's m/z array on the fly:
+        model 'shift':  one ppm offset per pixel (median of the lock errors)
+        model 'linear': ppm error = a + b * m/z per pixel (falls back to 'shift' with one lock mass)
+    The object can stand in for the reader (len, get_spectrum, iter_spectra, shape, coordinates),
+    e.g. for extract_ion_images or align_peaks on the corrected data.
+    """
+    def __init__(self, reader, lock_mz, mz_tolerance=20e-6, intensity_threshold=0, model='shift'):
+        if model not in ('shift', 'linear'):
+            raise ValueError('Invalid recalibration model: %s' % model)
+        self._reader = reader
+        self._lock_mz = np.sort(np.asarray(lock_mz, dtype=np.float64)[~np.isnan(np.asarray(lock_mz, dtype=float))])
+        self._mz_tolerance = mz_tolerance
+        self._intensity_threshold = intensity_threshold
+        self._model = model
+        self._coefficients = None
+        self._n_locks = None
+
+    @classmethod
+    def from_compound_match(cls, reader, compound_match, model='shift'):
+        '''
+        Objective: use the target list and the matching parameters of a CompoundMatch as lock masses
+        '''
+        return cls(reader, compound_match.df_target[compound_match.target_mz],
+                   mz_tolerance=compound_match.mz_tolerance,
+                   intensity_threshold=compound_match.intensity_threshold, model=model)
+
+    @classmethod
+    def from_coefficients(cls, reader, coefficients, lock_mz=(), model='shift'):
+        '''
+        Objective: recalibration with already fitted coefficients, e.g. for the same data opened in a worker process
+        '''
+        recalibration = cls(reader, lock_mz, model=model)
+        recalibration._coefficients = np.asarray(coefficients, dtype=np.float64)
+        return recalibration
+
+    def _fit_block(self, start, stop):
+        spectra = list(self._reader.iter_spectra(start, stop))
+        errors = _lock_errors(spectra, self._lock_mz, self._mz_tolerance, self._intensity_threshold)
+        found = ~np.isnan(errors)
+        n_locks = found.sum(axis=1)
+        coefficients = np.full((len(spectra), 2), np.nan)
+        with np.errstate(all='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            coefficients[:, 0] = np.nanmedian(np.where(found, errors, np.nan), axis=1) if errors.size else np.nan
+            coefficients[n_locks > 0, 1] = 0.0
+            if self._model == 'linear':
+                # 按像素做加权最小二乘: ppm = a + b * m/z
+                w = found.astype(np.float64)
+                x = np.broadcast_to(self._lock_mz, errors.shape)
+                y = np.where(found, errors, 0.0)
+                sw, sx, sy = w.sum(1), (w * x).sum(1), y.sum(1)
+                sxx, sxy = (w * x * x).sum(1), (w * x * y).sum(1)
+                denom = sw * sxx - sx * sx
+                linear = (n_locks >= 2) & (np.abs(denom) > 0)
+                slope = (sw * sxy - sx * sy) / np.where(linear, denom, 1)
+                coefficients[linear, 1] = slope[linear]
+                coefficients[linear, 0] = ((sy - slope * sx) / np.where(sw > 0, sw, 1))[linear]
+        return coefficients, n_locks
+
+    def fit(self, chunk_size=1000, n_jobs=None):
+        '''
+        Objective: locate the lock masses and fit the correction of every pixel, block by block
+        in a thread pool over the memory-mapped data
+        return: self
+        '''
+        n_pixels = len(self._reader)
+        self._coefficients = np.full((n_pixels, 2), np.nan)
+        self._n_locks = np.zeros(n_pixels, dtype=np.int64)
+        starts = range(0, n_pixels, chunk_size)
+        with ThreadPoolExecutor(max_workers=n_jobs or os.cpu_count()) as executor:
+            blocks = executor.map(lambda start: self._fit_block(start, start + chunk_size), starts)
+            for start, (coefficients, n_locks) in zip(starts, blocks):
+                self._coefficients[start:start + len(n_locks)] = coefficients
+                self._n_locks[start:start + len(n_locks)] = n_locks
+        fitted = ~np.isnan(self._coefficients[:, 0])
+        logger.info('lock-mass recalibration: {} of {} pixels fitted, median drift {:.2f} ppm',
+                    int(fitted.sum()), n_pixels,
+                    float(np.median(self.drift_ppm[fitted])) if fitted.any() else float('nan'))
+        return self
+
+    def correct(self, index, mz):
+        '''
+        Objective: apply the correction of pixel index to an m/z array
+        return: corrected m/z (float64 copy); unchanged when the pixel could not be fitted
+        '''
+        a, b = self._coefficients[index]
+        mz = np.asarray(mz, dtype=np.float64)
+        if np.isnan(a):
+            return mz.copy()
+        return mz / (1 + (a + b * mz) * 1e-6)
+
+    def get_spectrum(self, index):
+        mz, intensity = self._reader.get_spectrum(index)
+        return self.correct(index, mz), intensity
+
+    def iter_spectra(self, start=0, stop=None):
+        stop = len(self) if stop is None else min(stop, len(self))
+        for index in range(start, stop):
+            yield self.get_spectrum(index)
+
+    def __len__(self):
+        return len(self._reader)
+
+    @property
+    def is_continuous(self):
+        # 校正后各像素的 m/z 轴不再相同
+        return False
+    @property
+    def reader(self):
+        return self._reader
+    @property
+    def coordinates(self):
+        return self._reader.coordinates
+    @property
+    def shape(self):
+        return self._reader.shape
+    @property
+    def lock_mz(self):
+        return self._lock_mz
+    @property
+    def coefficients(self):
+        '''(n_pixels, 2) array of (a, b) with ppm error = a + b * m/z, NaN where no lock mass was found'''
+        return self._coefficients
+    @property
+    def drift_ppm(self):
+        '''per-pixel drift in ppm, evaluated at the mean lock mass'''
+        return self._coefficients[:, 0] + self._coefficients[:, 1] * self._lock_mz.mean()
+
+    def drift_map(self):
+        '''
+        return: (drift ppm image, number-of-lock-masses image), drift NaN where a pixel was not fitted
+        '''
+        height, width = self.shape
+        drift = np.full((height, width), np.nan)
+        n_locks = np.zeros((height, width), dtype=np.int64)
+        x = self.coordinates[:, 0] - 1
+        y = self.coordinates[:, 1] - 1
+        drift[y, x] = self.drift_ppm
+        n_locks[y, x] = self._n_locks
+        return drift, n_locks
+
+    def save_drift_map(self, path, name='recalibration'):
+        '''
+        Objective: save the drift map, as arrays in a .npz file, into an HDF5 result store (.h5/.hdf5)
+        or as a per-pixel table (x, y, drift, number of lock masses, coefficients) in any format write_table supports
+        '''
+        ext = os.path.splitext(path)[1].lower()
+        if ext in ('.h5', '.hdf5'):
+            from ..tools.result_store import ResultStore
+            with ResultStore(path) as store:
+                store.write_calibration(name, self)
+        elif ext == '.npz':
+            drift, n_locks = self.drift_map()
+            np.savez_compressed(path, drift_ppm=drift, n_locks=n_locks, coefficients=self._coefficients,
+                                coordinates=self.coordinates, lock_mz=self._lock_mz)
+        else:
+            from ..tools.table_io import write_table
+            write_table(pd.DataFrame({
+                'x': self.coordinates[:, 0], 'y': self.coordinates[:, 1],
+                'Drift (ppm)': self.drift_ppm, 'Lock Masses Found': self._n_locks,
+                'Offset (ppm)': self._coefficients[:, 0], 'Slope (ppm per m/z)': self._coefficients[:, 1]}), path)
+        logger.info('drift map saved to {}', path)
+        return path
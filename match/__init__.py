@@ -1,3 +1,3 @@
-from .compound_match import CompoundMatch
+from .compound_match import CompoundMatch, nearest_peaks
 
-__all__ = ['CompoundMatch']
\ No newline at end of file
+__all__ = ['CompoundMatch', 'nearest_peaks']
\ No newline at end of file
@@ -2,6 +2,53 @@ import os
 import pandas as pd
 import numpy as np
 from loguru import logger
+from ..tools.table_io import write_table, write_table_streaming
+from ..tools.progress import ProgressReporter
+
+def nearest_peaks(source_mz, theoretical_mz, source_group=None, theoretical_group=None):
+    """
+    Find for every theoretical m/z the closest source m/z (smallest |(source - theoretical)/theoretical|,
+    the first source row on ties) with one sorted search instead of a scan per target.
+    With source_group / theoretical_group (non-negative integer labels, e.g. the pixel of every peak and of
+    every lock mass) a theoretical m/z only matches source rows of its own group, all groups in one search.
+    return: (row position in source_mz, -1 if none; relative difference, NaN if none)
+    """
+    source_mz = np.asarray(source_mz, dtype=float)
+    theoretical_mz = np.atleast_1d(np.asarray(theoretical_mz, dtype=float))
+    position = np.full(len(theoretical_mz), -1, dtype=np.int64)
+    rel_diff = np.full(len(theoretical_mz), np.nan)
+    valid = np.flatnonzero(~np.isnan(source_mz))
+    if not len(valid):
+        return position, rel_diff
+    if source_group is None:
+        source_key, theoretical_key = source_mz, theoretical_mz
+        source_group = np.zeros(len(source_mz), dtype=np.int64)
+        theoretical_group = np.zeros(len(theoretical_mz), dtype=np.int64)
+    else:
+        source_group = np.asarray(source_group, dtype=np.int64)
+        theoretical_group = np.atleast_1d(np.asarray(theoretical_group, dtype=np.int64))
+        # 各组 m/z 加上偏移后首尾相接，整体有序，一次 searchsorted 查所有组
+        span = 2 * max(np.abs(source_mz[valid]).max(), np.nanmax(np.abs(theoretical_mz), initial=0.0)) + 1.0
+        source_key = source_mz + source_group * span
+        theoretical_key = theoretical_mz + theoretical_group * span
+    order = valid[np.argsort(source_key[valid], kind='stable')]
+    sorted_key = source_key[order]
+    right = np.minimum(np.searchsorted(sorted_key, theoretical_key, side='left'), len(order) - 1)
+    # 左侧候选取相同 m/z 中的第一个，保证并列时取原表中靠前的行
+    left = np.searchsorted(sorted_key, sorted_key[np.maximum(right - 1, 0)], side='left')
+    with np.errstate(invalid='ignore'):
+        diff_left = np.where(source_group[order[left]] == theoretical_group,
+                             np.abs((source_mz[order[left]] - theoretical_mz) / theoretical_mz), np.inf)
+        diff_right = np.where(source_group[order[right]] == theoretical_group,
+                              np.abs((source_mz[order[right]] - theoretical_mz) / theoretical_mz), np.inf)
+    take_left = (diff_left < diff_right) | ((diff_left == diff_right) & (order[left] < order[right]))
+    pick = np.where(take_left, left, right)
+    diff = np.where(take_left, diff_left, diff_right)
+    found = ~np.isnan(theoretical_mz) & np.isfinite(diff)
+    position[found] = order[pick][found]
+    rel_diff[found] = diff[found]
+    return position, rel_diff
+
 
 class CompoundMatch(object):
     def __init__(self, df_source=None, df_target=None):
@@ -16,6 +63,11 @@ class CompoundMatch(object):
         self._output_intensity = 'Intensity'
         self._intensity_threshold = 1000
         self._mz_tolerance = 20e-6
+        self._streaming = False
+        self._source_profile = False
+        self._progress_callback = None
+        self._result_cache = None
+        self._cache_key = None
         self._output_file = os.path.join(os.path.dirname(os.path.dirname(__file__)),
                                       'userdata','output_mz.xlsx')
 
@@ -24,25 +76,87 @@ class CompoundMatch(object):
         logger.info("target data shape: {}".format(self._df_target.shape))
         logger.info("intensity_threshold: {}".format(self._intensity_threshold))
         logger.info("mz tolerance: {} ppm".format(self._mz_tolerance*1e6))
+        progress = ProgressReporter(self._progress_callback, 'shift')
+        progress.start('compute', len(self._df_target))
+        # 输入表与参数未变时直接使用缓存结果
+        self._cache_key = None
+        if self._result_cache is not None and self._result_cache.enabled:
+            self._cache_key = self._result_cache.key('shift', frames=[self._df_source, self._df_target], params={
+                'source_mz': self._source_mz, 'source_intensity': self._source_intensity,
+                'target_mz': self._target_mz, 'output_mz': self._output_mz, 'output_rel_error': self._output_rel_error,
+                'intensity_threshold': self._intensity_threshold, 'mz_tolerance': self._mz_tolerance})
+            cached = self._result_cache.get(self._cache_key)
+            if cached is not None:
+                self._df_output = cached['df_output']
+                for name, value in cached['statistics'].items():
+                    setattr(self, name, value)
+                progress.finish()
+                return
         self._df_output = self._df_target.copy()
-        self._df_output[self._output_mz] = self._df_target[self._target_mz].apply(self.find_once)
+        self._df_output[self._output_mz] = self.find_all(self._df_target[self._target_mz])
         self._df_output[self._output_rel_error] = (self._df_output[self._output_mz] - 
                 self._df_output[self._target_mz]) / self._df_output[self._target_mz] * 1e6  # ppm
         self.avg_rel_error = self._df_output[self._output_rel_error].mean()  # ppm
         self.max_rel_error = self._df_output[self._output_rel_error].max()  # ppm
         self.min_rel_error = self._df_output[self._output_rel_error].min()  # ppm
         self.std_rel_error = self._df_output[self._output_rel_error].std()
+        self.median_rel_error = self._df_output[self._output_rel_error].median()
+        if self._cache_key is not None:
+            self._result_cache.put(self._cache_key, {'df_output': self._df_output, 'statistics': {
+                name: getattr(self, name) for name in
+                ('avg_rel_error', 'max_rel_error', 'min_rel_error', 'std_rel_error', 'median_rel_error')}})
+        progress.finish()
         # self._df_output[self._output_intensity] = self._df_output[self._output_mz].apply(self.find_intensity)
 
+    def centroid_source(self, snr=3.0):
+        """
+        Replace a profile-mode source spectrum by its picked peaks (centroids), keeping the
+        source m/z and intensity column names so match() can run on it directly.
+        """
+        from ..imaging.peak_picking import pick_peaks
+        progress = ProgressReporter(self._progress_callback, 'shift')
+        progress.start('index', len(self._df_source))
+        peaks = pick_peaks(self._df_source[self._source_mz], self._df_source[self._source_intensity], snr=snr)
+        progress.finish()
+        logger.info("centroided profile source: {} points -> {} peaks".format(len(self._df_source), len(peaks)))
+        self._df_source = peaks.rename(columns={'m/z': self._source_mz, 'Intensity': self._source_intensity})
+
+    def recalibrate(self, df, mz_column=None, shift_ppm=None):
+        """
+        Correct the m/z column of a peak table (default the source m/z column) by the mass shift found
+        in match(), the median relative error unless shift_ppm is given: m/z / (1 + shift * 1e-6).
+        return: corrected copy of df
+        """
+        shift_ppm = self.median_rel_error if shift_ppm is None else shift_ppm
+        mz_column = self._source_mz if mz_column is None else mz_column
+        if pd.isna(shift_ppm):
+            logger.warning("no target matched, m/z left uncorrected")
+            return df.copy()
+        df = df.copy()
+        df[mz_column] = df[mz_column].astype(float) / (1 + shift_ppm * 1e-6)
+        logger.info("recalibrated {} m/z values by {:.3f} ppm".format(len(df), shift_ppm))
+        return df
+
+    def find_all(self, theoretical_mz):
+        """
+        Vectorized find_once over an array of theoretical m/z values.
+        """
+        source_mz = self._df_source[self._source_mz].to_numpy(dtype=float)
+        intensity = self._df_source[self._source_intensity].to_numpy()
+        position, rel_diff = nearest_peaks(source_mz, theoretical_mz)
+        found = position >= 0
+        accept = np.zeros(len(position), dtype=bool)
+        accept[found] = (rel_diff[found] < self._mz_tolerance) & \
+                        (intensity[position[found]] > self._intensity_threshold)
+        measured = np.full(len(position), np.nan)
+        measured[accept] = source_mz[position[accept]]
+        return measured
+
     def find_once(self, theoretical_mz):
         """
         Find the closest m/z value in the source data to the theoretical m/z value in the target data.
         """
-        mz_diff = np.abs((self._df_source[self._source_mz] - theoretical_mz)/theoretical_mz)
-        if mz_diff.min() < self._mz_tolerance:
-            if self._df_source.loc[mz_diff.idxmin(), self._source_intensity] > self._intensity_threshold:
-                return self._df_source[self._source_mz].iloc[mz_diff.idxmin()]
-        return np.nan
+        return self.find_all([theoretical_mz])[0]
     
     def find_intensity(self, source_mz):
         """
@@ -53,16 +167,30 @@ class CompoundMatch(object):
                                    self._source_intensity].values[0]
         else:
             intensity = np.nan
-        logger.debug("source_mz: {}".format(source_mz))
+        logger.debug("source_mz: {}", source_mz)
         return intensity
     
     def output_process(self):
         """
-        Save the output DataFrame to an Excel file.
+        Save the output DataFrame to an Excel (or CSV/Parquet/Feather) file.
+        The write is skipped when the file is the unchanged output of the same cached result.
+        With streaming only the writer is chunked: df_output (the target list plus two columns) is built
+        whole by match(), because the shift statistics and recalibrate() need all of it.
         """
+        if self._cache_key is not None and self._result_cache.output_current(self._cache_key, self._output_file):
+            logger.info(f"Output unchanged, kept {self._output_file}")
+            return
         os.makedirs(os.path.dirname(self._output_file), exist_ok=True)
+        progress = ProgressReporter(self._progress_callback, 'shift')
+        progress.start('write', len(self._df_output))
         # 将 DataFrame 写入 Excel 文件
-        self._df_output.to_excel(self._output_file, index=False)
+        if self._streaming:
+            write_table_streaming(self._df_output, self._output_file)
+        else:
+            write_table(self._df_output, self._output_file)
+        progress.finish()
+        if self._cache_key is not None:
+            self._result_cache.record_output(self._cache_key, self._output_file)
         logger.info(f"Output successfully saved to {self._output_file}")
 
 
@@ -109,6 +237,12 @@ class CompoundMatch(object):
     def output_mz(self, value):
         self._output_mz = value
     @property
+    def output_rel_error(self):
+        return self._output_rel_error
+    @output_rel_error.setter
+    def output_rel_error(self, value):
+        self._output_rel_error = value
+    @property
     def output_intensity(self):
         return self._output_intensity
     @output_intensity.setter
@@ -127,9 +261,33 @@ class CompoundMatch(object):
     def mz_tolerance(self, value):
         self._mz_tolerance = value
     @property
+    def source_profile(self):
+        return self._source_profile
+    @source_profile.setter
+    def source_profile(self, value):
+        self._source_profile = value
+    @property
+    def streaming(self):
+        return self._streaming
+    @streaming.setter
+    def streaming(self, value):
+        self._streaming = value
+    @property
     def output_file(self):
         return self._output_file
     @output_file.setter
     def output_file(self, value):
         self._output_file = value
-
+    @property
+    def progress_callback(self):
+        return self._progress_callback
+    @progress_callback.setter
+    def progress_callback(self, value):
+        self._progress_callback = value
+    @property
+    def result_cache(self):
+        '''tools.result_cache.ResultCache of match() results, None for no caching'''
+        return self._result_cache
+    @result_cache.setter
+    def result_cache(self, value):
+        self._result_cache = value
@@ -0,0 +1,33 @@
+import numpy as np
+from .compound_match import nearest_peaks
+from ..annotator.preview import error_summary
+
+
+class ShiftPreview(object):
+    """
+    Live preview of the mass shift evaluation for changing m/z tolerance and intensity threshold.
+    The nearest source peak of every target does not depend on either setting, so it is searched once;
+    a preview only applies the acceptance rule of CompoundMatch.find_all to these candidates.
+    """
+    def __init__(self, compound_match):
+        df_source, df_target = compound_match.df_source, compound_match.df_target
+        source_mz = df_source[compound_match.source_mz].to_numpy(dtype=float)
+        intensity = df_source[compound_match.source_intensity].to_numpy(dtype=float)
+        theoretical = df_target[compound_match.target_mz].to_numpy(dtype=float)
+        position, self._rel_diff = nearest_peaks(source_mz, theoretical)
+        found = position >= 0
+        self._intensity = np.full(len(position), np.nan)
+        self._intensity[found] = intensity[position[found]]
+        self._error = np.full(len(position), np.nan)
+        self._error[found] = (source_mz[position[found]] - theoretical[found]) / theoretical[found] * 1e6
+
+    def summary(self, tolerance_ppm, intensity_threshold, bins=40):
+        '''
+        return: dict with targets, matched and the summary of the relative errors (ppm) of the matched targets
+        '''
+        with np.errstate(invalid='ignore'):
+            accept = (self._rel_diff < tolerance_ppm * 1e-6) & (self._intensity > intensity_threshold)
+        summary = error_summary(np.sort(self._error[accept]), -tolerance_ppm, tolerance_ppm, bins)
+        summary['targets'] = len(self._error)
+        summary['matched'] = summary['count']
+        return summary
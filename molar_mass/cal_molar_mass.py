@@ -4,10 +4,12 @@ import pandas as pd
 import json
 import re
 from loguru import logger
+from ..tools.table_io import read_table, write_tables, file_format, table_path, StreamingTableWriter
+from ..tools.progress import ProgressReporter
 
 class MolarMassCalculator(object):
     def __init__(self, input_file=None, output_file=None, compounds_col='Formula', 
-                 input_sheet=0, elements_mass_file=None, adduct_type_file=None):
+                 input_sheet=0, elements_mass_file=None, adduct_type_file=None, streaming=False):
         # self._elements_mass_file = os.path.join(
         #     os.path.dirname(os.path.dirname(__file__)), 'database', 'elements_mass.json')
         # self._adduct_type_file = os.path.join(
@@ -21,6 +23,11 @@ class MolarMassCalculator(object):
         self._input_sheet = input_sheet
         self._output_file = output_file
         self._compounds_col = compounds_col
+        self._streaming = streaming
+        self._progress_callback = None
+        self._progress = ProgressReporter()
+        self._result_cache = None
+        self._cache_key = None
 
     def cal_molar_mass(self, compounds_str):
         '''
@@ -38,12 +45,12 @@ class MolarMassCalculator(object):
             raise ValueError('Elements mass not found. Please select a valid file.')
         compounds_str = compounds_str.strip('[]')
         compounds_list = compounds_str.replace(',', ' ').replace(';', ' ').split(' ')
-        logger.debug('compound list: %s' %compounds_list)
+        logger.debug('compound list: {}', compounds_list)
         ele_list = []
         for compound in compounds_list:
             for item in self.compound_split(compound):
                 ele_list.append(item)
-        logger.debug('element list: %s' %ele_list)
+        logger.debug('element list: {}', ele_list)
         molar_mass = 0
         for item in ele_list:
             _cnt = int(item[1]) if item[1] else 1
@@ -88,15 +95,111 @@ class MolarMassCalculator(object):
         return ele_group
 
     def process_file(self, positive_list=None, negative_list=None, all=True):
+        '''
+        Objective: calculate the m/z tables and write them to output_file
+        return: dict {sheet: DataFrame}; empty with streaming, where the tables are written as they are
+                produced and not kept
+        '''
         logger.info('Start processing file')
-        df = pd.read_excel(self._input_file,engine='openpyxl',sheet_name=self._input_sheet)
-        compounds_series = df.loc[:,self._compounds_col]
-        result = np.array([self.cal_molar_mass(v) for v in compounds_series])
-        index = df.shape[1]
-        df.insert(index, 'Monoisotopic Molecular Weight', result)
-        df.insert(index+1, 'ID', df.index + 1)
-        df2 = df.copy()
+        if self._streaming:
+            self._progress = ProgressReporter(self._progress_callback, 'database')
+            self._cache_key = None
+            rows = self.write_streaming(positive_list=positive_list, negative_list=negative_list, all=all)
+            self._progress.finish()
+            logger.info('Output file: %s (%d rows streamed)' %(self._output_file, rows))
+            return {}
+        frames = self.calculate(positive_list=positive_list, negative_list=negative_list, all=all)
+        outputs = self.output_files(frames)
+        if self._cache_key is not None and self._result_cache.output_current(self._cache_key, outputs):
+            logger.info('Output unchanged: %s' %self._output_file)
+            return frames
+        self._progress.start('write', sum(len(v) for v in frames.values()))
+        write_tables(frames, self._output_file)
+        self._progress.finish()
+        if self._cache_key is not None:
+            self._result_cache.record_output(self._cache_key, outputs)
+        logger.info('Output file: %s' %self._output_file)
+        return frames
+
+    def output_files(self, frames):
+        '''
+        return: files written for frames, one workbook / store or one file per sheet
+        '''
+        if file_format(self._output_file) in ('excel', 'hdf5'):
+            return [self._output_file]
+        return [table_path(self._output_file, sheet) for sheet in frames]
+
+    def calculate(self, positive_list=None, negative_list=None, all=True, df=None):
+        '''
+        Objective: build the positive / negative m/z tables in memory
+        Input: df, the compound table; read from input_file when None
+        return: dict {'positive': DataFrame, 'negative': DataFrame}
+        '''
+        self._progress = ProgressReporter(self._progress_callback, 'database')
+        # 输入文件、元素质量、加合物文件与参数未变时直接使用缓存结果
+        self._cache_key = None
+        if df is None and self._result_cache is not None and self._result_cache.enabled:
+            self._cache_key = self._result_cache.key(
+                'database', files=[(self._input_file, self._input_sheet), self._elements_mass_file,
+                                   self._adduct_type_file],
+                params={'compounds_col': self._compounds_col, 'all': bool(all),
+                        'positive_list': list(positive_list or []), 'negative_list': list(negative_list or [])})
+            frames = self._result_cache.get(self._cache_key)
+            if frames is not None:
+                return frames
+        df = self._read_input(df)
+        adducts = self.adducts(positive_list, negative_list, all)
+        compounds_series = df.loc[:,self._compounds_col].tolist()
+        result = []
+        # 分块计算，每块之后报告进度（可在此处取消）
+        self._progress.start('compute', len(compounds_series))
+        for start in range(0, len(compounds_series), 1000):
+            self._progress.update(start)
+            result.extend(self.cal_molar_mass(v) for v in compounds_series[start:start+1000])
+        self._progress.finish()
+        result = np.array(result)
+
+        frames = {sheet: self._mass_table(df, result, table) for sheet, table in adducts.items()}
+        logger.info('Molar mass calculation completed, total %d rows processed' %len(df))
+        if self._cache_key is not None:
+            self._result_cache.put(self._cache_key, frames)
+        return frames
+
+    def iter_calculate(self, positive_list=None, negative_list=None, all=True, df=None, chunk_size=50000):
+        '''
+        Objective: produce the positive / negative m/z tables block by block, without building them whole
+        The masses are computed once, while the blocks of the first table are produced (only the mass
+        array is kept for the second one).
+        return: generator of (sheet, DataFrame of at most chunk_size rows)
+        '''
+        df = self._read_input(df)
+        return self._iter_tables(df, self.adducts(positive_list, negative_list, all), chunk_size)
 
+    def _iter_tables(self, df, adducts, chunk_size):
+        compounds_series = df.loc[:,self._compounds_col].tolist()
+        result = np.full(len(compounds_series), np.nan)
+        done = 0
+        for sheet, table in adducts.items():
+            for start in range(0, max(len(df), 1), chunk_size):
+                stop = min(start+chunk_size, len(df))
+                if stop > done:
+                    result[done:stop] = [self.cal_molar_mass(v) for v in compounds_series[done:stop]]
+                    done = stop
+                yield sheet, self._mass_table(df.iloc[start:stop], result[start:stop], table)
+        logger.info('Molar mass calculation completed, total %d rows processed' %len(df))
+
+    def _read_input(self, df):
+        if df is None:
+            self._progress.start('read', 1)
+            df = read_table(self._input_file,sheet_name=self._input_sheet)
+            self._progress.finish()
+        return df
+
+    def adducts(self, positive_list=None, negative_list=None, all=True):
+        '''
+        Objective: adduct columns of the output tables from the adduct type file
+        return: dict {'positive': {'[M+H]+': delta, ...}, 'negative': {...}}, without empty tables
+        '''
         adduct_set = json.load(open(self._adduct_type_file, 'r', encoding='utf-8'))
         adduct_set_positive = adduct_set['positve']
         adduct_set_negative = adduct_set['negative']
@@ -106,38 +209,43 @@ class MolarMassCalculator(object):
 
         logger.info(f"Positive list: {positive_list}")
         logger.info(f"Negative list: {negative_list}")
+        tables = {}
+        if positive_list:
+            tables['positive'] = {'[%s]+' %adduct: adduct_set_positive[adduct] for adduct in positive_list}
+        if negative_list:
+            tables['negative'] = {'[%s]-' %adduct: adduct_set_negative[adduct] for adduct in negative_list}
+        return tables
 
-        for adduct, idx in zip(positive_list, range(index+2, index+2+len(positive_list))):
-            df.insert(idx, '[%s]+' %adduct, result+adduct_set_positive[adduct])
-        df.round(5)
-
-        for adduct, idx in zip(negative_list, range(index+2, index+2+len(negative_list))):
-            df2.insert(idx, '[%s]-' %adduct, result+adduct_set_negative[adduct])
-        df2.round(5)
-
-
-        # df.insert(4, '[M+H]+', result+1.0072766)
-        # df.insert(5, '[M+Na]+', result+22.9892213)
-        # df.insert(6, '[M+K]+', result+38.9631585)
-        # df.insert(7, '[M+NH4]+', result+18.0338257)
-        # df.insert(8, '[M+H-H2O]+', result+17.0032880)
-        # df.insert(9, '[M]+', result-0.0005484)
-        # df.round(5)
-
-        # df2.insert(4, '[M-H]-', result-1.0072766)
-        # df2.insert(5, '[M+Cl]-', result+34.9694011)
-        # df2.insert(6, '[M-H-H2O]-', result-19.0178413)
-        # df2.insert(7, '[M+CH3COO]-', result+59.0138527)
-        # df2.insert(8, '[M+HCOO]-', result+44.9982026)
-        # df2.round(5)
-
-        with pd.ExcelWriter(self._output_file) as writer:
-            if positive_list:
-                df.to_excel(writer, sheet_name='positive',index=False)
-            if negative_list:
-                df2.to_excel(writer, sheet_name='negative',index=False)
-        logger.info('Molar mass calculation completed, total %d rows processed' %len(df))
-        logger.info('Output file: %s' %self._output_file)
+    @staticmethod
+    def _mass_table(df, result, adducts):
+        # 输入列 + 'Monoisotopic Molecular Weight' + 'ID' + 每个加合物一列 m/z
+        df = df.copy()
+        index = df.shape[1]
+        df.insert(index, 'Monoisotopic Molecular Weight', result)
+        df.insert(index+1, 'ID', df.index + 1)
+        for idx, (column, delta) in enumerate(adducts.items(), index+2):
+            df.insert(idx, column, result+delta)
+        return df
+
+    def write_streaming(self, positive_list=None, negative_list=None, all=True):
+        '''
+        Objective: compute and write the m/z tables block by block with a constant-memory writer,
+        the tables never exist in memory as a whole
+        return: number of rows written
+        '''
+        df = self._read_input(None)
+        adducts = self.adducts(positive_list, negative_list, all)
+        single_file = file_format(self._output_file) in ('excel', 'hdf5')
+        table = None
+        self._progress.start('write', len(df) * len(adducts))
+        with StreamingTableWriter(self._output_file) as writer:
+            for sheet, chunk in self._iter_tables(df, adducts, 10000):
+                if sheet != table:
+                    writer.add_table(sheet, path=None if single_file else table_path(self._output_file, sheet))
+                    table = sheet
+                self._progress.update(writer.rows_written)
+                writer.write_frame(chunk)
+        return writer.rows_written
         
     def get_ele_mass(self):
         if not os.path.exists(self._elements_mass_file):
@@ -183,10 +291,29 @@ class MolarMassCalculator(object):
     def compounds_col(self, value):
         self._compounds_col = value
     @property
+    def streaming(self):
+        return self._streaming
+    @streaming.setter
+    def streaming(self, value):
+        self._streaming = value
+    @property
     def input_sheet(self):
         return self._input_sheet
     @input_sheet.setter
     def input_sheet(self, value):
         self._input_sheet = value
         
+    @property
+    def progress_callback(self):
+        return self._progress_callback
+    @progress_callback.setter
+    def progress_callback(self, value):
+        self._progress_callback = value
 
+    @property
+    def result_cache(self):
+        '''tools.result_cache.ResultCache of calculate() results (input file only), None for no caching'''
+        return self._result_cache
+    @result_cache.setter
+    def result_cache(self, value):
+        self._result_cache = value
@@ -0,0 +1,46 @@
+import os
+import sys
+import argparse
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+sys.path.insert(0, project_root)
+
+from msidat.benchmarks import BenchmarkSuite, compare_results, load_results, save_results
+from msidat.benchmarks.suite import CASES, FORMATS, DEFAULT_SIZES
+from msidat.tools.msidat_logger import setup_msidat_logger
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='msidat benchmarks on synthetic data')
+    parser.add_argument('-s', '--sizes', default=','.join(DEFAULT_SIZES),
+                        help='comma separated sizes, e.g. 1k,100k,10M (default: %(default)s)')
+    parser.add_argument('-c', '--cases', default=','.join(CASES), help='comma separated cases (default: all)')
+    parser.add_argument('-f', '--formats', default=','.join(FORMATS),
+                        help='table_io file extensions (default: %(default)s)')
+    parser.add_argument('--database-size', type=int, default=1000, help='compounds of the annotation database')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='best of REPEAT runs (default: 3)')
+    parser.add_argument('--no-check', action='store_true', help='skip the brute-force reference checks')
+    parser.add_argument('--check-size', type=int, default=100, help='items checked per case (default: 100)')
+    parser.add_argument('-o', '--output-dir', default='benchmark_results', help='results directory')
+    parser.add_argument('--compare', metavar='BASELINE', help='results file of an earlier commit to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='slowdown reported as a regression (default: 0.2)')
+    args = parser.parse_args(argv)
+    setup_msidat_logger(log_files=False)
+
+    suite = BenchmarkSuite(sizes=args.sizes.split(','), cases=args.cases.split(','),
+                           formats=['.' + v.lstrip('.') for v in args.formats.split(',')],
+                           database_size=args.database_size, repeat=args.repeat, check=not args.no_check,
+                           check_size=args.check_size)
+    results = suite.run()
+    save_results(results, args.output_dir)
+    failed = any(r['check'] is False for r in results['results'])
+    if args.compare:
+        table = compare_results(load_results(args.compare), results, tolerance=args.tolerance)
+        print(table.to_string(index=False))
+        failed = failed or bool(table['regression'].any())
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,11 @@
+import os
+import sys
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+sys.path.insert(0, project_root)
+
+from msidat.cli import main
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,3 @@
+from .server import AnnotationService, make_server, serve
+
+__all__ = ['AnnotationService', 'make_server', 'serve']
@@ -0,0 +1,208 @@
+import io
+import os
+import json
+import time
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+from loguru import logger
+from ..annotator.database_index import DatabaseIndex
+from ..match.compound_match import CompoundMatch
+
+ARROW_STREAM = 'application/vnd.apache.arrow.stream'
+
+
+def _records(df):
+    # NaN -> null，numpy 标量 -> python 标量
+    return df.astype(object).where(df.notna(), None).to_dict(orient='records')
+
+
+class AnnotationService(object):
+    """
+    Warm annotation state of the local service: the database index (built once) and the target list
+    of the mass shift evaluation, with the default ppm windows of the config.
+        annotate_peaks: Annotator result for measured m/z values
+        match_spectrum: CompoundMatch of a spectrum against the target list, plus the shift summary
+    """
+    def __init__(self, data_base, df_target=None, up_limit_ppm=10, low_limit_ppm=-10,
+                 intensity_threshold=1000, mz_tolerance_ppm=20, target_mz='Theoretical m/z'):
+        self._index = DatabaseIndex(data_base)
+        self._df_target = df_target
+        self._target_mz = target_mz
+        self.up_limit_ppm = up_limit_ppm
+        self.low_limit_ppm = low_limit_ppm
+        self.intensity_threshold = intensity_threshold
+        self.mz_tolerance_ppm = mz_tolerance_ppm
+
+    @classmethod
+    def from_config(cls, config):
+        '''
+        Objective: load the database (see cli.pipeline.load_database) and target list of a config.json
+        '''
+        from ..cli import pipeline
+        annotator = config.get('Annotator', {})
+        match = config.get('CompoundMatch', {})
+        data_base = pipeline.load_database(config, build=not annotator.get('Database File'))
+        df_target = pipeline.read_target(config) if match.get('Target File') else None
+        return cls(data_base, df_target,
+                   up_limit_ppm=annotator.get('Up Limit (ppm)', 10),
+                   low_limit_ppm=annotator.get('Low Limit (ppm)', -10),
+                   intensity_threshold=match.get('Intensity Threshold', 1000),
+                   mz_tolerance_ppm=match.get('m/z Tolerance (ppm)', 20),
+                   target_mz=match.get('Target m/z Column', 'Theoretical m/z'))
+
+    def annotate_peaks(self, mz, up_limit_ppm=None, low_limit_ppm=None):
+        '''
+        return: DataFrame in the Annotator output layout
+        '''
+        return self._index.annotate(mz,
+                                    self.up_limit_ppm if up_limit_ppm is None else up_limit_ppm,
+                                    self.low_limit_ppm if low_limit_ppm is None else low_limit_ppm)
+
+    def match_spectrum(self, mz, intensity, intensity_threshold=None, mz_tolerance_ppm=None):
+        '''
+        return: (CompoundMatch output DataFrame, summary dict of the relative errors in ppm)
+        '''
+        if self._df_target is None:
+            raise ValueError('no target list loaded, set the CompoundMatch "Target File" in the config')
+        compound_match = CompoundMatch(pd.DataFrame({'m/z': np.asarray(mz, dtype=float),
+                                                     'Intensity': np.asarray(intensity, dtype=float)}),
+                                       self._df_target)
+        compound_match.target_mz = self._target_mz
+        compound_match.intensity_threshold = self.intensity_threshold if intensity_threshold is None \
+            else intensity_threshold
+        compound_match.mz_tolerance = (self.mz_tolerance_ppm if mz_tolerance_ppm is None
+                                       else mz_tolerance_ppm) * 1e-6
+        compound_match.match()
+        summary = {'matched': int(compound_match.df_output[compound_match.output_mz].notna().sum()),
+                   'targets': len(compound_match.df_output)}
+        for key in ('avg_rel_error', 'median_rel_error', 'std_rel_error', 'min_rel_error', 'max_rel_error'):
+            value = getattr(compound_match, key)
+            summary[key] = None if pd.isna(value) else float(value)
+        return compound_match.df_output, summary
+
+    def info(self):
+        return {'status': 'ok', 'compounds': len(self._index), 'adducts': self._index.adducts,
+                'targets': 0 if self._df_target is None else len(self._df_target),
+                'up_limit_ppm': self.up_limit_ppm, 'low_limit_ppm': self.low_limit_ppm,
+                'intensity_threshold': self.intensity_threshold, 'mz_tolerance_ppm': self.mz_tolerance_ppm}
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """
+    GET  /health          service state
+    POST /annotate        {"mz": [...], "up_limit_ppm": 10, "low_limit_ppm": -10}
+    POST /match           {"mz": [...], "intensity": [...], "intensity_threshold": 1000, "mz_tolerance_ppm": 20}
+    Bodies are JSON, or an Arrow IPC stream (Content-Type application/vnd.apache.arrow.stream) with
+    'mz' / 'intensity' columns and the options as query parameters; the reply uses the request format.
+    """
+    service = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.opt(lazy=True).debug('service: {}', lambda: format % args)
+
+    def _reply(self, status, payload=None, frame=None, arrow=False):
+        if arrow and frame is not None:
+            import pyarrow as pa
+            sink = io.BytesIO()
+            table = pa.Table.from_pandas(frame.rename(columns=str), preserve_index=False)
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            body, content_type = sink.getvalue(), ARROW_STREAM
+        else:
+            body, content_type = json.dumps(payload, ensure_ascii=False).encode('utf-8'), 'application/json'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _request(self):
+        # return: (参数 dict, 是否 Arrow)
+        from urllib.parse import urlsplit, parse_qsl
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        options = {key: float(value) for key, value in parse_qsl(urlsplit(self.path).query)}
+        if self.headers.get('Content-Type', '').split(';')[0].strip() == ARROW_STREAM:
+            import pyarrow as pa
+            table = pa.ipc.open_stream(body).read_all()
+            options.update({name: table.column(name).to_numpy() for name in table.column_names})
+            return options, True
+        options.update(json.loads(body.decode('utf-8')) if body else {})
+        return options, False
+
+    def do_GET(self):
+        if self.path.split('?')[0] == '/health':
+            self._reply(200, self.service.info())
+        else:
+            self._reply(404, {'error': 'unknown endpoint %s' % self.path})
+
+    def do_POST(self):
+        endpoint = self.path.split('?')[0]
+        start = time.perf_counter()
+        try:
+            options, arrow = self._request()
+            if endpoint == '/annotate':
+                frame = self.service.annotate_peaks(options['mz'], options.get('up_limit_ppm'),
+                                                    options.get('low_limit_ppm'))
+                payload = {'annotations': _records(frame)}
+            elif endpoint == '/match':
+                frame, summary = self.service.match_spectrum(options['mz'], options['intensity'],
+                                                             options.get('intensity_threshold'),
+                                                             options.get('mz_tolerance_ppm'))
+                payload = {'matches': _records(frame), 'summary': summary}
+            else:
+                self._reply(404, {'error': 'unknown endpoint %s' % endpoint})
+                return
+        except (KeyError, ValueError, TypeError) as e:
+            self._reply(400, {'error': '%s: %s' % (type(e).__name__, str(e))})
+            return
+        except Exception as e:
+            logger.error(f"service {endpoint}: {str(e)}")
+            self._reply(500, {'error': str(e)})
+            return
+        payload['elapsed_ms'] = round((time.perf_counter() - start) * 1e3, 3)
+        self._reply(200, payload, frame=frame, arrow=arrow)
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler 需要 (host, port) 形式的地址
+        return request, ('local', 0)
+
+
+def make_server(service, host='127.0.0.1', port=8765, socket_path=None):
+    '''
+    Objective: HTTP server for an AnnotationService on localhost, or on a Unix socket when socket_path is set
+    return: server, run with serve_forever() and stop with shutdown()
+    '''
+    handler = type('BoundServiceHandler', (ServiceHandler,), {'service': service})
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = _UnixHTTPServer(socket_path, handler)
+        logger.info('annotation service listening on unix socket {}', socket_path)
+    else:
+        server = ThreadingHTTPServer((host, port), handler)
+        server.daemon_threads = True
+        logger.info('annotation service listening on http://{}:{}', *server.server_address[:2])
+    return server
+
+
+def serve(config, host='127.0.0.1', port=8765, socket_path=None):
+    '''
+    Objective: load the database once and answer requests until interrupted
+    '''
+    server = make_server(AnnotationService.from_config(config), host, port, socket_path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info('annotation service stopped')
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
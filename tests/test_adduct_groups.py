@@ -0,0 +1,94 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+
+from msidat.annotator import AdductGroups, group_adducts, load_adducts
+from msidat.annotator.adduct_groups import annotate_groups, database_polarity
+from msidat.annotator.make_annotator import Annotator
+from msidat.tools.table_io import read_table
+
+H, NA, K = 1.0072766, 22.9892213, 38.9631585
+ADDUCTS = {'[M+H]+': H, '[M+Na]+': NA, '[M+K]+': K}
+
+
+def test_load_adducts(tmp_path):
+    positive = load_adducts()
+    assert positive['[M+H]+'] == H and positive['[M+Na]+'] == NA
+    assert load_adducts(polarity='negative')['[M-H]-'] == -H
+    path = tmp_path / 'adducts.json'
+    path.write_text(json.dumps({'positive': {'M+H': H}, 'negative': {}}))
+    assert load_adducts(str(path)) == {'[M+H]+': H}
+    data_base = pd.DataFrame(columns=['Name', 'Formula', 'Monoisotopic Molecular Weight', 'ID',
+                                      '[M-H]-', '[M+Cl]-', '[M+H]+'])
+    assert database_polarity(data_base) == 'negative'
+    # 负离子列不过半时按正离子
+    assert database_polarity(data_base.drop(columns='[M+Cl]-')) == 'positive'
+
+
+def test_groups():
+    # alpha (M = 199)：[M+H]+ 与 [M+Na]+；beta (M = 299)：三种加合物；250 不成组，峰未按 m/z 排序
+    mz = [299.0 + NA, 199.0 + H, 250.0, 199.0002 + NA, 299.0 + K, 299.0 + H]
+    intensity = [5.0, 1.0, 7.0, 3.0, 5.0, 5.0]
+    groups = group_adducts(mz, ADDUCTS, ppm=5, intensity=intensity)
+    assert len(groups) == 2
+    assert groups.group.tolist() == [1, 0, -1, 0, 1, 1]
+    assert [groups.adduct_names[a] if a >= 0 else '' for a in groups.adduct] == \
+        ['[M+Na]+', '[M+H]+', '', '[M+Na]+', '[M+K]+', '[M+H]+']
+    # 按强度加权：(199 * 1 + 199.0002 * 3) / 4
+    assert groups.group_mass.tolist() == pytest.approx([199.00015, 299.0])
+    assert groups.spread_ppm.tolist() == pytest.approx([0.0002 / 199.00015 * 1e6, 0.0], abs=1e-6)
+    # 组内成员按 m/z 升序
+    assert [v.tolist() for v in groups.members] == [[1, 3], [5, 0, 4]]
+    beta, alpha = groups.group_mass[1], groups.group_mass[0]
+    np.testing.assert_array_equal(groups.neutral_mass, [beta, alpha, np.nan, alpha, beta, beta])
+
+    table = groups.to_frame(mz, ['alpha', 'beta'])
+    assert table['m/z'].tolist() == ['%.5f;%.5f' % (199.0 + H, 199.0002 + NA),
+                                     '%.5f;%.5f;%.5f' % (299.0 + H, 299.0 + NA, 299.0 + K)]
+    assert table['adducts'].tolist() == ['[M+H]+;[M+Na]+', '[M+H]+;[M+Na]+;[M+K]+']
+    assert table['peaks'].tolist() == [2, 3] and table['annotation'].tolist() == ['alpha', 'beta']
+    peaks = groups.peak_table(['alpha', 'beta'])
+    assert peaks.columns.tolist() == ['adduct_group', 'inferred_adduct', 'neutral_mass', 'group_annotation']
+    assert peaks['group_annotation'].tolist() == ['beta', 'alpha', '', 'alpha', 'beta', 'beta']
+
+
+def test_shared_peak_stays_in_larger_group():
+    # 299 + H 同时是 M' = 299 + H - Na 的 [M+Na]+；M' 组只有两种加合物，该峰留在三加合物组，M' 组被丢弃
+    shared = 299.0 + H
+    mz = [shared - NA + H, shared, 299.0 + NA, 299.0 + K]
+    groups = group_adducts(mz, ADDUCTS, ppm=5)
+    assert groups.group.tolist() == [-1, 0, 0, 0]
+    assert groups.group_mass.tolist() == pytest.approx([299.0])
+
+
+def test_no_groups():
+    for groups in (group_adducts([], ADDUCTS), group_adducts([200.0, 222.0], {'[M+H]+': H}),
+                   group_adducts([200.0, 250.0], ADDUCTS)):
+        assert isinstance(groups, AdductGroups) and len(groups) == 0
+        assert (groups.group == -1).all()
+        assert annotate_groups(groups, pd.DataFrame()).tolist() == []
+
+
+def test_annotate_groups():
+    groups = group_adducts([199.0 + H, 199.0 + NA, 299.0 + H, 299.0 + K], ADDUCTS, ppm=5)
+    data_base = pd.DataFrame({'Name': ['alpha', 'beta', 'beta2'], 'Formula': ['X', 'Y', 'Z'],
+                              'Monoisotopic Molecular Weight': [199.002, 299.0004, 299.0], 'ID': [1, 2, 3]})
+    # 199.002 偏离 10 ppm；299.0004 偏离 1.3 ppm
+    assert annotate_groups(groups, data_base, ppm=5).tolist() == ['', 'beta;beta2']
+    assert annotate_groups(groups, data_base, ppm=1).tolist() == ['', 'beta2']
+
+
+def test_annotator_groups(tmp_path):
+    data_base = pd.DataFrame({'Name': ['alpha', 'beta'], 'Formula': ['X', 'Y'],
+                              'Monoisotopic Molecular Weight': [199.0, 299.0], 'ID': [1, 2],
+                              '[M+H]+': [199.0 + H, 299.0 + H], '[M+Na]+': [199.0 + NA, 299.0 + NA]})
+    annotator = Annotator(up_limit_ppm=5, low_limit_ppm=-5, output_path=str(tmp_path / 'annotation.csv'))
+    annotator.adduct_grouping = True
+    msi_data = pd.DataFrame({'m/z': [199.0 + H, 250.0, 199.0 + NA], 'Intensity': [1.0, 2.0, 3.0]})
+    annotation = annotator.annotate(msi_data, data_base)
+    assert annotation['adduct_group'].tolist() == [0, -1, 0]
+    assert annotation['inferred_adduct'].tolist() == ['[M+H]+', '', '[M+Na]+']
+    assert annotation['group_annotation'].tolist() == ['alpha', '', 'alpha']
+    written = read_table(str(tmp_path / 'annotation_groups.csv'))
+    assert written['adducts'].tolist() == ['[M+H]+;[M+Na]+'] and written['annotation'].tolist() == ['alpha']
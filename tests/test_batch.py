@@ -0,0 +1,72 @@
+import os
+import pandas as pd
+
+from msidat.cli import batch
+from msidat.cli.batch import Manifest, find_inputs, run_batch
+from msidat.tools.table_io import read_table
+
+
+def setup_inputs(tmp_path):
+    pd.DataFrame({'Name': ['alpha'], 'Formula': ['X'], 'Monoisotopic Molecular Weight': [199.0], 'ID': [1],
+                  '[M+H]+': [200.0]}).to_csv(tmp_path / 'database.csv', index=False)
+    inputs = tmp_path / 'inputs'
+    inputs.mkdir()
+    pd.DataFrame({'m/z': [200.0, 300.0], 'Intensity': [1, 2]}).to_csv(inputs / 'a.csv', index=False)
+    pd.DataFrame({'m/z': [300.0], 'Intensity': [1]}).to_csv(inputs / 'b.csv', index=False)
+    (inputs / 'notes.txt').write_text('not an input')
+    config = {'Annotator': {'Database File': str(tmp_path / 'database.csv'), 'Up Limit (ppm)': 5,
+                            'Low Limit (ppm)': -5}}
+    return config, str(inputs), str(tmp_path / 'out')
+
+
+def count_jobs(monkeypatch):
+    ran = []
+    run_job = batch.run_job
+
+    def counting(task, config, input_path, output_path):
+        ran.append(os.path.basename(input_path))
+        return run_job(task, config, input_path, output_path)
+    monkeypatch.setattr(batch, 'run_job', counting)
+    return ran
+
+
+def test_find_inputs(tmp_path):
+    _, inputs, _ = setup_inputs(tmp_path)
+    assert [os.path.basename(v) for v in find_inputs([inputs])] == ['a.csv', 'b.csv']
+    assert [os.path.basename(v) for v in find_inputs([os.path.join(inputs, 'b*'), inputs])] == ['a.csv', 'b.csv']
+
+
+def test_resume(tmp_path, monkeypatch):
+    config, inputs, output_dir = setup_inputs(tmp_path)
+    ran = count_jobs(monkeypatch)
+    manifest = run_batch(config, [inputs], output_dir, n_jobs=1, ext='.csv')
+    assert ran == ['a.csv', 'b.csv']
+    assert manifest.summary() == {'done': 2}
+    annotation = read_table(os.path.join(output_dir, 'a_annotation.csv'))
+    assert annotation['total'].fillna('').tolist() == ['alpha;[M+H]+', '']
+
+    # 清单从磁盘读回：全部完成，不再运行
+    run_batch(config, [inputs], output_dir, n_jobs=1, ext='.csv')
+    assert ran == ['a.csv', 'b.csv']
+
+    # 输入改变或输出被删除的作业重新运行
+    pd.DataFrame({'m/z': [200.0], 'Intensity': [5]}).to_csv(os.path.join(inputs, 'a.csv'), index=False)
+    os.remove(os.path.join(output_dir, 'b_annotation.csv'))
+    run_batch(config, [inputs], output_dir, n_jobs=1, ext='.csv')
+    assert ran == ['a.csv', 'b.csv', 'a.csv', 'b.csv']
+
+    run_batch(config, [inputs], output_dir, n_jobs=1, ext='.csv', force=True)
+    assert len(ran) == 6
+    assert Manifest(os.path.join(output_dir, 'manifest.json')).summary() == {'done': 2}
+
+
+def test_failed_inputs_are_recorded_and_retried(tmp_path, monkeypatch):
+    config, inputs, output_dir = setup_inputs(tmp_path)
+    pd.DataFrame({'Name': ['x']}).to_csv(os.path.join(inputs, 'c.csv'), index=False)
+    ran = count_jobs(monkeypatch)
+    manifest = run_batch(config, [inputs], output_dir, n_jobs=1, ext='.csv')
+    assert manifest.summary() == {'done': 2, 'failed': 1}
+    job = manifest.jobs[os.path.join(inputs, 'c.csv')]
+    assert job['status'] == 'failed' and job['error']
+    run_batch(config, [inputs], output_dir, n_jobs=1, ext='.csv')
+    assert ran == ['a.csv', 'b.csv', 'c.csv', 'c.csv']
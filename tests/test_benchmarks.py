@@ -0,0 +1,94 @@
+import re
+import numpy as np
+import pandas as pd
+import pytest
+
+from msidat.benchmarks import BenchmarkSuite, compare_results, load_results, save_results, synthetic
+from msidat.benchmarks.suite import reference_annotation, reference_nearest
+from msidat.molar_mass.cal_molar_mass import MolarMassCalculator
+
+
+def test_parse_size():
+    assert synthetic.parse_size('5000') == 5000
+    assert synthetic.parse_size('1k') == 1000
+    assert synthetic.parse_size(' 2.5K ') == 2500
+    assert synthetic.parse_size('10M') == 10000000
+    assert synthetic.parse_size(300) == 300
+
+
+def test_formula_library_counts(tmp_path):
+    library, counts = synthetic.formula_library(50, seed=3, group_fraction=0.5)
+    again, _ = synthetic.formula_library(50, seed=3, group_fraction=0.5)
+    assert library.equals(again)
+    assert any('(CH2)' in v for v in library['Formula'])
+    # 计数包含括号基团：C10H20O4(CH2)3 计为 C13H26O4
+    row = int(np.flatnonzero(library['Formula'].str.contains('(CH2)', regex=False))[0])
+    formula, group = library['Formula'][row].split('(CH2)')
+    plain = dict((e, int(c or 1)) for e, c in re.findall(r'([A-Z][a-z]?)(\d*)', formula))
+    expected = [plain.get(e, 0) for e in synthetic.ELEMENTS]
+    expected[0] += int(group)
+    expected[1] += 2 * int(group)
+    assert counts[row].tolist() == expected
+    masses = synthetic.element_masses()
+    assert masses.tolist()[:2] == [12.0, 1.007825]
+    adduct_file = synthetic.write_adduct_table(synthetic.adduct_table(), str(tmp_path / 'adducts.json'))
+    calculator = MolarMassCalculator(elements_mass_file=synthetic.ELEMENTS_MASS_FILE, adduct_type_file=adduct_file)
+    found = calculator.calculate(df=library)['positive']['Monoisotopic Molecular Weight'].to_numpy(dtype=float)
+    assert np.allclose(found, counts @ masses, rtol=0, atol=1e-6)
+
+
+def test_database_table_and_adducts():
+    table = synthetic.adduct_table(n_positive=8, n_negative=2)
+    assert list(table['positve'])[:2] == ['M+H', 'M+Na'] and list(table['positve'])[-1] == 'M+X7'
+    assert list(table['negative']) == ['M-H', 'M+Cl']
+    data_base = synthetic.database_table(4, adducts=table)
+    assert list(data_base.columns[:4]) == ['Name', 'Formula', 'Monoisotopic Molecular Weight', 'ID']
+    assert data_base.shape[1] == 4 + 8
+    mass = data_base['Monoisotopic Molecular Weight']
+    assert np.allclose(data_base['[M+H]+'] - mass, 1.0072766)
+    negative = synthetic.database_table(4, adducts=table, polarity='negative')
+    assert np.allclose(negative['[M-H]-'] - mass, -1.0072766)
+
+
+def test_reference_nearest():
+    source_mz = np.array([100.0, 100.002, 200.0])
+    intensity = np.array([10.0, 500.0, 500.0])
+    # 100.0 最近但强度不足，不退而取次近峰
+    assert np.isnan(reference_nearest(source_mz, intensity, 100.0, 30e-6, 100))
+    assert reference_nearest(source_mz, intensity, 100.0018, 30e-6, 5) == 100.002
+    assert np.isnan(reference_nearest(source_mz, intensity, 200.01, 30e-6, 5))
+
+
+def test_reference_annotation():
+    data_base = pd.DataFrame({'Name': ['alpha', 'beta'], 'Formula': ['X', 'Y'],
+                              'Monoisotopic Molecular Weight': [199.0, 199.0], 'ID': [1, 2],
+                              '[M+H]+': [200.0, 200.002], '[M+Na]+': [222.0, 400.0]})
+    # (库 - 测量) / 库：alpha -1 ppm，beta +9 ppm
+    assert reference_annotation(200.0002, data_base, 5, -5) == ['alpha', '']
+    assert reference_annotation(200.0002, data_base, 10, -5) == ['alpha;beta', '']
+
+
+def test_suite_checks_pass():
+    suite = BenchmarkSuite(sizes=('200',), cases=('find_all', 'annotator', 'database_index'), formats=(),
+                           database_size=100, repeat=1, check_size=20)
+    results = suite.run()
+    assert [(r['case'], r['size'], r['check']) for r in results['results']] == \
+        [('find_all', 200, True), ('annotator', 200, True), ('database_index', 200, True)]
+    with pytest.raises(ValueError):
+        BenchmarkSuite(cases=('find_all', 'unknown'))
+
+
+def test_compare_results(tmp_path):
+    def run(*records):
+        return {'date': '2026-01-02T03:04:05', 'commit': None,
+                'results': [{'case': case, 'size': size, 'format': fmt, 'seconds': seconds, 'check': True}
+                            for case, size, fmt, seconds in records]}
+    baseline = run(('find_all', 1000, None, 1.0), ('table_io', 1000, '.csv', 2.0), ('annotator', 1000, None, 1.0))
+    current = run(('find_all', 1000, None, 1.3), ('table_io', 1000, '.csv', 2.2), ('find_once', 1000, None, 1.0))
+    path = save_results(baseline, str(tmp_path))
+    assert path.endswith('nogit_20260102T030405.json')
+    table = compare_results(load_results(path), current, tolerance=0.2)
+    # 只比较两次都有的 case / size / format
+    assert table[['case', 'format']].values.tolist() == [['find_all', ''], ['table_io', '.csv']]
+    assert table['ratio'].tolist() == pytest.approx([1.3, 1.1])
+    assert table['regression'].tolist() == [True, False]
@@ -0,0 +1,65 @@
+import os
+import json
+import pandas as pd
+
+from msidat.cli import main
+from msidat.tools.table_io import read_table, table_path
+
+DATABASE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database')
+# CH4 = 16.0313，H2O = 18.0105646
+METHANE_H = 16.0313 + 1.0072766
+WATER_NA = 18.0105646 + 22.9892213
+
+
+def write_config(tmp_path):
+    # MSI 数据整体偏 +10 ppm，内标 100 / 200 同样偏 +10 ppm；注释容差只有 +/-1 ppm
+    pd.DataFrame({'Name': ['methane', 'water'], 'Formula': ['CH4', 'H2O']}).to_csv(tmp_path / 'compounds.csv', index=False)
+    pd.DataFrame({'m/z': [100 * 1.00001, 200 * 1.00001], 'Intensity': [5000, 5000]}).to_csv(
+        tmp_path / 'source.csv', index=False)
+    pd.DataFrame({'Theoretical m/z': [100.0, 200.0]}).to_csv(tmp_path / 'target.csv', index=False)
+    pd.DataFrame({'m/z': [METHANE_H * 1.00001, WATER_NA * 1.00001, 500.0], 'Intensity': [10, 20, 30]}).to_csv(
+        tmp_path / 'msi.csv', index=False)
+    config = {
+        'MolarMassCalculator': {'Elements Mass File': os.path.join(DATABASE, 'elements_mass.json'),
+                                'Adduct Type File': os.path.join(DATABASE, 'adduct_type.json'),
+                                'Input File': str(tmp_path / 'compounds.csv'),
+                                'Output File': str(tmp_path / 'database.csv'),
+                                'Positive Adducts': ['M+H', 'M+Na'], 'Negative Adducts': []},
+        'CompoundMatch': {'Source File': str(tmp_path / 'source.csv'), 'Target File': str(tmp_path / 'target.csv'),
+                          'Output File': str(tmp_path / 'shift.csv'), 'm/z Tolerance (ppm)': 20},
+        'Annotator': {'MSI Data File': str(tmp_path / 'msi.csv'), 'Output File': str(tmp_path / 'annotation.csv'),
+                      'Up Limit (ppm)': 1, 'Low Limit (ppm)': -1},
+    }
+    path = str(tmp_path / 'config.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(config, f)
+    return path
+
+
+def test_pipeline(tmp_path):
+    config = write_config(tmp_path)
+    output = str(tmp_path / 'out.csv')
+    assert main(['--config', config, '--no-log-files', 'pipeline', '-o', output, '--keep-intermediates']) == 0
+    annotation = read_table(output)
+    # 校正 10 ppm 后前两个峰落入 +/-1 ppm
+    assert annotation['total'].fillna('').tolist() == ['methane;[M+H]+', 'water;[M+Na]+', '']
+    assert read_table(table_path(str(tmp_path / 'database.csv'), 'positive'))['Name'].tolist() == ['methane', 'water']
+    shift = read_table(str(tmp_path / 'shift.csv'))
+    assert shift['Relative Error(ppm)'].round(6).tolist() == [10.0, 10.0]
+    recalibrated = read_table(table_path(output, 'recalibrated'))
+    assert abs(recalibrated['m/z'][0] - METHANE_H) < 1e-9
+
+
+def test_pipeline_without_recalibration(tmp_path):
+    config = write_config(tmp_path)
+    output = str(tmp_path / 'out.csv')
+    assert main(['--config', config, '--no-log-files', 'pipeline', '-o', output, '--no-recalibrate']) == 0
+    assert read_table(output)['total'].fillna('').tolist() == ['', '', '']
+    # 中间结果默认不写出
+    assert not os.path.exists(str(tmp_path / 'shift.csv'))
+
+
+def test_errors_return_one(tmp_path):
+    config = write_config(tmp_path)
+    os.remove(str(tmp_path / 'msi.csv'))
+    assert main(['--config', config, '--no-log-files', 'annotate']) == 1
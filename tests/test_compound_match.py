@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from msidat.match.compound_match import CompoundMatch, nearest_peaks
+
+
+def baseline_find_once(df_source, theoretical_mz, mz_tolerance, intensity_threshold):
+    # 向量化之前 CompoundMatch.find_once 的逐个扫描实现，作为对照
+    mz_diff = np.abs((df_source['m/z'] - theoretical_mz) / theoretical_mz)
+    if mz_diff.min() < mz_tolerance:
+        if df_source.loc[mz_diff.idxmin(), 'Intensity'] > intensity_threshold:
+            return df_source['m/z'].iloc[mz_diff.idxmin()]
+    return np.nan
+
+
+def test_nearest_peaks_hand_computed():
+    position, rel_diff = nearest_peaks([100.0, 200.0, 200.0, 300.0], [199.99, 250.0, 301.5, np.nan])
+    # 200.0 出现两次时取靠前的行；250 与 200 / 300 等距时取 200
+    assert position.tolist() == [1, 1, 3, -1]
+    np.testing.assert_allclose(rel_diff[:3], [0.01 / 199.99, 50.0 / 250.0, 1.5 / 301.5])
+    assert np.isnan(rel_diff[3])
+
+
+def test_nearest_peaks_groups():
+    source = [100.0, 200.0, 100.001, 300.0]
+    group = [0, 0, 1, 1]
+    position, _ = nearest_peaks(source, [100.0, 100.0, 230.0], group, [0, 1, 1])
+    # 组 0 的 200 离 230 最近，但第 1 组只能取本组的 300
+    assert position.tolist() == [0, 2, 3]
+    position, _ = nearest_peaks(source, [150.0], group, [2])
+    assert position.tolist() == [-1]
+
+
+def test_find_all_matches_baseline_find_once():
+    rng = np.random.default_rng(7)
+    mz = np.round(rng.uniform(100, 1000, 400), 3)
+    mz[:20] = mz[20:40]
+    source = pd.DataFrame({'m/z': mz, 'Intensity': rng.uniform(0, 3000, 400)})
+    targets = np.r_[mz[::5] * (1 + rng.normal(0, 10, 80) * 1e-6), rng.uniform(100, 1000, 80)]
+    match = CompoundMatch(source, pd.DataFrame({'Theoretical m/z': targets}))
+    expected = [baseline_find_once(source, t, match.mz_tolerance, match.intensity_threshold) for t in targets]
+    np.testing.assert_array_equal(match.find_all(targets), expected)
+    np.testing.assert_array_equal([match.find_once(t) for t in targets[::16]], expected[::16])
+
+
+def test_match_statistics():
+    source = pd.DataFrame({'m/z': [100.001, 200.0, 300.0], 'Intensity': [5000, 5000, 10]})
+    match = CompoundMatch(source, pd.DataFrame({'Theoretical m/z': [100.0, 200.0, 300.0]}))
+    match.match()
+    errors = match.df_output['Relative Error(ppm)'].to_numpy()
+    # 300.0 强度低于阈值，不计入
+    np.testing.assert_allclose(errors[:2], [10.0, 0.0], atol=1e-6)
+    assert np.isnan(errors[2])
+    assert abs(match.median_rel_error - 5.0) < 1e-6
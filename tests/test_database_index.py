@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from msidat.annotator.database_index import DatabaseIndex
+from msidat.annotator.make_annotator import Annotator
+
+
+def database():
+    return pd.DataFrame({'Name': ['alpha', 'beta', 'gamma'], 'Formula': ['X', 'Y', 'Z'],
+                         'Monoisotopic Molecular Weight': [199.0, 299.0, 199.0], 'ID': [1, 2, 3],
+                         '[M+H]+': [200.0, 300.0, 200.001], '[M+Na]+': [222.0, 322.0, np.nan]})
+
+
+def annotator_result(mz, data_base, up, low):
+    annotator = Annotator(up_limit_ppm=up, low_limit_ppm=low)
+    return annotator.annotate(pd.DataFrame({'m/z': mz, 'Intensity': np.ones(len(mz))}), data_base)
+
+
+def test_annotate_hand_computed():
+    index = DatabaseIndex(database())
+    # 200.0006 与 200 相差 -3 ppm，与 200.001 相差 +2 ppm
+    result = index.annotate([200.0006, 322.0, 250.0, np.nan], up_limit_ppm=5, low_limit_ppm=-5)
+    assert result['[M+H]+'].tolist() == ['alpha;gamma', '', '', '']
+    assert result['total'].tolist() == ['alpha;gamma;[M+H]+', 'beta;[M+Na]+', '', '']
+    assert index.annotate([200.0006], up_limit_ppm=5, low_limit_ppm=0)['total'].tolist() == ['gamma;[M+H]+']
+
+
+def test_match_spectrum():
+    index = DatabaseIndex(database())
+    peak, row, adduct, ppm, intensity = index.match_spectrum([322.0, 200.0006], [7.0, 9.0], 5, -5)
+    assert peak.tolist() == [0, 1, 1]
+    assert row.tolist() == [1, 0, 2]
+    assert [index.adducts[v] for v in adduct] == ['[M+Na]+', '[M+H]+', '[M+H]+']
+    np.testing.assert_allclose(ppm, [0.0, -0.0006 / 200 * 1e6, 0.0004 / 200.001 * 1e6])
+    assert intensity.tolist() == [7.0, 9.0, 9.0]
+
+
+# 库中 m/z 为 0 时 Annotator_ele 的除法会产生 inf，不影响判定
+@pytest.mark.filterwarnings('ignore:divide by zero')
+def test_same_result_as_annotator_ele():
+    rng = np.random.default_rng(11)
+    n = 300
+    mass = rng.uniform(100, 600, n)
+    data_base = pd.DataFrame({'Name': ['c%d' % (i % 250) for i in range(n)], 'Formula': 'X',
+                              'Monoisotopic Molecular Weight': mass, 'ID': np.arange(n) + 1,
+                              '[M+H]+': mass + 1.0072766, '[M+Na]+': mass + 22.9892213})
+    data_base.loc[::37, '[M+Na]+'] = np.nan
+    data_base.loc[5, '[M+H]+'] = 0.0
+    # 查询值：库中 m/z 偏 0 ~ +/-12 ppm（含正好 10 ppm 的边界），外加随机值
+    base = data_base[['[M+H]+', '[M+Na]+']].to_numpy().ravel()[::3]
+    base = base[base > 0]
+    mz = np.r_[base * (1 + rng.uniform(-12, 12, len(base)) * 1e-6), base / (1 - 10e-6), base / (1 + 10e-6),
+               rng.uniform(100, 650, 200)]
+    for up, low in ((10, -10), (3, 1), (5, -20)):
+        expected = annotator_result(mz, data_base, up, low)
+        result = DatabaseIndex(data_base).annotate(mz, up, low)
+        for column in ('[M+H]+', '[M+Na]+', 'total'):
+            assert result[column].tolist() == expected[column].astype(str).tolist()
@@ -0,0 +1,50 @@
+import os
+import pandas as pd
+
+from msidat.tools import dataset_cache
+from msidat.tools.dataset_cache import DatasetCache
+
+
+def count_reads(monkeypatch):
+    calls = []
+    read_table = dataset_cache.read_table
+
+    def counting(path, sheet_name=0):
+        calls.append((os.path.basename(path), sheet_name))
+        return read_table(path, sheet_name=sheet_name)
+    monkeypatch.setattr(dataset_cache, 'read_table', counting)
+    return calls
+
+
+def test_read_once_until_changed(tmp_path, monkeypatch):
+    calls = count_reads(monkeypatch)
+    path = str(tmp_path / 'a.csv')
+    pd.DataFrame({'m/z': [100.0], 'Intensity': [1.0]}).to_csv(path, index=False)
+    cache = DatasetCache()
+    # 只探测表头不会解析整个文件
+    assert cache.columns(path).tolist() == ['m/z', 'Intensity']
+    assert calls == []
+    first = cache.read(path)
+    assert cache.read(path) is first
+    assert len(calls) == 1
+
+    pd.DataFrame({'m/z': [100.0, 200.0], 'Intensity': [1.0, 2.0]}).to_csv(path, index=False)
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10 ** 9))
+    assert len(cache.read(path)) == 2
+    assert len(calls) == 2
+
+
+def test_excel_sheets_and_eviction(tmp_path, monkeypatch):
+    calls = count_reads(monkeypatch)
+    path = str(tmp_path / 'a.xlsx')
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({'x': [1]}).to_excel(writer, sheet_name='one', index=False)
+        pd.DataFrame({'y': [2]}).to_excel(writer, sheet_name='two', index=False)
+    cache = DatasetCache(max_frames=1)
+    assert cache.sheet_names(path) == ['one', 'two']
+    # 下标 0 与工作表名 'one' 是同一个缓存项
+    first = cache.read(path, 0)
+    assert cache.read(path, 'one') is first
+    assert cache.read(path, 'two').columns.tolist() == ['y']
+    cache.read(path, 'one')
+    assert len(calls) == 3
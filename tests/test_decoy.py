@@ -0,0 +1,80 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+
+from msidat.annotator import DecoySearch, q_values
+from msidat.annotator.decoy import ELEMENTS_MASS_FILE, PLAUSIBLE_ELEMENTS
+from msidat.annotator.make_annotator import Annotator
+from msidat.tools.table_io import read_table
+
+
+def test_q_values():
+    # 排序后目标 1 2 3 4，诱饵 (2 组) 计数 1 2 2 4：FDR = 0.5/1, 1/2, 1/3, 2/4
+    fdr, q = q_values([3.0, 1.0, 4.0, 2.0], [1.5, 3.5, 3.5, 0.5], 2)
+    assert fdr.tolist() == pytest.approx([1 / 3, 0.5, 0.5, 0.5])
+    assert q.tolist() == pytest.approx([1 / 3, 1 / 3, 0.5, 1 / 3])
+    # 相同得分一起计数；FDR 不超过 1
+    assert q_values([1.0, 1.0], [1.0], 1)[0].tolist() == [0.5, 0.5]
+    assert q_values([1.0], [0.0, 0.0, 0.0], 1)[0].tolist() == [1.0]
+    fdr, q = q_values([], [1.0], 1)
+    assert len(fdr) == 0 and len(q) == 0
+
+
+def database():
+    return pd.DataFrame({'Name': ['alpha', 'beta'], 'Formula': ['X', 'Y'],
+                         'Monoisotopic Molecular Weight': [199.0, 299.0], 'ID': [1, 2],
+                         '[M+H]+': [200.0, 300.0]})
+
+
+def test_shift_search():
+    # 诱饵集为数据库整体平移 +10 或 -10 Da，190 与 210 中恰有一个是诱饵值
+    decoy = DecoySearch(database(), n_decoys=1, method='shift', shift_range=(10.0, 10.0))
+    mz = [200.0002, 190.0, 210.0, 300.0]
+    search = decoy.search(mz, 5, -5)
+    assert (search['targets'], search['decoys']) == (2, 1)
+    assert search['peak'].tolist() == [0, 3] and search['row'].tolist() == [0, 1]
+    assert search['ppm'].tolist() == pytest.approx([-1.0, 0.0], abs=1e-6)
+    # 目标 |ppm| 0 与 1，诱饵 |ppm| 0：FDR 1 与 1/2
+    assert search['fdr'].tolist() == [0.5, 1.0] and search['q'].tolist() == [0.5, 0.5]
+
+    hits = decoy.hits_table(mz, 5, -5, search=search)
+    assert hits.columns.tolist() == ['m/z', 'compound', 'adduct', 'ppm', 'fdr', 'q_value']
+    assert hits['compound'].tolist() == ['alpha', 'beta'] and hits['adduct'].tolist() == ['[M+H]+', '[M+H]+']
+    np.testing.assert_array_equal(decoy.peak_q_values(len(mz), search), [0.5, np.nan, np.nan, 0.5])
+    assert decoy.search([], 5, -5)['targets'] == 0
+    with pytest.raises(ValueError):
+        DecoySearch(database(), method='reverse')
+
+
+def test_adduct_decoys():
+    h, e = 1.0072766, 0.0005484
+    data_base = pd.DataFrame({'Name': ['alpha'], 'Formula': ['X'], 'Monoisotopic Molecular Weight': [199.0],
+                              'ID': [1], '[M+H]+': [199.0 + h], '[M-H]-': [199.0 - h]})
+    with open(ELEMENTS_MASS_FILE, encoding='utf-8') as f:
+        ele_mass = json.load(f)['ele_mass']
+    implausible = np.unique([mass for name, mass in ele_mass.items() if name not in PLAUSIBLE_ELEMENTS])
+    decoy = DecoySearch(data_base, n_decoys=4, method='adduct', seed=1)
+    # 每组每列一个诱饵：中性质量 + 非常见元素，正离子列减去、负离子列加上电子质量
+    candidates = np.r_[199.0 + implausible - e, 199.0 + implausible + e]
+    search = decoy.search(candidates, 1e-3, -1e-3)
+    assert (search['targets'], search['decoys']) == (0, 4 * 2)
+    # 真实加合物不会成为诱饵
+    search = decoy.search([199.0 + h, 199.0 + 22.9892213, 199.0 + 38.9631585], 1e-3, -1e-3)
+    assert (search['targets'], search['decoys']) == (1, 0)
+
+
+def test_annotator_hits(tmp_path):
+    annotator = Annotator(up_limit_ppm=5, low_limit_ppm=-5, output_path=str(tmp_path / 'annotation.csv'))
+    annotator.decoy_sets = 2
+    annotator.decoy_method = 'shift'
+    msi_data = pd.DataFrame({'m/z': [200.0002, 250.0, 300.0], 'Intensity': [1.0, 2.0, 3.0]})
+    annotation = annotator.annotate(msi_data, database())
+
+    decoy = DecoySearch(database(), n_decoys=2, method='shift')
+    search = decoy.search(msi_data['m/z'], 5, -5)
+    expected = decoy.hits_table(msi_data['m/z'], 5, -5, search=search)
+    pd.testing.assert_frame_equal(annotator.hits, expected)
+    np.testing.assert_array_equal(annotation['q_value'], decoy.peak_q_values(3, search))
+    written = read_table(str(tmp_path / 'annotation_hits.csv'))
+    assert written['compound'].tolist() == ['alpha', 'beta']
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from msidat.imaging.imzml_reader import ImzMLReader
+
+SPECTRUM = ('<spectrum id="s{i}" index="{i}"><scanList><scan>'
+            '<cvParam accession="IMS:1000050" name="position x" value="{x}"/>'
+            '<cvParam accession="IMS:1000051" name="position y" value="{y}"/></scan></scanList>'
+            '<binaryDataArrayList count="2">'
+            '<binaryDataArray><referenceableParamGroupRef ref="mzArray"/>'
+            '<cvParam accession="IMS:1000103" name="external array length" value="{mz_length}"/>'
+            '<cvParam accession="IMS:1000102" name="external offset" value="{mz_offset}"/><binary/></binaryDataArray>'
+            '<binaryDataArray><referenceableParamGroupRef ref="intensityArray"/>'
+            '<cvParam accession="IMS:1000103" name="external array length" value="{int_length}"/>'
+            '<cvParam accession="IMS:1000102" name="external offset" value="{int_offset}"/><binary/></binaryDataArray>'
+            '</binaryDataArrayList></spectrum>')
+
+
+def write_imzml(path, spectra, coordinates, continuous, compression='MS:1000576'):
+    # m/z 为 float64 (MS:1000523)，强度为 float32 (MS:1000521)；.ibd 开头 16 字节为 UUID 占位
+    blob = bytearray(16)
+    offsets = []
+    shared = None
+    for mz, intensity in spectra:
+        if shared is None or not continuous:
+            shared = (len(blob), len(mz))
+            blob += np.asarray(mz, dtype='<f8').tobytes()
+        offsets.append(shared + (len(blob), len(intensity)))
+        blob += np.asarray(intensity, dtype='<f4').tobytes()
+    (path.parent / (path.stem + '.ibd')).write_bytes(bytes(blob))
+
+    mode = 'IMS:1000030' if continuous else 'IMS:1000031'
+    xml = ['<?xml version="1.0" encoding="ISO-8859-1"?>',
+           '<mzML xmlns="http://psi.hupo.org/ms/mzml" version="1.1">',
+           '<fileDescription><fileContent><cvParam accession="%s" name="mode"/></fileContent></fileDescription>' % mode,
+           '<referenceableParamGroupList count="2">',
+           '<referenceableParamGroup id="mzArray"><cvParam accession="MS:1000514" name="m/z array"/>'
+           '<cvParam accession="MS:1000523" name="64-bit float"/><cvParam accession="%s"/></referenceableParamGroup>'
+           % compression,
+           '<referenceableParamGroup id="intensityArray"><cvParam accession="MS:1000515" name="intensity array"/>'
+           '<cvParam accession="MS:1000521" name="32-bit float"/><cvParam accession="%s"/></referenceableParamGroup>'
+           % compression,
+           '</referenceableParamGroupList><run id="run"><spectrumList count="%d">' % len(spectra)]
+    for i, ((mz_offset, mz_length, int_offset, int_length), (x, y)) in enumerate(zip(offsets, coordinates)):
+        xml.append(SPECTRUM.format(i=i, x=x, y=y, mz_offset=mz_offset, mz_length=mz_length,
+                                   int_offset=int_offset, int_length=int_length))
+    xml.append('</spectrumList></run></mzML>')
+    path.write_text('\n'.join(xml))
+    return str(path)
+
+
+def test_processed(tmp_path):
+    spectra = [([100.0, 200.0], [1.0, 2.0]), ([150.0, 250.0, 350.0], [3.0, 4.0, 5.0]), ([120.0], [6.0])]
+    reader = ImzMLReader(write_imzml(tmp_path / 'data.imzML', spectra, [(1, 1), (3, 1), (2, 2)], False))
+    assert reader.mode == 'processed' and not reader.is_continuous
+    assert len(reader) == 3
+    assert reader.shape == (2, 3)
+    assert reader.pixel_index(2, 2) == 2
+    assert reader.pixel_index(2, 1) == -1
+    mz, intensity = reader.get_spectrum(1)
+    assert mz.dtype == np.float64 and intensity.dtype == np.float32
+    np.testing.assert_array_equal(mz, [150.0, 250.0, 350.0])
+    np.testing.assert_array_equal(intensity, [3.0, 4.0, 5.0])
+    assert reader.mz_range() == (100.0, 350.0)
+
+
+def test_continuous(tmp_path):
+    axis = [100.0, 200.0, 300.0]
+    spectra = [(axis, [1.0, 0.0, 3.0]), (axis, [3.0, 0.0, 5.0])]
+    reader = ImzMLReader(write_imzml(tmp_path / 'data.imzML', spectra, [(1, 1), (2, 1)], True))
+    assert reader.is_continuous
+    # 所有像素共用同一 m/z 轴
+    assert reader._mz_offsets.tolist() == [16, 16]
+    np.testing.assert_array_equal(reader.get_spectrum(1)[1], [3.0, 0.0, 5.0])
+    mz, mean = reader.mean_spectrum()
+    np.testing.assert_array_equal(mz, [100.0, 300.0])
+    np.testing.assert_array_equal(mean, [2.0, 4.0])
+
+
+def test_compressed_arrays_rejected(tmp_path):
+    path = write_imzml(tmp_path / 'data.imzML', [([100.0], [1.0])], [(1, 1)], False, compression='MS:1000574')
+    with pytest.raises(ValueError, match='compressed imzML binary arrays are not supported'):
+        ImzMLReader(path)
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+from msidat.annotator.make_annotator import Annotator
+from msidat.imaging.ion_image import extract_ion_images, ion_images_from_annotation, save_ion_images
+
+
+class SpectrumReader(object):
+    # 2 x 2 像素的 processed 数据，像素 i 中各峰强度为 i + 1
+    def __init__(self, mz):
+        self.spectra = [(np.asarray(mz, dtype=float), np.full(len(mz), i + 1.0)) for i in range(4)]
+        self.coordinates = np.array([[1, 1], [2, 1], [1, 2], [2, 2]])
+        self.shape = (2, 2)
+        self.is_continuous = False
+
+    def __len__(self):
+        return len(self.spectra)
+
+    def iter_spectra(self, start=0, stop=None):
+        for spectrum in self.spectra[start:stop]:
+            yield spectrum
+
+
+def database():
+    return pd.DataFrame({'Name': ['alpha', 'beta'], 'Formula': ['X', 'Y'],
+                         'Monoisotopic Molecular Weight': [199.0, 299.0], 'ID': [1, 2],
+                         '[M+H]+': [200.0, 300.0], '[M+Na]+': [222.0, 322.0]})
+
+
+def msi_data():
+    # 200 与 322 有注释，250 没有
+    return pd.DataFrame({'m/z': [200.0, 250.0, 322.0], 'Intensity': [10.0, 20.0, 30.0]})
+
+
+def test_images_from_annotation_with_decoys():
+    annotator = Annotator(up_limit_ppm=5, low_limit_ppm=-5)
+    annotator.decoy_sets = 3
+    annotation = annotator.annotate(msi_data(), database())
+    assert annotation.columns[-1] == 'q_value'
+
+    images, keys, rows = ion_images_from_annotation(SpectrumReader([200.0, 250.0, 322.0]), annotation, ppm=5)
+    assert rows.tolist() == [0, 2]
+    assert keys == ['200.000000|alpha;[M+H]+', '322.000000|beta;[M+Na]+']
+    np.testing.assert_allclose(images[0], [[1, 2], [3, 4]])
+
+
+def test_images_from_annotation_with_adduct_groups():
+    # alpha (M = 199) 的 [M+H]+ 与 [M+Na]+ 峰归为一组
+    h, na = 1.0072766, 22.9892213
+    data_base = pd.DataFrame({'Name': ['alpha', 'beta'], 'Formula': ['X', 'Y'],
+                              'Monoisotopic Molecular Weight': [199.0, 299.0], 'ID': [1, 2],
+                              '[M+H]+': [199.0 + h, 299.0 + h], '[M+Na]+': [199.0 + na, 299.0 + na]})
+    mz = [199.0 + h, 199.0 + na, 250.0]
+    annotator = Annotator(up_limit_ppm=5, low_limit_ppm=-5)
+    annotator.adduct_grouping = True
+    annotation = annotator.annotate(pd.DataFrame({'m/z': mz, 'Intensity': [10.0, 20.0, 30.0]}), data_base)
+    assert annotation.columns[-1] == 'group_annotation'
+    assert annotation['group_annotation'].tolist() == ['alpha', 'alpha', '']
+
+    images, keys, rows = ion_images_from_annotation(SpectrumReader(mz), annotation, ppm=5)
+    assert rows.tolist() == [0, 1]
+    assert keys == ['%.6f|alpha;[M+H]+' % mz[0], '%.6f|alpha;[M+Na]+' % mz[1]]
+    assert images.shape == (2, 2, 2)
+
+
+class ContinuousReader(SpectrumReader):
+    # 共用 m/z 轴 [100, 100.0005, 100.01, 200]，像素 i 强度为 [1, 2, 4, 8] * (i + 1)
+    def __init__(self):
+        axis = np.array([100.0, 100.0005, 100.01, 200.0])
+        self.spectra = [(axis, np.array([1.0, 2.0, 4.0, 8.0]) * (i + 1)) for i in range(4)]
+        self.coordinates = np.array([[1, 1], [2, 1], [1, 2], [2, 2]])
+        self.shape = (2, 2)
+        self.is_continuous = True
+
+    def get_spectrum(self, index):
+        return self.spectra[index]
+
+
+def test_extract_continuous():
+    # 100 +/- 10 ppm 覆盖 100 与 100.0005，不含 100.01；300 处没有数据
+    images = extract_ion_images(ContinuousReader(), [100.0, 200.0, 300.0], ppm=10, chunk_size=3)
+    np.testing.assert_allclose(images[0], [[3, 6], [9, 12]])
+    np.testing.assert_allclose(images[1], [[8, 16], [24, 32]])
+    np.testing.assert_allclose(images[2], 0)
+
+
+def test_extract_processed_matches_continuous():
+    reader = ContinuousReader()
+    reader.is_continuous = False
+    # 像素 1 的 m/z 未排序
+    reader.spectra[1] = (reader.spectra[1][0][::-1], reader.spectra[1][1][::-1])
+    images = extract_ion_images(reader, [100.0, 200.0, 300.0], ppm=10, chunk_size=3)
+    np.testing.assert_allclose(images, extract_ion_images(ContinuousReader(), [100.0, 200.0, 300.0], ppm=10))
+
+
+def test_save_ion_images(tmp_path):
+    images = np.arange(8, dtype=float).reshape(2, 2, 2)
+    path = save_ion_images(str(tmp_path / 'images.npz'), images, ['a', 'b'], rows=[3, 5])
+    with np.load(path) as data:
+        np.testing.assert_array_equal(data['images'], images)
+        assert data['keys'].tolist() == ['a', 'b']
+        assert data['rows'].tolist() == [3, 5]
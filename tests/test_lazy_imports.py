@@ -0,0 +1,34 @@
+import os
+import sys
+import subprocess
+import pytest
+
+
+def loaded_after(code):
+    # 新进程中执行 code，返回已加载的模块名
+    script = code + '\nimport sys\nprint("\\n".join(sorted(sys.modules)))'
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+    output = subprocess.run([sys.executable, '-c', script], check=True, capture_output=True, text=True, env=env)
+    return set(output.stdout.split())
+
+
+def test_import_package_loads_no_subpackage():
+    modules = loaded_after('import msidat')
+    assert 'msidat' in modules
+    assert not {'msidat.gui', 'msidat.tools', 'msidat.annotator', 'PyQt5', 'pandas', 'loguru'} & modules
+
+
+def test_engine_loads_only_what_it_imports():
+    modules = loaded_after('import msidat.match')
+    assert 'msidat.match.compound_match' in modules
+    assert not {'msidat.gui', 'msidat.annotator', 'msidat.cli', 'msidat.service', 'PyQt5'} & modules
+    # 日志不在导入时初始化，不会创建 log/ 目录的文件
+    assert 'msidat.tools.msidat_logger' not in modules
+
+
+def test_attribute_access_imports_on_demand():
+    import msidat
+    assert msidat.tools.table_io.file_format('a.csv') == 'csv'
+    assert 'tools' in dir(msidat)
+    with pytest.raises(AttributeError):
+        msidat.missing
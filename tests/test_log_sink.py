@@ -0,0 +1,50 @@
+import os
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+pytest.importorskip('PyQt5')
+from loguru import logger
+from PyQt5.QtWidgets import QApplication, QPlainTextEdit
+from msidat.gui.log_sink import QueuedLogSink
+
+
+@pytest.fixture
+def widget():
+    app = QApplication.instance() or QApplication([])
+    widget = QPlainTextEdit()
+    yield widget
+    widget.deleteLater()
+    app.processEvents()
+
+
+def test_collapse():
+    records = [('a', 'a 1'), ('a', 'a 2'), ('a', 'a 3'), ('b', 'b'), ('a', 'a 4')]
+    assert QueuedLogSink.collapse(records) == ['a 1', '    (last message repeated 2 times)', 'b', 'a 4']
+    assert QueuedLogSink.collapse([('a', 'a'), ('a', 'a')], dropped=3) == \
+        ['... 3 log records dropped (burst) ...', 'a', '    (last message repeated 1 times)']
+
+
+def test_burst_is_bounded(widget):
+    sink = QueuedLogSink(widget, capacity=3, interval_ms=60000, max_batch=2)
+    for i in range(5):
+        sink.write('line %d\n' % i)
+    # 容量 3：最早的两条被丢弃
+    assert sink.pending == 3
+    sink.flush()
+    assert widget.toPlainText().split('\n') == ['... 2 log records dropped (burst) ...', 'line 2', 'line 3']
+    sink.flush()
+    assert widget.toPlainText().split('\n')[-1] == 'line 4'
+    assert sink.pending == 0
+
+
+def test_loguru_records_collapse_by_message(widget):
+    sink = QueuedLogSink(widget, interval_ms=60000)
+    handler = logger.add(sink.write, format='{level} {message}', level='INFO')
+    try:
+        for _ in range(3):
+            logger.info('same')
+        logger.warning('same')
+    finally:
+        logger.remove(handler)
+    sink.flush()
+    assert widget.toPlainText().split('\n') == ['INFO same', '    (last message repeated 2 times)', 'WARNING same']
@@ -0,0 +1,42 @@
+import os
+import sys
+import subprocess
+import textwrap
+
+
+def run_logging(tmp_path, performance):
+    # 打包环境 (sys.frozen) 下日志目录在可执行文件旁，不写控制台；在新进程中运行以免改动本进程的日志配置
+    script = textwrap.dedent('''
+        import sys
+        sys.frozen = True
+        sys.executable = %r
+        from loguru import logger
+        from msidat.tools.msidat_logger import setup_msidat_logger
+        calls = []
+        assert setup_msidat_logger(performance=%r)
+        logger.opt(lazy=True).debug('debug {}', lambda: calls.append(1) or 'value')
+        logger.info('info record')
+        logger.error('error record')
+        logger.complete()
+        print(len(calls))
+    ''' % (str(tmp_path / 'msidat.exe'), performance))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+    output = subprocess.run([sys.executable, '-c', script], check=True, capture_output=True, text=True, env=env)
+    log = (tmp_path / 'log' / 'msidat.log').read_text(encoding='utf-8')
+    errors = (tmp_path / 'log' / 'error.log').read_text(encoding='utf-8')
+    return int(output.stdout.strip()), log, errors
+
+
+def test_default_sinks(tmp_path):
+    calls, log, errors = run_logging(tmp_path, False)
+    assert calls == 1
+    assert 'debug value' in log and 'info record' in log and 'error record' in log
+    assert 'error record' in errors and 'info record' not in errors
+
+
+def test_performance_mode_skips_debug_formatting(tmp_path):
+    calls, log, errors = run_logging(tmp_path, True)
+    # 级别低于文件级别 INFO 的记录不会被格式化
+    assert calls == 0
+    assert 'debug value' not in log and 'info record' in log
+    assert 'error record' in errors and 'info record' not in errors
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from msidat.imaging.peak_alignment import align_peaks, assign_peaks, consensus_peaks
+
+# 4 个像素，像素 2 没有峰；100.0002 与 200.0004 相对 100 / 200 偏 2 ppm
+SPECTRA = [
+    ([100.0, 200.0], [10.0, 30.0]),
+    ([100.0002, 300.0], [30.0, 5.0]),
+    ([], []),
+    ([200.0004], [10.0]),
+]
+
+
+def test_consensus_peaks():
+    result = consensus_peaks(SPECTRA, ppm=5)
+    # 共识 m/z 为强度加权平均：(100 * 10 + 100.0002 * 30) / 40
+    np.testing.assert_allclose(result.mz, [100.00015, 200.0001, 300.0], rtol=1e-12)
+    assert result.frequency.tolist() == [2, 2, 1]
+    np.testing.assert_allclose(result.intensity, [40, 40, 5])
+    table = result.to_peak_table()
+    np.testing.assert_allclose(table['Intensity'], [10, 10, 1.25])
+    np.testing.assert_allclose(table['Frequency'], [0.5, 0.5, 0.25])
+    assert consensus_peaks(SPECTRA, ppm=5, min_pixels=2).mz.tolist() == pytest.approx([100.00015, 200.0001])
+
+
+def test_separated_peaks_stay_apart():
+    result = consensus_peaks([([100.0], [1.0]), ([100.002], [1.0])], ppm=5)
+    # 相差 20 ppm，超出容差
+    assert len(result) == 2
+
+
+def test_align_peaks_matrix():
+    pytest.importorskip('scipy')
+    result = align_peaks(SPECTRA, ppm=5, chunk_size=2)
+    assert result.matrix.shape == (4, 3)
+    np.testing.assert_allclose(result.matrix.toarray(), [[10, 30, 0], [30, 0, 5], [0, 0, 0], [0, 10, 0]])
+
+
+def test_assign_peaks():
+    consensus = np.array([100.0, 200.0])
+    assert assign_peaks(np.array([99.9996, 150.0, 200.0009, 200.0011]), consensus, 5).tolist() == [0, -1, 1, -1]
+    assert assign_peaks(np.array([100.0]), np.zeros(0), 5).tolist() == [-1]
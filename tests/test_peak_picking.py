@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from msidat.imaging.peak_picking import estimate_noise, pick_peak_arrays, pick_peaks, pick_peaks_batch
+
+
+def profile():
+    # 基线 1，m/z 步长 0.01；100.10 处对称峰，100.20 处低于 SNR 的小峰，100.30 处不对称峰
+    mz = 100 + 0.01 * np.arange(41)
+    y = np.ones(41)
+    y[9:12] = [50, 100, 50]
+    y[20] = 1.5
+    y[29:32] = [25, 100, 75]
+    return mz, y
+
+
+def test_estimate_noise():
+    # 多数值相同时 MAD 为 0，噪声取均值
+    assert estimate_noise(profile()[1]) == (1.0, 435.5 / 41)
+    assert estimate_noise(np.zeros(5)) == (0.0, 1.0)
+
+
+def test_centroid_snr_and_fwhm():
+    mz, y = profile()
+    centroid, intensity, snr, fwhm = pick_peak_arrays(mz, y, snr=3.0)
+    # 不对称峰的抛物线顶点偏向 75 一侧 1/4 个步长
+    np.testing.assert_allclose(centroid, [100.10, 100.3025], rtol=1e-12)
+    np.testing.assert_array_equal(intensity, [100, 100])
+    np.testing.assert_allclose(snr, [99 / (435.5 / 41)] * 2)
+    # 半高 50：对称峰左右各到相邻点；不对称峰两侧线性插值
+    np.testing.assert_allclose(fwhm, [0.02, 0.01 * (1 + 25 / 74 + 2 / 3)], rtol=1e-9)
+    assert len(pick_peak_arrays(mz, y, snr=0)[0]) == 3
+    assert len(pick_peak_arrays(mz, y, snr=3.0, min_intensity=200)[0]) == 0
+
+
+def test_pick_peaks_frame():
+    df = pick_peaks(*profile())
+    assert df.columns.tolist() == ['m/z', 'Intensity', 'SNR', 'FWHM']
+    assert len(df) == 2
+    assert pick_peaks([100.0, 100.1], [1.0, 2.0]).empty
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_batch_matches_single(n_jobs):
+    mz, y = profile()
+    spectra = [(mz, y), (mz, y[::-1]), (mz[:2], y[:2])]
+    result = pick_peaks_batch(spectra, n_jobs=n_jobs, chunk_size=2)
+    assert len(result) == 3
+    for (spectrum_mz, spectrum_y), peaks in zip(spectra, result):
+        for got, expected in zip(peaks, pick_peak_arrays(spectrum_mz, spectrum_y)):
+            np.testing.assert_array_equal(got, expected)
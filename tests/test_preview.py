@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from msidat.annotator.preview import AnnotationPreview, error_summary
+from msidat.match.compound_match import CompoundMatch
+from msidat.match.preview import ShiftPreview
+
+
+def test_error_summary():
+    summary = error_summary(np.array([-2.0, 1.0, 1.0, 4.0]), -5, 5, bins=2)
+    assert summary['count'] == 4
+    assert summary['avg'] == 1.0 and summary['median'] == 1.0
+    assert summary['min'] == -2.0 and summary['max'] == 4.0
+    # 样本标准差：偏差平方和 9 + 0 + 0 + 9 = 18，除以 3
+    assert summary['std'] == pytest.approx(np.sqrt(6))
+    counts, edges = summary['histogram']
+    assert counts.tolist() == [1, 3] and edges.tolist() == [-5, 0, 5]
+    empty = error_summary(np.zeros(0), -5, 5)
+    assert empty['count'] == 0 and empty['median'] is None and empty['std'] is None
+
+
+def test_annotation_preview():
+    data_base = pd.DataFrame({'Name': ['alpha', 'beta'], 'Formula': ['X', 'Y'],
+                              'Monoisotopic Molecular Weight': [199.0, 299.0], 'ID': [1, 2],
+                              '[M+H]+': [200.0, 300.0], '[M+Na]+': [222.0, 322.0]})
+    # 相对误差 (库 - 测量) / 库：200.0004 为 -2 ppm，300.0 为 0，322.0 * (1 - 8e-6) 为 +8 ppm
+    preview = AnnotationPreview(data_base, [200.0004, 300.0, 322.0 * (1 - 8e-6), 250.0], window_ppm=5)
+    summary = preview.summary(5, -5)
+    assert (summary['peaks'], summary['annotated'], summary['matches']) == (4, 2, 2)
+    assert summary['median'] == pytest.approx(-1.0)
+    # 窗口之外的上限触发一次新的检索
+    summary = preview.summary(10, -1)
+    assert preview.window[1] >= 10
+    assert summary['annotated'] == 2
+    assert summary['min'] == pytest.approx(0.0, abs=1e-9) and summary['max'] == pytest.approx(8.0)
+    # 判定为严格不等式：0 ppm 不在 (0, 10) 内
+    assert preview.summary(10, 0)['matches'] == 1
+
+
+def test_shift_preview_matches_compound_match():
+    source = pd.DataFrame({'m/z': [100.001, 200.0, 300.003, 400.0], 'Intensity': [5000, 2000, 800, 5000]})
+    target = pd.DataFrame({'Theoretical m/z': [100.0, 200.0, 300.0, 500.0]})
+    preview = ShiftPreview(CompoundMatch(source, target))
+    for tolerance, threshold in ((20, 1000), (5, 1000), (20, 500)):
+        match = CompoundMatch(source, target)
+        match.mz_tolerance = tolerance * 1e-6
+        match.intensity_threshold = threshold
+        match.match()
+        summary = preview.summary(tolerance, threshold)
+        assert summary['targets'] == 4
+        assert summary['matched'] == int(match.df_output['measured m/z'].notna().sum())
+        assert summary['median'] == pytest.approx(match.median_rel_error)
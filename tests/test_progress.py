@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+from msidat.match.compound_match import CompoundMatch
+from msidat.tools import progress as progress_module
+from msidat.tools.progress import JobCancelled, ProgressEvent, ProgressReporter
+
+
+def test_event():
+    event = ProgressEvent('annotation', 'compute', 25, 100, 5.0)
+    assert event.fraction == 0.25
+    assert event.rate == 5.0
+    assert event.eta == 15.0
+    assert str(event) == 'annotation compute 25% (25/100), 5/s, ETA 15 s'
+    assert ProgressEvent('batch', 'read', 0, 0, 0.0).eta is None
+    assert str(ProgressEvent('batch', 'write', 100, 100, 2.0)) == 'batch write 100% (100/100), 50/s'
+
+
+def test_reporter_rate_limit(monkeypatch):
+    clock = [10.0]
+    monkeypatch.setattr(progress_module.time, 'perf_counter', lambda: clock[0])
+    events = []
+    reporter = ProgressReporter(lambda event: events.append((event.phase, event.done, event.elapsed)), 'shift',
+                                min_interval=1.0)
+    reporter.start('compute', 10)
+    # 间隔 1 秒内的更新被跳过，阶段的开始与结束总会报告
+    for done, now in ((1, 10.5), (2, 11.0), (3, 11.5), (4, 12.5)):
+        clock[0] = now
+        reporter.update(done)
+    reporter.advance(2)
+    reporter.finish()
+    assert events == [('compute', 0, 0.0), ('compute', 2, 1.0), ('compute', 4, 2.5), ('compute', 10, 2.5)]
+    assert not ProgressReporter().enabled
+    ProgressReporter().start('read', 5)
+
+
+def test_engine_phases_and_cancel():
+    events = []
+    match = CompoundMatch(pd.DataFrame({'m/z': [100.0], 'Intensity': [5000]}),
+                          pd.DataFrame({'Theoretical m/z': [100.0, 200.0]}))
+    match.progress_callback = lambda event: events.append((event.task, event.phase, event.done, event.total))
+    match.match()
+    assert events == [('shift', 'compute', 0, 2), ('shift', 'compute', 2, 2)]
+
+    def cancel(event):
+        raise JobCancelled()
+    match.progress_callback = cancel
+    with pytest.raises(JobCancelled):
+        match.match()
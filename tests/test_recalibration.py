@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from msidat.imaging.recalibration import PixelRecalibration
+from msidat.match.compound_match import CompoundMatch
+
+
+class SpectrumReader(object):
+    # 1 x 3 像素的 processed 数据
+    def __init__(self, spectra):
+        self.spectra = [(np.asarray(mz, dtype=float), np.asarray(i, dtype=float)) for mz, i in spectra]
+        self.coordinates = np.array([[i + 1, 1] for i in range(len(spectra))])
+        self.shape = (1, len(spectra))
+        self.is_continuous = False
+
+    def __len__(self):
+        return len(self.spectra)
+
+    def get_spectrum(self, index):
+        return self.spectra[index]
+
+    def iter_spectra(self, start=0, stop=None):
+        for spectrum in self.spectra[start:stop]:
+            yield spectrum
+
+
+def reader():
+    # 像素 0：两个锁定质量都偏 +5 ppm；像素 1：200 处 +2 ppm、400 处 +6 ppm；像素 2：锁定质量峰强度过低
+    return SpectrumReader([
+        ([200 * (1 + 5e-6), 300.0, 400 * (1 + 5e-6)], [500, 500, 500]),
+        ([200 * (1 + 2e-6), 400 * (1 + 6e-6)], [500, 500]),
+        ([200.0, 400.0], [5, 5]),
+    ])
+
+
+def test_shift_model():
+    recalibration = PixelRecalibration(reader(), [400.0, 200.0], mz_tolerance=10e-6, intensity_threshold=10).fit(n_jobs=1)
+    np.testing.assert_allclose(recalibration.coefficients[:2], [[5, 0], [4, 0]], atol=1e-6)
+    assert np.isnan(recalibration.coefficients[2, 0])
+    drift, n_locks = recalibration.drift_map()
+    assert n_locks.tolist() == [[2, 2, 0]]
+    np.testing.assert_allclose(drift[0, :2], [5, 4], atol=1e-6)
+    # 未拟合的像素不做校正
+    np.testing.assert_array_equal(recalibration.get_spectrum(2)[0], [200.0, 400.0])
+    np.testing.assert_allclose(recalibration.get_spectrum(0)[0][[0, 2]], [200.0, 400.0], rtol=1e-12)
+
+
+def test_linear_model():
+    recalibration = PixelRecalibration(reader(), [200.0, 400.0], mz_tolerance=10e-6, intensity_threshold=10,
+                                       model='linear').fit(n_jobs=1)
+    # 2 = a + 200 b, 6 = a + 400 b
+    np.testing.assert_allclose(recalibration.coefficients[1], [-2.0, 0.02], atol=1e-6)
+    np.testing.assert_allclose(recalibration.get_spectrum(1)[0], [200.0, 400.0], rtol=1e-9)
+
+
+def test_lock_masses_follow_compound_match():
+    rng = np.random.default_rng(3)
+    spectra = [(np.sort(rng.uniform(100, 500, 50)), rng.uniform(0, 2000, 50)) for _ in range(5)]
+    lock_mz = np.sort(np.r_[spectra[0][0][::10] * (1 + 3e-6), rng.uniform(100, 500, 5)])
+    recalibration = PixelRecalibration(SpectrumReader(spectra), lock_mz, intensity_threshold=1000).fit(chunk_size=2)
+    for index, (mz, intensity) in enumerate(spectra):
+        match = CompoundMatch(pd.DataFrame({'m/z': mz, 'Intensity': intensity}),
+                              pd.DataFrame({'Theoretical m/z': lock_mz}))
+        match.intensity_threshold = 1000
+        measured = match.find_all(lock_mz)
+        found = ~np.isnan(measured)
+        assert recalibration._n_locks[index] == found.sum()
+        if found.any():
+            expected = np.median((measured[found] - lock_mz[found]) / lock_mz[found] * 1e6)
+            assert recalibration.coefficients[index, 0] == pytest.approx(expected)
@@ -0,0 +1,96 @@
+import os
+import pandas as pd
+
+from msidat.tools.result_cache import ResultCache
+
+
+def test_key_inputs(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    path = tmp_path / 'peaks.csv'
+    path.write_text('m/z,Intensity\n100.0,5\n')
+    frame = pd.DataFrame({'m/z': [100.0], 'Intensity': [5.0]})
+    key = cache.key('annotation', files=[str(path)], frames=[frame], params={'ppm': 5})
+    assert key == cache.key('annotation', files=[str(path)], frames=[frame.copy()], params={'ppm': 5})
+    assert key != cache.key('shift', files=[str(path)], frames=[frame], params={'ppm': 5})
+    assert key != cache.key('annotation', files=[str(path)], frames=[frame], params={'ppm': 10})
+    assert key != cache.key('annotation', files=[(str(path), 'Sheet2')], frames=[frame], params={'ppm': 5})
+    assert key != cache.key('annotation', files=[str(path)], frames=[frame.rename(columns={'m/z': 'mz'})],
+                            params={'ppm': 5})
+    frame.loc[0, 'Intensity'] = 6.0
+    assert key != cache.key('annotation', files=[str(path)], frames=[frame], params={'ppm': 5})
+
+
+def test_key_file_identity(tmp_path):
+    path = tmp_path / 'peaks.csv'
+    path.write_text('m/z\n100.0\n')
+    os.utime(path, ns=(1000, 1000))
+    by_stat = ResultCache(str(tmp_path / 'cache'))
+    by_contents = ResultCache(str(tmp_path / 'cache'), hash_contents=True)
+    keys = by_stat.key('shift', files=[str(path)]), by_contents.key('shift', files=[str(path)])
+    # 内容不变只改 mtime：路径模式失效，内容模式命中
+    os.utime(path, ns=(2000, 2000))
+    assert by_stat.key('shift', files=[str(path)]) != keys[0]
+    assert by_contents.key('shift', files=[str(path)]) == keys[1]
+    # 同样大小的不同内容 (内容摘要按路径、mtime 与大小缓存)
+    path.write_text('m/z\n200.0\n')
+    os.utime(path, ns=(3000, 3000))
+    assert by_contents.key('shift', files=[str(path)]) != keys[1]
+
+
+def test_get_put_disabled(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    assert cache.get('a' * 64) is None
+    cache.put('a' * 64, {'rows': [1, 2]})
+    assert cache.get('a' * 64) == {'rows': [1, 2]}
+    # 损坏的条目按未命中处理
+    (tmp_path / 'cache' / ('b' * 64 + '.pkl')).write_bytes(b'not a pickle')
+    assert cache.get('b' * 64) is None
+    cache.enabled = False
+    assert cache.get('a' * 64) is None
+    cache.put('c' * 64, 1)
+    assert not os.path.exists(os.path.join(cache.directory, 'c' * 64 + '.pkl'))
+
+
+def test_lru_eviction(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'), max_bytes=10 ** 6)
+    for i, key in enumerate('abc'):
+        cache.put(key * 64, bytes(1000))
+        path = os.path.join(cache.directory, key * 64 + '.pkl')
+        os.utime(path, (100 + i, 100 + i))
+    size = os.path.getsize(path)
+    # 命中刷新 mtime：a 成为最近使用
+    assert cache.get('a' * 64) == bytes(1000)
+    cache.max_bytes = 2 * size
+    cache.evict()
+    assert sorted(os.path.basename(p)[0] for p, _, _ in cache.entries()) == ['a', 'c']
+    assert cache.size == 2 * size
+    cache.clear()
+    assert cache.entries() == []
+
+
+def test_recorded_outputs(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    output = tmp_path / 'result.csv'
+    output.write_text('m/z\n100.0\n')
+    key = 'd' * 64
+    # 条目不存在时不记录输出
+    cache.record_output(key, str(output))
+    assert not cache.output_current(key, str(output))
+    cache.put(key, 1)
+    cache.record_output(key, str(output))
+    assert cache.output_current(key, str(output))
+    assert not cache.output_current(key, [str(output), str(tmp_path / 'other.csv')])
+    output.write_text('m/z\n100.0\n200.0\n')
+    assert not cache.output_current(key, str(output))
+    # 淘汰时一并删除输出记录
+    cache.max_bytes = 0
+    cache.evict()
+    assert os.listdir(cache.directory) == []
+
+
+def test_from_config(tmp_path):
+    cache = ResultCache.from_config({'Result Cache': {'Directory': str(tmp_path), 'Max Size (MB)': 2,
+                                                      'Hash Contents': True}}, enabled=True)
+    assert cache.enabled and cache.directory == str(tmp_path) and cache.max_bytes == 2 * 1024 ** 2
+    assert not ResultCache.from_config({}).enabled
+    assert not ResultCache.from_config({'Result Cache': {'Enabled': False}}, enabled=True).enabled
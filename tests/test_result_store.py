@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('h5py')
+from msidat.tools.result_store import ResultStore
+
+
+def test_append_table_chunks(tmp_path):
+    with ResultStore(str(tmp_path / 'result.h5'), 'w') as store:
+        store.append_table('t', pd.DataFrame({'a': [1, 2], 's': ['x', 'y']}))
+        # int 列遇到缺失值扩展为 float；首块无空值的文本列也保留后续块的空值
+        store.append_table('t', pd.DataFrame({'a': [3.5, np.nan], 's': ['z', None]}))
+        store.append_table('t', pd.DataFrame({'a': pd.array([7, None], dtype='Int64'), 's': ['u', 'v']}))
+        assert store.table_rows('t') == 6
+        df = store.read_table('t')
+    np.testing.assert_array_equal(df['a'].to_numpy(dtype=float), [1, 2, 3.5, np.nan, 7, np.nan])
+    assert df['s'].tolist()[:3] == ['x', 'y', 'z']
+    assert pd.isna(df['s'][3])
+    assert df['s'].tolist()[4:] == ['u', 'v']
+
+
+def test_append_table_mismatch(tmp_path):
+    with ResultStore(str(tmp_path / 'result.h5'), 'w') as store:
+        store.append_table('t', pd.DataFrame({'a': [1, 2], 's': ['x', 'y']}))
+        with pytest.raises(ValueError):
+            store.append_table('t', pd.DataFrame({'b': [1], 's': ['x']}))
+        with pytest.raises(ValueError):
+            store.append_table('t', pd.DataFrame({'a': ['text'], 's': ['x']}))
+        assert store.table_rows('t') == 2
+
+
+def test_read_table_rows_and_mz_range(tmp_path):
+    with ResultStore(str(tmp_path / 'result.h5'), 'w') as store:
+        store.write_table('t', pd.DataFrame({'m/z': [100.0, 150.0, 200.0, 250.0, 300.0, 350.0],
+                                             'name': ['a', 'b', 'c', 'd', 'e', 'f']}))
+        # 行 1, 3, 4 中 m/z 在 [200, 320] 的是 250 和 300
+        df = store.read_table('t', rows=[1, 3, 4], mz_range=(200, 320))
+        assert df['name'].tolist() == ['d', 'e']
+        assert store.read_table('t', rows=slice(1, None, 2), mz_range=(200, 400))['name'].tolist() == ['d', 'f']
+        assert store.read_table('t', rows=slice(2, 5), mz_range=(0, 260))['m/z'].tolist() == [200.0, 250.0]
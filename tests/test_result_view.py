@@ -0,0 +1,53 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+pytest.importorskip('PyQt5')
+from PyQt5.QtCore import Qt
+from msidat.gui.result_view import DataFrameModel
+
+
+def frame():
+    return pd.DataFrame({'m/z': [300.0, np.nan, 100.0, 200.0, 100.0],
+                         'total': ['Beta;[M+H]+', '', 'alpha;[M+Na]+', None, 'gamma;[M+H]+']})
+
+
+def cell(model, row, column):
+    return model.data(model.index(row, column))
+
+
+def test_lazy_rows():
+    model = DataFrameModel(frame(), fetch_size=2)
+    assert model.rowCount() == 2 and model.columnCount() == 2
+    assert model.canFetchMore()
+    model.fetchMore()
+    model.fetchMore()
+    assert model.rowCount() == 5 and not model.canFetchMore()
+    # 数值按 %.10g 显示，NaN 与 None 显示为空
+    assert [cell(model, i, 0) for i in range(5)] == ['300', '', '100', '200', '100']
+    assert cell(model, 3, 1) == ''
+    assert model.headerData(0, Qt.Horizontal) == 'm/z'
+
+
+def test_sort():
+    model = DataFrameModel(frame())
+    model.sort(0, Qt.AscendingOrder)
+    # 稳定排序，NaN 在最后；行表头保留原始行号
+    assert model.row_positions.tolist() == [2, 4, 3, 0, 1]
+    assert model.headerData(0, Qt.Vertical) == '3'
+    model.sort(0, Qt.DescendingOrder)
+    assert model.row_positions.tolist() == [0, 3, 2, 4, 1]
+    model.sort(1, Qt.AscendingOrder)
+    assert [cell(model, i, 1) for i in range(4)] == ['', 'Beta;[M+H]+', 'alpha;[M+Na]+', 'gamma;[M+H]+']
+
+
+def test_filter():
+    model = DataFrameModel(frame())
+    model.set_filter('[m+h]')
+    assert model.row_positions.tolist() == [0, 4]
+    model.set_filter('100', column=0)
+    assert model.row_positions.tolist() == [2, 4]
+    model.set_filter('  ')
+    assert model.row_positions.tolist() == [0, 1, 2, 3, 4]
@@ -0,0 +1,65 @@
+import json
+import tracemalloc
+import pandas as pd
+
+from msidat.annotator.make_annotator import Annotator
+from msidat.tools.progress import ProgressEvent
+from msidat.tools.run_report import RunReport
+
+
+def test_engine_phases_and_stages(tmp_path):
+    report = RunReport('annotation')
+    forwarded = []
+    callback = report.progress_callback(forwarded.append)
+    with report.stage('read msi data') as record:
+        record['rows'] = 2
+    annotator = Annotator()
+    annotator.progress_callback = callback
+    annotator.annotate(pd.DataFrame({'m/z': [200.0, 300.0], 'Intensity': [1.0, 2.0]}),
+                       pd.DataFrame({'Name': ['alpha'], 'Formula': ['X'], 'Monoisotopic Molecular Weight': [199.0],
+                                     'ID': [1], '[M+H]+': [200.0]}))
+    assert [(v['task'], v['stage'], v['rows']) for v in report.stages] == \
+        [('annotation', 'read msi data', 2), ('annotation', 'compute', 2)]
+    # 所有事件仍转发给原回调
+    assert forwarded[0].phase == 'compute' and forwarded[-1].done == 2
+
+    path = report.write(str(tmp_path / 'out.xlsx'))
+    assert path == str(tmp_path / 'out.report.json')
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    assert data['task'] == 'annotation'
+    assert [v['stage'] for v in data['stages']] == ['read msi data', 'compute']
+    assert all(not k.startswith('_') for v in data['stages'] for k in v)
+
+
+def test_repeated_phase_opens_new_stage():
+    report = RunReport('database')
+    callback = report.progress_callback()
+    for event in (ProgressEvent('database', 'compute', 0, 4, 0.0), ProgressEvent('database', 'compute', 4, 4, 0.1),
+                  ProgressEvent('database', 'write', 0, 4, 0.0), ProgressEvent('database', 'compute', 0, 2, 0.0)):
+        callback(event)
+    assert [(v['stage'], v['rows']) for v in report.stages] == [('compute', 4), ('write', 0), ('compute', 0)]
+
+
+def test_trace_memory(tmp_path):
+    report = RunReport('shift', trace_memory=True)
+    with report.stage('allocate'):
+        data = bytearray(4 * 1024 * 1024)
+    del data
+    record = report.stages[0]
+    assert record['memory_peak_mb'] >= 4
+    # 写出报告时停止本报告开启的 tracemalloc
+    report.write(str(tmp_path / 'out.csv'))
+    assert not tracemalloc.is_tracing()
+
+
+def test_disabled_costs_nothing(tmp_path):
+    report = RunReport.from_config({}, 'shift')
+    assert not report.enabled
+    callback = print
+    assert report.progress_callback(callback) is callback
+    with report.stage('read') as record:
+        record['rows'] = 1
+    assert report.stages == []
+    assert report.write(str(tmp_path / 'out.csv')) is None
+    assert RunReport.from_config({'Run Report': {'Enabled': True}}, 'shift').enabled
@@ -0,0 +1,83 @@
+import io
+import json
+import threading
+import urllib.error
+import urllib.request
+import pandas as pd
+import pytest
+
+from msidat.service.server import ARROW_STREAM, AnnotationService, make_server
+
+
+def database():
+    return pd.DataFrame({'Name': ['alpha', 'beta'], 'Formula': ['X', 'Y'],
+                         'Monoisotopic Molecular Weight': [199.0, 299.0], 'ID': [1, 2],
+                         '[M+H]+': [200.0, 300.0], '[M+Na]+': [222.0, 322.0]})
+
+
+@pytest.fixture
+def url():
+    service = AnnotationService(database(), pd.DataFrame({'Theoretical m/z': [100.0, 200.0]}),
+                                up_limit_ppm=5, low_limit_ppm=-5, intensity_threshold=10)
+    server = make_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:%d' % server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+def request(url, body=None, content_type='application/json'):
+    data = None if body is None else (body if isinstance(body, bytes) else json.dumps(body).encode('utf-8'))
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': content_type})
+    try:
+        with urllib.request.urlopen(req, timeout=10) as response:
+            return response.status, response.headers['Content-Type'], response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers['Content-Type'], e.read()
+
+
+def test_health(url):
+    status, _, body = request(url + '/health')
+    info = json.loads(body)
+    assert status == 200
+    assert info['compounds'] == 2 and info['targets'] == 2
+    assert info['adducts'] == ['[M+H]+', '[M+Na]+']
+
+
+def test_annotate(url):
+    # 200.0006 偏 3 ppm；请求中收窄到 +/-2 ppm 后不再匹配
+    status, _, body = request(url + '/annotate', {'mz': [200.0006, 322.0, 250.0]})
+    assert status == 200
+    assert [row['total'] for row in json.loads(body)['annotations']] == ['alpha;[M+H]+', 'beta;[M+Na]+', '']
+    _, _, body = request(url + '/annotate', {'mz': [200.0006], 'up_limit_ppm': 2, 'low_limit_ppm': -2})
+    assert json.loads(body)['annotations'][0]['total'] == ''
+
+
+def test_match(url):
+    status, _, body = request(url + '/match', {'mz': [100.001, 200.0, 300.0], 'intensity': [50, 5, 50]})
+    result = json.loads(body)
+    assert status == 200
+    # 200.0 强度低于阈值 10
+    assert result['summary']['matched'] == 1
+    assert result['summary']['median_rel_error'] == pytest.approx(10.0)
+    assert result['matches'][1]['measured m/z'] is None
+
+
+def test_errors(url):
+    status, _, body = request(url + '/annotate', {'intensity': [1]})
+    assert status == 400 and 'KeyError' in json.loads(body)['error']
+    assert request(url + '/missing', {'mz': [1]})[0] == 404
+    assert request(url + '/missing')[0] == 404
+
+
+def test_arrow(url):
+    pa = pytest.importorskip('pyarrow')
+    sink = io.BytesIO()
+    table = pa.table({'mz': [222.0, 250.0]})
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    status, content_type, body = request(url + '/annotate?up_limit_ppm=5', sink.getvalue(), ARROW_STREAM)
+    assert status == 200 and content_type == ARROW_STREAM
+    frame = pa.ipc.open_stream(body).read_all().to_pandas()
+    assert frame['total'].tolist() == ['alpha;[M+Na]+', '']
@@ -0,0 +1,70 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+from msidat.molar_mass.cal_molar_mass import MolarMassCalculator
+from msidat.tools.table_io import StreamingTableWriter, read_table, sheet_names, table_path, write_table_streaming
+
+DATABASE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database')
+
+
+def chunks():
+    yield pd.DataFrame({'m/z': [100.0, 200.0], 'Name': ['a', None]})
+    yield pd.DataFrame({'m/z': [300.0], 'Name': ['c']})
+
+
+@pytest.mark.parametrize('ext', ['.csv', '.xlsx', '.parquet', '.feather', '.h5'])
+def test_chunks_written_in_order(tmp_path, ext):
+    if ext in ('.parquet', '.feather'):
+        pytest.importorskip('pyarrow')
+    if ext == '.h5':
+        pytest.importorskip('h5py')
+    path = str(tmp_path / ('out' + ext))
+    assert write_table_streaming(chunks(), path, sheet_name='peaks') == 3
+    df = read_table(path)
+    assert df['m/z'].tolist() == [100.0, 200.0, 300.0]
+    assert df['Name'][0] == 'a' and pd.isna(df['Name'][1])
+    # 正常关闭后不留临时文件
+    assert os.listdir(str(tmp_path)) == ['out' + ext]
+
+
+def test_excel_row_limit(tmp_path):
+    path = str(tmp_path / 'out.xlsx')
+    with StreamingTableWriter(path, max_rows=3) as writer:
+        writer.add_table('peaks')
+        for chunk in chunks():
+            writer.write_frame(chunk)
+    # 每个工作表 2 行数据 + 表头
+    assert sheet_names(path) == ['peaks', 'peaks_2']
+    assert read_table(path, sheet_name='peaks_2')['m/z'].tolist() == [300.0]
+
+
+def test_discard_on_error(tmp_path):
+    path = str(tmp_path / 'out.csv')
+    pd.DataFrame({'old': [1]}).to_csv(path, index=False)
+    with pytest.raises(RuntimeError):
+        with StreamingTableWriter(path) as writer:
+            writer.write_frame(pd.DataFrame({'m/z': [100.0]}))
+            raise RuntimeError('cancelled')
+    # 原文件保持不变，部分输出被删除
+    assert os.listdir(str(tmp_path)) == ['out.csv']
+    assert read_table(path).columns.tolist() == ['old']
+
+
+def test_molar_mass_streaming(tmp_path):
+    input_file = str(tmp_path / 'compounds.csv')
+    pd.DataFrame({'Name': ['methane', 'water'], 'Formula': ['CH4', 'H2O']}).to_csv(input_file, index=False)
+    output_file = str(tmp_path / 'database.csv')
+    calculator = MolarMassCalculator(input_file, output_file, elements_mass_file=os.path.join(DATABASE, 'elements_mass.json'),
+                                     adduct_type_file=os.path.join(DATABASE, 'adduct_type.json'), streaming=True)
+    assert calculator.process_file(positive_list=['M+H'], negative_list=['M-H'], all=False) == {}
+    positive = read_table(table_path(output_file, 'positive'))
+    negative = read_table(table_path(output_file, 'negative'))
+    # CH4 = 12 + 4 * 1.007825，H2O = 2 * 1.007825 + 15.9949146
+    np.testing.assert_allclose(positive['Monoisotopic Molecular Weight'], [16.0313, 18.0105646])
+    np.testing.assert_allclose(positive['[M+H]+'], [16.0313 + 1.0072766, 18.0105646 + 1.0072766])
+    np.testing.assert_allclose(negative['[M-H]-'], [16.0313 - 1.0072766, 18.0105646 - 1.0072766])
+    assert positive['ID'].tolist() == [1, 2]
+    frames = calculator.calculate(positive_list=['M+H'], negative_list=['M-H'], all=False)
+    pd.testing.assert_frame_equal(frames['positive'], positive, check_dtype=False)
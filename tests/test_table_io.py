@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from msidat.tools.table_io import file_format, read_columns, read_table, sheet_names, table_path, write_table, \
+    write_tables
+
+
+def peaks():
+    return pd.DataFrame({'m/z': [100.5, 200.25, 300.125], 'Intensity': [10, 20, 30], 'Name': ['a', 'b', None]})
+
+
+@pytest.mark.parametrize('ext', ['.xlsx', '.csv', '.tsv', '.parquet', '.feather', '.h5'])
+def test_round_trip(tmp_path, ext):
+    if ext in ('.parquet', '.feather'):
+        pytest.importorskip('pyarrow')
+    if ext == '.h5':
+        pytest.importorskip('h5py')
+    path = str(tmp_path / ('peaks' + ext))
+    write_table(peaks(), path)
+    df = read_table(path)
+    assert df.columns.tolist() == ['m/z', 'Intensity', 'Name']
+    np.testing.assert_array_equal(df['m/z'], [100.5, 200.25, 300.125])
+    np.testing.assert_array_equal(df['Intensity'], [10, 20, 30])
+    assert df['Name'].tolist()[:2] == ['a', 'b'] and pd.isna(df['Name'][2])
+    assert read_columns(path).tolist() == ['m/z', 'Intensity', 'Name']
+    assert read_table(path, usecols=['m/z'], nrows=2)['m/z'].tolist() == [100.5, 200.25]
+
+
+def test_file_format():
+    assert file_format('a/b.XLSX') == 'excel'
+    assert file_format('b.tsv') == 'csv'
+    assert file_format('b.pq') == 'parquet'
+    assert file_format('b.arrow') == 'feather'
+    assert file_format('b.imzML') == 'imzml'
+    with pytest.raises(ValueError):
+        file_format('b.txt')
+    with pytest.raises(ValueError):
+        write_table(peaks(), 'b.imzML')
+
+
+def test_write_tables(tmp_path):
+    frames = {'first': peaks(), 'second': peaks().iloc[:1]}
+    path = str(tmp_path / 'out.xlsx')
+    assert write_tables(frames, path) == [path]
+    assert sheet_names(path) == ['first', 'second']
+    assert len(read_table(path, sheet_name='second')) == 1
+    # 单表格式每个 sheet 写一个文件
+    path = str(tmp_path / 'out.csv')
+    assert write_tables(frames, path) == [table_path(path, 'first'), table_path(path, 'second')]
+    assert table_path(path, 'first').endswith('out_first.csv')
+    assert len(read_table(table_path(path, 'second'))) == 1
@@ -0,0 +1,60 @@
+import os
+import pandas as pd
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+pytest.importorskip('PyQt5')
+from msidat.annotator.make_annotator import Annotator
+from msidat.gui.worker import JobWorker
+from msidat.tools.progress import JobCancelled
+
+
+def run(worker):
+    # 在当前线程中运行，信号直接连接，立即收到
+    received = []
+    worker.signals.progress.connect(lambda done, total, message: received.append(('progress', done, total)))
+    worker.signals.finished.connect(lambda result: received.append(('finished', result)))
+    worker.signals.failed.connect(lambda message: received.append(('failed', message)))
+    worker.signals.cancelled.connect(lambda: received.append(('cancelled',)))
+    worker.run()
+    return received
+
+
+def annotate_job(output_path, streaming=False):
+    data_base = pd.DataFrame({'Name': ['alpha'], 'Formula': ['X'], 'Monoisotopic Molecular Weight': [199.0],
+                              'ID': [1], '[M+H]+': [200.0]})
+    msi_data = pd.DataFrame({'m/z': [200.0, 300.0], 'Intensity': [1.0, 2.0]})
+
+    def job(progress_callback):
+        annotator = Annotator(output_path=output_path, streaming=streaming)
+        annotator.progress_callback = progress_callback
+        return annotator.annotate(msi_data, data_base)
+    return job
+
+
+def test_finished_with_progress(tmp_path):
+    received = run(JobWorker(annotate_job(str(tmp_path / 'out.csv'))))
+    assert received[0][0] == 'progress'
+    assert received[-1][0] == 'finished'
+    assert received[-1][1]['total'].tolist() == ['alpha;[M+H]+', '']
+    # 最后一个进度事件为完成状态
+    progress = [v for v in received if v[0] == 'progress']
+    assert progress[-1][1] == progress[-1][2]
+
+
+def test_cancel_stops_at_first_checkpoint(tmp_path):
+    output_path = str(tmp_path / 'out.csv')
+    worker = JobWorker(annotate_job(output_path, streaming=True))
+    worker.cancel()
+    assert worker.is_cancelled
+    assert run(worker) == [('cancelled',)]
+    # 流式输出被取消时不留下部分文件
+    assert os.listdir(str(tmp_path)) == []
+    with pytest.raises(JobCancelled):
+        worker.progress_callback(None)
+
+
+def test_failed():
+    def job(progress_callback):
+        raise ValueError('bad input')
+    assert run(JobWorker(job)) == [('failed', 'bad input')]
@@ -1 +1,17 @@
-from . import msidat_logger
\ No newline at end of file
+import importlib
+
+_SUBMODULES = ('msidat_logger', 'table_io', 'dataset_cache', 'result_store', 'progress', 'run_report', 'result_cache')
+
+__all__ = list(_SUBMODULES)
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        module = importlib.import_module('.' + name, __name__)
+        globals()[name] = module
+        return module
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_SUBMODULES))
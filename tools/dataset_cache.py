@@ -0,0 +1,74 @@
+import os
+import threading
+from collections import OrderedDict
+from loguru import logger
+from .table_io import file_format, read_table, read_columns, sheet_names
+
+
+class DatasetCache(object):
+    """
+    Session cache of parsed tables keyed by (path, sheet, mtime, size).
+    A file is parsed at most once as long as it is unchanged on disk; column and sheet
+    probes are served header-only and never trigger a full parse.
+    Cached DataFrames are shared between callers and must be treated as read-only.
+    """
+    def __init__(self, max_frames=8):
+        self._max_frames = max_frames
+        self._frames = OrderedDict()
+        self._columns = {}
+        self._sheets = {}
+        self._lock = threading.RLock()
+
+    def _file_key(self, path):
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+    def _key(self, path, sheet_name):
+        path_key, mtime, size = self._file_key(path)
+        if isinstance(sheet_name, int) and file_format(path) in ('excel', 'hdf5'):
+            sheet_name = self.sheet_names(path)[sheet_name]
+        return (path_key, sheet_name, mtime, size)
+
+    def sheet_names(self, path):
+        """
+        Return the sheet names of a file (read-only probe).
+        """
+        key = self._file_key(path)
+        with self._lock:
+            if key not in self._sheets:
+                self._sheets[key] = sheet_names(path)
+            return self._sheets[key]
+
+    def columns(self, path, sheet_name=0):
+        """
+        Return the column names of a table, from the cached frame or a header-only read.
+        """
+        key = self._key(path, sheet_name)
+        with self._lock:
+            if key in self._frames:
+                return self._frames[key].columns
+            if key not in self._columns:
+                self._columns[key] = read_columns(path, sheet_name=sheet_name)
+            return self._columns[key]
+
+    def read(self, path, sheet_name=0):
+        """
+        Return the parsed table, reading the file only if it is not cached yet.
+        """
+        key = self._key(path, sheet_name)
+        with self._lock:
+            if key in self._frames:
+                self._frames.move_to_end(key)
+                logger.debug('dataset cache hit: {} [{}]', path, key[1])
+                return self._frames[key]
+            df = read_table(path, sheet_name=sheet_name)
+            self._frames[key] = df
+            while len(self._frames) > self._max_frames:
+                self._frames.popitem(last=False)
+            return df
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self._columns.clear()
+            self._sheets.clear()
@@ -2,8 +2,15 @@ import os
 import sys
 from loguru import logger
 
-def setup_msidat_logger():
-    """Setup msidat logger configuration"""
+def setup_msidat_logger(console_level="INFO", log_files=True, performance=False, file_level=None):
+    """
+    Setup msidat logger configuration: console output and two rotating files under log/,
+    msidat.log (every record from file_level on) and error.log (ERROR and above, with backtraces).
+    performance: production mode, the sinks are enqueued (written by a background thread, the logging
+        call only puts the record in a queue), variable values are not collected for tracebacks and
+        file_level defaults to INFO, so debug records are dropped before they are formatted.
+    Not run on import; call it once from an entry point (the GUI and the command line do).
+    """
     try:
         # 移除所有已存在的处理器
         logger.configure(handlers=[], extra={})
@@ -17,7 +24,6 @@ def setup_msidat_logger():
             base_path = os.path.dirname(os.path.dirname(__file__))
         
         folder_ = os.path.join(base_path, 'log')
-        os.makedirs(folder_, exist_ok=True)
         
         # 日志配置
         prefix_ = os.path.sep  # 使用系统路径分隔符
@@ -25,7 +31,9 @@ def setup_msidat_logger():
         retention_ = "30 days"
         encoding_ = "utf-8"
         backtrace_ = True
-        diagnose_ = True
+        diagnose_ = not performance
+        enqueue_ = bool(performance)
+        file_level = file_level or ("INFO" if performance else "DEBUG")
         
         # 日志格式
         format_ = '<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> ' \
@@ -33,23 +41,24 @@ def setup_msidat_logger():
         
         # 只在开发环境中添加控制台输出
         if not getattr(sys, 'frozen', False):
-            logger.add(sys.stderr, level="INFO", format=format_, colorize=True)
+            logger.add(sys.stderr, level=console_level, format=format_, colorize=True, enqueue=enqueue_)
+        if not log_files:
+            return True
         
-        # 添加文件处理器
-        log_levels = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
-        for level in log_levels:
-            log_file = os.path.join(folder_, f"{level.lower()}.log")
+        # 添加文件处理器：一个分级文件 + 一个错误文件（级别由 loguru 直接比较，无需过滤函数）
+        os.makedirs(folder_, exist_ok=True)
+        for name, level, backtrace in (("msidat.log", file_level, False), ("error.log", "ERROR", backtrace_)):
             logger.add(
-                log_file,
+                os.path.join(folder_, name),
                 level=level,
                 format=format_,
                 colorize=False,
                 rotation=rotation_,
                 retention=retention_,
                 encoding=encoding_,
-                backtrace=backtrace_,
+                backtrace=backtrace,
                 diagnose=diagnose_,
-                filter=lambda record, level=level: record["level"].no >= logger.level(level).no
+                enqueue=enqueue_
             )
         
         logger.info("MSIDAT日志系统初始化成功")
@@ -57,7 +66,4 @@ def setup_msidat_logger():
         
     except Exception as e:
         print(f"MSIDAT日志系统初始化失败: {str(e)}")
-        return False
-
-# 初始化日志系统
-setup_msidat_logger()
\ No newline at end of file
+        return False
\ No newline at end of file
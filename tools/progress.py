@@ -0,0 +1,125 @@
+import time
+from loguru import logger
+
+PHASES = ('read', 'index', 'compute', 'write')
+
+
+class JobCancelled(Exception):
+    """
+    Raised from a progress callback to stop an engine at its next checkpoint.
+    """
+    pass
+
+
+class ProgressEvent(object):
+    """
+    State of one engine phase passed to progress callbacks.
+        task: engine ('database', 'shift', 'annotation', 'batch', ...)
+        phase: 'read', 'index', 'compute' or 'write'
+        done / total: work units (rows, files), total 0 when unknown
+        elapsed: seconds since the phase started
+        rate: units per second, eta: seconds left (None when unknown)
+    """
+    __slots__ = ('task', 'phase', 'done', 'total', 'elapsed')
+
+    def __init__(self, task, phase, done, total, elapsed):
+        self.task = task
+        self.phase = phase
+        self.done = done
+        self.total = total
+        self.elapsed = elapsed
+
+    @property
+    def fraction(self):
+        return min(self.done / self.total, 1.0) if self.total else None
+
+    @property
+    def rate(self):
+        return self.done / self.elapsed if self.elapsed > 0 else None
+
+    @property
+    def eta(self):
+        rate = self.rate
+        if not self.total or not rate:
+            return None
+        return max(self.total - self.done, 0) / rate
+
+    @property
+    def finished(self):
+        return bool(self.total) and self.done >= self.total
+
+    def __str__(self):
+        text = '%s %s' % (self.task, self.phase)
+        if self.total:
+            text += ' %.0f%% (%d/%d)' % (100 * self.fraction, self.done, self.total)
+        elif self.done:
+            text += ' %d' % self.done
+        if self.rate and self.done:
+            text += ', %.3g/s' % self.rate
+        if self.eta is not None and not self.finished:
+            text += ', ETA %.0f s' % self.eta
+        return text
+
+
+class ProgressReporter(object):
+    """
+    Rate-limited progress of one engine run: start(phase, total) opens a phase, update(done) / advance(n)
+    are cheap checkpoints that call callback(ProgressEvent) at most once every min_interval seconds, and
+    the first and last event of every phase are always delivered. Without a callback it does nothing.
+    A callback may raise JobCancelled to stop the engine, at the latest min_interval seconds after cancelling.
+    """
+    def __init__(self, callback=None, task='', min_interval=0.2):
+        self._callback = callback
+        self._task = task
+        self._min_interval = min_interval
+        self._phase = None
+        self._total = 0
+        self._done = 0
+        self._start = self._last = 0.0
+
+    def _emit(self, now):
+        self._last = now
+        self._callback(ProgressEvent(self._task, self._phase, self._done, self._total, now - self._start))
+
+    def start(self, phase, total=0):
+        if self._callback is None:
+            return
+        self._phase, self._total, self._done = phase, int(total or 0), 0
+        self._start = time.perf_counter()
+        self._emit(self._start)
+
+    def update(self, done):
+        if self._callback is None:
+            return
+        self._done = done
+        now = time.perf_counter()
+        if now - self._last >= self._min_interval:
+            self._emit(now)
+
+    def advance(self, n=1):
+        self.update(self._done + n)
+
+    def finish(self, done=None):
+        if self._callback is None:
+            return
+        self._done = self._total if done is None else done
+        self._emit(time.perf_counter())
+
+    @property
+    def enabled(self):
+        return self._callback is not None
+
+
+def log_progress(min_interval=2.0, level='INFO'):
+    '''
+    Objective: progress callback for the command line, logs at most one event per min_interval seconds
+    plus the start and end of every phase
+    '''
+    last = [0.0]
+
+    def callback(event):
+        now = time.perf_counter()
+        if event.done == 0 or event.finished or now - last[0] >= min_interval:
+            last[0] = now
+            logger.log(level, 'progress: {}', event)
+    return callback
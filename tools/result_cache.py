@@ -0,0 +1,230 @@
+import os
+import sys
+import json
+import pickle
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+CACHE_SUFFIX = '.pkl'
+
+
+def default_cache_dir():
+    # 与 log/ 同级：打包环境为 exe 所在目录，开发环境为项目根目录
+    if getattr(sys, 'frozen', False):
+        base_path = os.path.dirname(sys.executable)
+    else:
+        base_path = os.path.dirname(os.path.dirname(__file__))
+    return os.path.join(base_path, 'result_cache')
+
+
+def _version():
+    from .. import __version__
+    return __version__
+
+
+class ResultCache(object):
+    """
+    On-disk cache of engine results across sessions, one pickle per entry named by its key.
+    A key is the SHA-256 of the task, the tool version, the engine parameters and the inputs: files by
+    (absolute path, mtime, size), or by their contents with hash_contents, and in-memory DataFrames by
+    their contents. Entries are evicted least recently used first once the cache exceeds max_bytes
+    (a hit refreshes the entry mtime). The outputs written for an entry are recorded with their
+    (mtime, size), so a hit only rewrites an output file that was changed or removed since.
+    Cached values are shared with the caller like the DatasetCache frames and must be treated as read-only.
+    """
+    def __init__(self, directory=None, max_bytes=1024 ** 3, hash_contents=False, enabled=True):
+        self._directory = os.path.abspath(directory or default_cache_dir())
+        self._max_bytes = max_bytes
+        self._hash_contents = hash_contents
+        self._enabled = enabled
+        self._digests = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_config(cls, config, enabled=False):
+        '''
+        Objective: cache configured by the "Result Cache" section of a config.json:
+            "Enabled" (default: the enabled argument), "Directory" (default: result_cache/ next to log/),
+            "Max Size (MB)" (default 1024), "Hash Contents" (default false: path, mtime and size)
+        '''
+        section = (config or {}).get('Result Cache', {})
+        directory = section.get('Directory')
+        return cls(directory=os.path.abspath(directory) if directory else None,
+                   max_bytes=int(section.get('Max Size (MB)', 1024) * 1024 ** 2),
+                   hash_contents=bool(section.get('Hash Contents', False)),
+                   enabled=bool(section.get('Enabled', enabled)))
+
+    def _file_digest(self, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        if not self._hash_contents:
+            return '%s|%d|%d' % (path, stat.st_mtime_ns, stat.st_size)
+        memo = (path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if memo not in self._digests:
+                digest = hashlib.sha256()
+                with open(path, 'rb') as f:
+                    for block in iter(lambda: f.read(1 << 20), b''):
+                        digest.update(block)
+                self._digests[memo] = digest.hexdigest()
+            return self._digests[memo]
+
+    @staticmethod
+    def _frame_digest(df):
+        digest = hashlib.sha256(json.dumps([str(v) for v in df.columns]).encode('utf-8'))
+        digest.update(np.ascontiguousarray(pd.util.hash_pandas_object(df, index=False).to_numpy()).tobytes())
+        return digest.hexdigest()
+
+    def key(self, task, files=(), frames=(), params=None):
+        '''
+        Objective: cache key of one engine call
+        Input:
+            files: input file paths, or (path, sheet) tuples
+            frames: in-memory input DataFrames
+            params: JSON-serializable engine parameters
+        return: hex key
+        '''
+        parts = {'task': task, 'version': _version(), 'params': params or {}, 'files': [], 'frames': []}
+        for item in files:
+            path, sheet = item if isinstance(item, (tuple, list)) else (item, None)
+            parts['files'].append([self._file_digest(path) if path and os.path.exists(path) else str(path), sheet])
+        parts['frames'] = [self._frame_digest(df) for df in frames]
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def _path(self, key, suffix=CACHE_SUFFIX):
+        return os.path.join(self._directory, key + suffix)
+
+    def get(self, key):
+        '''
+        return: cached value, None on a miss
+        '''
+        if not self._enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # 损坏或被并发淘汰的条目按未命中处理
+            logger.warning(f"result cache entry {key[:12]} unreadable: {str(e)}")
+            return None
+        logger.info('result cache hit: {}', key[:12])
+        return value
+
+    def put(self, key, value):
+        if not self._enabled or value is None:
+            return
+        os.makedirs(self._directory, exist_ok=True)
+        path = self._path(key)
+        temp = '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+        with open(temp, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, path)
+        logger.debug('result cache store: {} ({} bytes)', key[:12], os.path.getsize(path))
+        self.evict()
+
+    def record_output(self, key, paths):
+        '''
+        Objective: remember the output file(s) written for an entry (path, mtime, size)
+        '''
+        paths = [paths] if isinstance(paths, str) else list(paths or [])
+        if not self._enabled or not os.path.exists(self._path(key)):
+            return
+        outputs = self._outputs(key)
+        for path in paths:
+            if os.path.exists(path):
+                stat = os.stat(path)
+                outputs[os.path.abspath(path)] = [stat.st_mtime_ns, stat.st_size]
+        with open(self._path(key, '.json'), 'w', encoding='utf-8') as f:
+            json.dump(outputs, f)
+
+    def output_current(self, key, paths):
+        '''
+        return: True when every path is an unchanged output recorded for the entry
+        '''
+        paths = [paths] if isinstance(paths, str) else list(paths or [])
+        if not self._enabled or not paths:
+            return False
+        outputs = self._outputs(key)
+        for path in paths:
+            if not os.path.exists(path):
+                return False
+            stat = os.stat(path)
+            if outputs.get(os.path.abspath(path)) != [stat.st_mtime_ns, stat.st_size]:
+                return False
+        return True
+
+    def _outputs(self, key):
+        try:
+            with open(self._path(key, '.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def entries(self):
+        '''
+        return: list of (path, size, mtime) of the cached values, least recently used first
+        '''
+        if not os.path.isdir(self._directory):
+            return []
+        entries = []
+        for name in os.listdir(self._directory):
+            if name.endswith(CACHE_SUFFIX):
+                try:
+                    stat = os.stat(os.path.join(self._directory, name))
+                except OSError:
+                    continue
+                entries.append((os.path.join(self._directory, name), stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self):
+        '''
+        Objective: remove least recently used entries until the cache fits in max_bytes
+        '''
+        with self._lock:
+            entries = self.entries()
+            total = sum(size for _, size, _ in entries)
+            for path, size, _ in entries:
+                if total <= self._max_bytes:
+                    break
+                for name in (path, path[:-len(CACHE_SUFFIX)] + '.json'):
+                    try:
+                        os.remove(name)
+                    except OSError:
+                        pass
+                total -= size
+                logger.debug('result cache evict: {}', os.path.basename(path))
+
+    def clear(self):
+        with self._lock:
+            for path, _, _ in self.entries():
+                for name in (path, path[:-len(CACHE_SUFFIX)] + '.json'):
+                    try:
+                        os.remove(name)
+                    except OSError:
+                        pass
+
+    @property
+    def directory(self):
+        return self._directory
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+    @max_bytes.setter
+    def max_bytes(self, value):
+        self._max_bytes = value
+    @property
+    def enabled(self):
+        return self._enabled
+    @enabled.setter
+    def enabled(self, value):
+        self._enabled = value
+    @property
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
@@ -0,0 +1,343 @@
+import json
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+RESULT_STORE_EXTENSIONS = ('.h5', '.hdf5')
+KINDS = ('tables', 'matrices', 'images', 'calibration')
+
+
+def _h5py():
+    try:
+        import h5py
+    except ImportError:
+        raise ImportError('h5py is required for the HDF5 result store (.h5/.hdf5 files)')
+    return h5py
+
+
+def _column_values(series):
+    # return: (values for HDF5, null mask or None)
+    if pd.api.types.is_bool_dtype(series.dtype) or \
+            (pd.api.types.is_numeric_dtype(series.dtype) and not isinstance(series.dtype, pd.CategoricalDtype)):
+        if isinstance(series.dtype, pd.api.extensions.ExtensionDtype) and series.hasnans:
+            # 可空整数 / 布尔列 (Int64, boolean) 的缺失值按 NaN 存为浮点
+            return series.to_numpy(dtype=np.float64, na_value=np.nan), None
+        return series.to_numpy(), None
+    null = series.isna().to_numpy()
+    return series.astype(object).where(~null, '').astype(str).to_numpy().astype(object), null
+
+
+class ResultStore(object):
+    """
+    Chunked, compressed HDF5 store for analysis results, one file holding any number of
+        tables:      annotation / shift / molar mass tables, one dataset per column
+        matrices:    aligned feature matrices (pixels x features, CSR) with their consensus m/z
+        images:      ion image stacks (n_mz, height, width) with m/z and annotation keys
+        calibration: per-pixel recalibration coefficients and drift maps
+    Every read is slice-wise: only the rows, pixels, m/z range or image region asked for are
+    read from disk, so a large result never has to be loaded as a whole.
+    Usage:
+        with ResultStore('result.h5') as store:
+            store.write_table('annotation', df)
+            part = store.read_table('annotation', mz_range=(200, 210))
+    """
+    def __init__(self, path, mode='a', compression='gzip', compression_level=4):
+        self._path = path
+        self._file = _h5py().File(path, mode)
+        self._compression = compression
+        self._compression_opts = compression_level if compression == 'gzip' else None
+
+    def _group(self, kind, name, create=False):
+        path = '%s/%s' % (kind, name)
+        if create:
+            if path in self._file:
+                del self._file[path]
+            return self._file.create_group(path)
+        if path not in self._file:
+            raise KeyError('%s not found in %s: %s' % (kind, self._path, name))
+        return self._file[path]
+
+    def _dataset(self, group, name, data, chunks=True, maxshape=None):
+        data = np.asarray(data)
+        dtype = _h5py().string_dtype() if data.dtype == object else data.dtype
+        if not data.size and chunks is True:
+            chunks = None if maxshape is None else (1024,) + data.shape[1:]
+        return group.create_dataset(name, data=data, dtype=dtype, chunks=chunks, maxshape=maxshape,
+                                    compression=self._compression if chunks else None,
+                                    compression_opts=self._compression_opts if chunks else None,
+                                    shuffle=bool(chunks) and data.dtype != object)
+
+    def names(self, kind='tables'):
+        '''
+        return: names of the stored results of one kind, in creation order
+        '''
+        if kind not in KINDS:
+            raise ValueError('Invalid result kind: %s' % kind)
+        if kind not in self._file:
+            return []
+        group = self._file[kind]
+        return sorted(group, key=lambda name: group[name].attrs.get('order', 0))
+
+    def _next_order(self):
+        # 写入顺序计数，names() 按此排序
+        order = int(self._file.attrs.get('next_order', 0))
+        self._file.attrs['next_order'] = order + 1
+        return order
+
+    # ------------------------------------------------------------------ tables
+    def write_table(self, name, df):
+        '''
+        Objective: store a DataFrame, replacing a table of the same name
+        '''
+        self._group('tables', name, create=True)
+        self.append_table(name, df)
+        logger.debug('result store {}: table {} ({} rows)', self._path, name, len(df))
+
+    def append_table(self, name, df):
+        '''
+        Objective: append the rows of a DataFrame to a table, creating it on the first call
+        (columns are resizable datasets, so a table can be written chunk by chunk)
+        Later chunks must have the same columns. A numeric column is widened when a chunk needs it
+        (e.g. int -> float for missing values), a text column stores numbers as text; a text chunk for
+        a numeric column raises ValueError.
+        '''
+        group = self._file.require_group('tables/%s' % name)
+        columns = [str(v) for v in df.columns]
+        if 'columns' not in group.attrs:
+            group.attrs['columns'] = json.dumps(columns)
+            group.attrs['order'] = self._next_order()
+            group.attrs['rows'] = 0
+            for k, column in enumerate(df.columns):
+                values, null = _column_values(df[column])
+                self._dataset(group, 'c%d' % k, values, maxshape=(None,))
+                # 文本列总是带空值掩码，后续块中的空值不会丢失
+                if null is not None:
+                    self._dataset(group, 'null%d' % k, null, maxshape=(None,))
+        else:
+            stored = json.loads(group.attrs['columns'])
+            if columns != stored:
+                raise ValueError('Columns of table %s in %s do not match: %s, expected %s'
+                                 % (name, self._path, columns, stored))
+            start = int(group.attrs['rows'])
+            for k, column in enumerate(df.columns):
+                values, null = self._append_values(group, k, df[column], column, name)
+                for key, data in (('c%d' % k, values), ('null%d' % k, null)):
+                    if key in group:
+                        group[key].resize((start + len(df),))
+                        group[key][start:] = data
+        group.attrs['rows'] = int(group.attrs['rows']) + len(df)
+
+    def _append_values(self, group, k, series, column, name):
+        # return: (values, null mask) of a later chunk, converted to the stored column type
+        dataset = group['c%d' % k]
+        if 'null%d' % k in group:
+            null = series.isna().to_numpy()
+            return series.astype(object).where(~null, '').astype(str).to_numpy().astype(object), null
+        values, null = _column_values(series)
+        if null is not None:
+            # 数值列：对象类型的块只接受数值与空值
+            try:
+                values, null = pd.to_numeric(series, errors='raise').astype(np.float64).to_numpy(), None
+            except (ValueError, TypeError):
+                pass
+        if null is not None:
+            raise ValueError('Column %s of table %s in %s is numeric (%s), cannot append %s values'
+                             % (column, name, self._path, dataset.dtype, series.dtype))
+        dtype = np.result_type(dataset.dtype, values.dtype)
+        if dtype != dataset.dtype:
+            # 数据集类型不可更改：按更宽的类型重建后再追加
+            existing = dataset[:].astype(dtype)
+            del group['c%d' % k]
+            self._dataset(group, 'c%d' % k, existing, maxshape=(None,))
+            logger.debug('result store {}: table {} column {} widened to {}', self._path, name, column, dtype)
+        return values.astype(dtype), None
+
+    def table_columns(self, name):
+        return pd.Index(json.loads(self._group('tables', name).attrs['columns']))
+
+    def table_rows(self, name):
+        return int(self._group('tables', name).attrs['rows'])
+
+    def _read_column(self, group, k, selection):
+        dataset = group['c%d' % k]
+        if not isinstance(selection, slice) and not len(selection):
+            return np.zeros(0, dtype=object if 'null%d' % k in group else dataset.dtype)
+        if 'null%d' % k not in group:
+            return dataset[selection]
+        values = np.asarray(dataset.asstr()[selection], dtype=object)
+        values[group['null%d' % k][selection]] = np.nan
+        return values
+
+    def read_table(self, name, rows=None, columns=None, mz_range=None, mz_column=None):
+        '''
+        Objective: read a table, or only part of it
+        Input:
+            rows: slice or increasing array of row positions
+            columns: list of column names to read
+            mz_range: (low, high), keep rows whose mz_column (default the first column) lies in the range;
+                      only that column is scanned, the other columns are read for the matching rows
+        return: DataFrame
+        '''
+        group = self._group('tables', name)
+        all_columns = list(self.table_columns(name))
+        columns = all_columns if columns is None else list(columns)
+        selection = slice(None) if rows is None else rows
+        if mz_range is not None:
+            key = all_columns.index(mz_column if mz_column is not None else all_columns[0])
+            mz = np.asarray(self._read_column(group, key, selection), dtype=np.float64)
+            hits = np.flatnonzero((mz >= mz_range[0]) & (mz <= mz_range[1]))
+            # 命中位置是相对于 rows 选中部分的，需换回表中的行号
+            if isinstance(selection, slice):
+                start, _, step = selection.indices(self.table_rows(name))
+                selection = start + hits * step
+            else:
+                selection = np.asarray(selection)[hits]
+        data = {column: self._read_column(group, all_columns.index(column), selection) for column in columns}
+        return pd.DataFrame(data, columns=columns)
+
+    # ------------------------------------------------------------------ feature matrices
+    def write_matrix(self, name, matrix, mz=None, chunk_size=1 << 20):
+        '''
+        Objective: store a sparse pixels x features matrix (CSR) with the consensus m/z of its columns
+        Input:
+            matrix: scipy.sparse matrix or AlignedPeaks (its matrix, mz, frequency and intensity are stored)
+        '''
+        if hasattr(matrix, 'matrix'):
+            aligned = matrix
+            matrix, mz = aligned.matrix, aligned.mz
+        else:
+            aligned = None
+        matrix = matrix.tocsr()
+        order = self._next_order()
+        group = self._group('matrices', name, create=True)
+        group.attrs['shape'] = matrix.shape
+        group.attrs['order'] = order
+        chunk = (min(max(matrix.nnz, 1), chunk_size),)
+        group.create_dataset('data', data=matrix.data, chunks=chunk, compression=self._compression,
+                             compression_opts=self._compression_opts, shuffle=True)
+        group.create_dataset('indices', data=matrix.indices, chunks=chunk, compression=self._compression,
+                             compression_opts=self._compression_opts, shuffle=True)
+        self._dataset(group, 'indptr', matrix.indptr)
+        self._dataset(group, 'mz', np.arange(matrix.shape[1], dtype=np.float64) if mz is None else mz)
+        if aligned is not None:
+            self._dataset(group, 'frequency', aligned.frequency)
+            self._dataset(group, 'intensity', aligned.intensity)
+        logger.debug('result store {}: matrix {} {}', self._path, name, matrix.shape)
+
+    def read_matrix(self, name, rows=None, mz_range=None):
+        '''
+        Objective: read a block of a stored feature matrix
+        Input:
+            rows: slice of pixel indices (contiguous, only that part of data/indices is read)
+            mz_range: (low, high) m/z of the features to keep
+        return: (scipy.sparse.csr_matrix, m/z of its columns)
+        '''
+        from scipy import sparse
+        group = self._group('matrices', name)
+        n_rows, n_cols = (int(v) for v in group.attrs['shape'])
+        start, stop, _ = (rows or slice(None)).indices(n_rows)
+        stop = max(stop, start)
+        indptr = group['indptr'][start:stop + 1]
+        data = group['data'][indptr[0]:indptr[-1]]
+        indices = group['indices'][indptr[0]:indptr[-1]]
+        block = sparse.csr_matrix((data, indices, indptr - indptr[0]), shape=(stop - start, n_cols))
+        mz = group['mz'][:]
+        if mz_range is not None:
+            low = np.searchsorted(mz, mz_range[0], side='left')
+            high = np.searchsorted(mz, mz_range[1], side='right')
+            block, mz = block[:, low:high], mz[low:high]
+        return block, mz
+
+    # ------------------------------------------------------------------ ion images
+    def write_images(self, name, images, mz=None, keys=None, rows=None, tile=256):
+        '''
+        Objective: store an ion image stack (n_mz, height, width), chunked per image in tiles
+        '''
+        images = np.asarray(images)
+        order = self._next_order()
+        group = self._group('images', name, create=True)
+        group.attrs['order'] = order
+        chunks = (1,) + tuple(min(max(v, 1), tile) for v in images.shape[1:]) if images.size else None
+        group.create_dataset('images', data=images, chunks=chunks,
+                             compression=self._compression if chunks else None,
+                             compression_opts=self._compression_opts if chunks else None)
+        if keys is not None:
+            self._dataset(group, 'keys', np.asarray(keys, dtype=str).astype(object))
+            if mz is None:
+                mz = [float(str(key).split('|', 1)[0]) for key in keys]
+        self._dataset(group, 'mz', np.zeros(len(images)) if mz is None else np.asarray(mz, dtype=np.float64))
+        self._dataset(group, 'rows', np.arange(len(images)) if rows is None else np.asarray(rows))
+        logger.debug('result store {}: images {} {}', self._path, name, images.shape)
+
+    def read_images(self, name, index=None, mz_range=None, region=None):
+        '''
+        Objective: read part of an ion image stack
+        Input:
+            index: image numbers (slice or increasing list)
+            mz_range: (low, high) m/z of the images to read
+            region: (y0, y1, x0, x1) pixel window, 0-based and end-exclusive
+        return: (images, m/z, keys or None)
+        '''
+        group = self._group('images', name)
+        mz = group['mz'][:]
+        if mz_range is not None:
+            index = np.flatnonzero((mz >= mz_range[0]) & (mz <= mz_range[1]))
+        index = slice(None) if index is None else index
+        y = slice(region[0], region[1]) if region is not None else slice(None)
+        x = slice(region[2], region[3]) if region is not None else slice(None)
+        if isinstance(index, slice):
+            images = group['images'][index, y, x]
+        else:
+            index = np.asarray(index, dtype=np.int64)
+            images = group['images'][index, y, x] if len(index) else \
+                np.zeros((0,) + group['images'][0:1, y, x].shape[1:], dtype=group['images'].dtype)
+        keys = group['keys'].asstr()[index] if 'keys' in group else None
+        return images, mz[index], keys
+
+    # ------------------------------------------------------------------ per-pixel calibration
+    def write_calibration(self, name, recalibration):
+        '''
+        Objective: store a fitted PixelRecalibration (coefficients, lock masses and drift map)
+        '''
+        drift, n_locks = recalibration.drift_map()
+        order = self._next_order()
+        group = self._group('calibration', name, create=True)
+        group.attrs['order'] = order
+        self._dataset(group, 'coefficients', recalibration.coefficients)
+        self._dataset(group, 'coordinates', recalibration.coordinates)
+        self._dataset(group, 'lock_mz', recalibration.lock_mz)
+        self._dataset(group, 'drift_ppm', drift)
+        self._dataset(group, 'n_locks', n_locks)
+        logger.debug('result store {}: calibration {}', self._path, name)
+
+    def read_calibration(self, name, region=None):
+        '''
+        Input:
+            region: (y0, y1, x0, x1) window of the drift map, 0-based and end-exclusive
+        return: dict with 'drift_ppm' and 'n_locks' maps (region only), 'coefficients', 'coordinates', 'lock_mz'
+        '''
+        group = self._group('calibration', name)
+        window = (slice(region[0], region[1]), slice(region[2], region[3])) if region is not None \
+            else (slice(None), slice(None))
+        result = {key: group[key][window] for key in ('drift_ppm', 'n_locks')}
+        result.update({key: group[key][:] for key in ('coefficients', 'coordinates', 'lock_mz')})
+        return result
+
+    # ------------------------------------------------------------------
+    def delete(self, kind, name):
+        del self._file['%s/%s' % (kind, name)]
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @property
+    def path(self):
+        return self._path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import platform
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from loguru import logger
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_MB = 1024.0 * 1024.0
+
+
+def _peak_rss_mb():
+    # 进程生命周期内的最大常驻内存；Linux 单位为 KB，macOS 为字节
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (_MB if platform.system() == 'Darwin' else 1024.0), 1)
+
+
+class RunReport(object):
+    """
+    Wall time, CPU time, rows and memory of every stage of one run, written as JSON next to the output.
+    Stages come from the phase events of the engines (read, index, compute, write; pass
+    progress_callback(callback) as the engine progress callback, it forwards every event to callback)
+    and from stage(name) blocks around work outside the engines, e.g. reading the input tables.
+    With trace_memory the tracemalloc peak and net allocation of every stage are recorded as well;
+    the peak RSS of the process is recorded where the platform reports it. CPU time is that of the
+    whole process, so it includes other jobs running at the same time (GUI).
+    A disabled report (the default of from_config) returns the callback unchanged and a no-op stage,
+    so it costs nothing.
+    """
+    def __init__(self, task, enabled=True, trace_memory=False):
+        self.task = task
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.stages = []
+        self._current = None
+        self._own_tracing = False
+        self._started = datetime.now()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._own_tracing = True
+
+    @classmethod
+    def from_config(cls, config, task):
+        '''
+        Objective: report configured by the "Run Report" section of a config.json:
+            "Enabled": false by default, "Trace Memory": false by default (tracemalloc slows allocations)
+        '''
+        section = (config or {}).get('Run Report', {})
+        return cls(task, enabled=bool(section.get('Enabled', False)),
+                   trace_memory=bool(section.get('Trace Memory', False)))
+
+    def _open(self, task, name):
+        record = {'task': task, 'stage': name, 'wall_s': 0.0, 'cpu_s': 0.0, 'rows': None}
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            record['_memory'] = tracemalloc.get_traced_memory()[0]
+        record['_wall'], record['_cpu'] = time.perf_counter(), time.process_time()
+        self.stages.append(record)
+        self._current = (task, name)
+        return record
+
+    def _update(self, record, rows=None):
+        record['wall_s'] = round(time.perf_counter() - record['_wall'], 6)
+        record['cpu_s'] = round(time.process_time() - record['_cpu'], 6)
+        if rows is not None:
+            record['rows'] = int(rows)
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            record['memory_peak_mb'] = round((peak - record['_memory']) / _MB, 3)
+            record['memory_delta_mb'] = round((current - record['_memory']) / _MB, 3)
+        record['peak_rss_mb'] = _peak_rss_mb()
+
+    def progress_callback(self, callback=None):
+        '''
+        Objective: engine progress callback that records the engine phases and forwards every event to callback
+        return: callback itself when the report is disabled
+        '''
+        if not self.enabled:
+            return callback
+
+        def record_event(event):
+            # ProgressReporter.start 发出 elapsed 为 0 的事件，表示新阶段开始
+            if event.elapsed == 0 or self._current != (event.task, event.phase):
+                self._open(event.task, event.phase)
+            self._update(self.stages[-1], event.done)
+            if callback is not None:
+                callback(event)
+        return record_event
+
+    def stage(self, name, rows=None):
+        '''
+        Objective: context manager timing a block as one stage of the report task
+        rows: row count of the stage when known beforehand; set record['rows'] inside the block otherwise
+        '''
+        return self._stage(name, rows) if self.enabled else nullcontext({})
+
+    @contextmanager
+    def _stage(self, name, rows):
+        record = self._open(self.task, name)
+        try:
+            yield record
+        finally:
+            self._update(record, rows if rows is not None else record['rows'])
+            self._current = None
+
+    def to_dict(self):
+        return {
+            'task': self.task,
+            'started': self._started.isoformat(timespec='seconds'),
+            'wall_s': round(time.perf_counter() - self._wall, 6),
+            'cpu_s': round(time.process_time() - self._cpu, 6),
+            'peak_rss_mb': _peak_rss_mb(),
+            'trace_memory': self.trace_memory,
+            'stages': [{k: v for k, v in record.items() if not k.startswith('_')} for record in self.stages],
+        }
+
+    def write(self, output):
+        '''
+        Objective: write the report as <output stem>.report.json next to the output file
+        return: report path, None when the report is disabled or there is no output
+        '''
+        if not self.enabled or not output:
+            return None
+        path = os.path.splitext(str(output))[0] + '.report.json'
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+        if self._own_tracing:
+            tracemalloc.stop()
+            self._own_tracing = False
+        logger.info(f"Run report saved to {path}")
+        return path
@@ -0,0 +1,406 @@
+import os
+import shutil
+from functools import lru_cache
+import pandas as pd
+from loguru import logger
+
+EXCEL_EXTENSIONS = ('.xlsx', '.xlsm', '.xls', '.xlsb', '.ods')
+CSV_EXTENSIONS = ('.csv', '.tsv')
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+FEATHER_EXTENSIONS = ('.feather', '.arrow')
+IMZML_EXTENSIONS = ('.imzml',)
+HDF5_EXTENSIONS = ('.h5', '.hdf5')
+SUPPORTED_EXTENSIONS = EXCEL_EXTENSIONS + CSV_EXTENSIONS + PARQUET_EXTENSIONS + FEATHER_EXTENSIONS + HDF5_EXTENSIONS
+# 只读格式：读入为平均谱 ('m/z', 'Intensity') 峰表
+READ_ONLY_EXTENSIONS = IMZML_EXTENSIONS
+# Excel 单个工作表的最大行数（含表头）
+EXCEL_MAX_ROWS = 1048576
+
+
+def file_format(path):
+    """
+    Return the table format ('excel', 'csv', 'parquet', 'feather', 'hdf5' or 'imzml') of a file from its extension.
+    """
+    ext = os.path.splitext(str(path))[1].lower()
+    if ext in EXCEL_EXTENSIONS:
+        return 'excel'
+    if ext in CSV_EXTENSIONS:
+        return 'csv'
+    if ext in PARQUET_EXTENSIONS:
+        return 'parquet'
+    if ext in FEATHER_EXTENSIONS:
+        return 'feather'
+    if ext in HDF5_EXTENSIONS:
+        return 'hdf5'
+    if ext in IMZML_EXTENSIONS:
+        return 'imzml'
+    raise ValueError('Unsupported file format: %s' % path)
+
+
+@lru_cache(maxsize=None)
+def _has_module(name):
+    try:
+        __import__(name)
+    except ImportError:
+        return False
+    return True
+
+
+@lru_cache(maxsize=None)
+def _pandas_supports_calamine():
+    major, minor = (int(v) for v in pd.__version__.split('.')[:2])
+    return (major, minor) >= (2, 2)
+
+
+def excel_engine(path=None):
+    """
+    Return the fastest available Excel read engine.
+    calamine (python-calamine) is used when installed, otherwise openpyxl for xlsx files
+    and the pandas default for the other Excel formats.
+    """
+    if _has_module('python_calamine') and _pandas_supports_calamine():
+        return 'calamine'
+    ext = os.path.splitext(str(path))[1].lower() if path else '.xlsx'
+    return 'openpyxl' if ext in ('.xlsx', '.xlsm') else None
+
+
+def read_table(path, sheet_name=0, usecols=None, nrows=None):
+    """
+    Read a table from an Excel, CSV, Parquet, Feather or HDF5 result store file into a DataFrame.
+    sheet_name is only meaningful for Excel files and result stores, the other formats hold a single table.
+    An imzML data set is read as its mean spectrum, an 'm/z' / 'Intensity' peak table.
+    """
+    fmt = file_format(path)
+    logger.debug('read {} table: {}', fmt, path)
+    if fmt == 'hdf5':
+        from .result_store import ResultStore
+        with ResultStore(path, 'r') as store:
+            name = store.names('tables')[sheet_name] if isinstance(sheet_name, int) else sheet_name
+            rows = None if nrows is None else slice(0, nrows)
+            return store.read_table(name, rows=rows, columns=usecols)
+    if fmt == 'imzml':
+        from ..imaging.imzml_reader import ImzMLReader
+        df = ImzMLReader(path).to_peak_table()
+        df = df if usecols is None else df[list(usecols)]
+        return df if nrows is None else df.iloc[:nrows]
+    if fmt == 'excel':
+        return pd.read_excel(path, engine=excel_engine(path), sheet_name=sheet_name,
+                             usecols=usecols, nrows=nrows)
+    if fmt == 'csv':
+        sep = '\t' if str(path).lower().endswith('.tsv') else ','
+        if nrows is None and _has_module('pyarrow'):
+            return pd.read_csv(path, sep=sep, usecols=usecols, engine='pyarrow')
+        return pd.read_csv(path, sep=sep, usecols=usecols, nrows=nrows)
+    if fmt == 'parquet':
+        df = pd.read_parquet(path, columns=usecols)
+    else:
+        df = pd.read_feather(path, columns=usecols)
+    return df if nrows is None else df.iloc[:nrows]
+
+
+def read_columns(path, sheet_name=0):
+    """
+    Read only the header of a table and return its column names as a pandas Index.
+    Parquet and Feather files are probed from their schema without touching the data.
+    """
+    fmt = file_format(path)
+    if fmt == 'imzml':
+        return pd.Index(['m/z', 'Intensity'])
+    if fmt == 'hdf5':
+        from .result_store import ResultStore
+        with ResultStore(path, 'r') as store:
+            return store.table_columns(store.names('tables')[sheet_name] if isinstance(sheet_name, int)
+                                       else sheet_name)
+    if fmt in ('parquet', 'feather') and _has_module('pyarrow'):
+        if fmt == 'parquet':
+            import pyarrow.parquet as pq
+            names = pq.read_schema(path).names
+        else:
+            import pyarrow.ipc as ipc
+            with ipc.open_file(path) as reader:
+                names = reader.schema.names
+        return pd.Index([v for v in names if not str(v).startswith('__index_level_')])
+    return read_table(path, sheet_name=sheet_name, nrows=0).columns
+
+
+def sheet_names(path):
+    """
+    Return the sheet names of an Excel file, the table names of a result store,
+    or the file name for single-table formats.
+    """
+    if file_format(path) == 'hdf5':
+        from .result_store import ResultStore
+        with ResultStore(path, 'r') as store:
+            return store.names('tables')
+    if file_format(path) == 'excel':
+        with pd.ExcelFile(path, engine=excel_engine(path)) as excel_file:
+            return list(excel_file.sheet_names)
+    return [os.path.splitext(os.path.basename(str(path)))[0]]
+
+
+def write_table(df, path, sheet_name='Sheet1', index=False):
+    """
+    Write a DataFrame to a file whose format is chosen by the extension of path.
+    An HDF5 result store keeps its other contents, the table is stored (or replaced) as sheet_name.
+    """
+    fmt = file_format(path)
+    logger.debug('write {} table: {}', fmt, path)
+    if fmt == 'imzml':
+        raise ValueError('imzML is an input-only format: %s' % path)
+    if fmt == 'hdf5':
+        from .result_store import ResultStore
+        with ResultStore(path) as store:
+            store.write_table(sheet_name, df.reset_index() if index else df)
+        return path
+    if fmt == 'excel':
+        df.to_excel(path, sheet_name=sheet_name, index=index)
+    elif fmt == 'csv':
+        sep = '\t' if str(path).lower().endswith('.tsv') else ','
+        df.to_csv(path, sep=sep, index=index)
+    elif fmt == 'parquet':
+        df.to_parquet(path, index=index)
+    else:
+        df = df.reset_index() if index else df.reset_index(drop=True)
+        df.columns = [str(v) for v in df.columns]
+        df.to_feather(path)
+    return path
+
+
+def write_tables(frames, path, index=False):
+    """
+    Write several DataFrames ({sheet name: DataFrame}) to one Excel workbook or result store.
+    Single-table formats get one file per sheet, named <stem>_<sheet><ext>.
+    return: list of written files
+    """
+    if file_format(path) == 'hdf5':
+        for sheet, df in frames.items():
+            write_table(df, path, sheet_name=sheet, index=index)
+        return [path]
+    if file_format(path) == 'excel':
+        with pd.ExcelWriter(path) as writer:
+            for sheet, df in frames.items():
+                df.to_excel(writer, sheet_name=sheet, index=index)
+        return [path]
+    return [write_table(df, table_path(path, sheet), index=index) for sheet, df in frames.items()]
+
+
+def table_path(path, sheet_name):
+    """
+    Return the file used for one sheet of a single-table format: <stem>_<sheet><ext>.
+    """
+    stem, ext = os.path.splitext(str(path))
+    return '%s_%s%s' % (stem, sheet_name, ext)
+
+
+def _frame_rows(df):
+    # NaN -> None, numpy 标量 -> python 标量
+    return df.astype(object).where(df.notna(), None).values.tolist()
+
+
+class StreamingTableWriter(object):
+    """
+    Write tables chunk by chunk so that the output never has to exist in memory twice.
+    Excel output uses xlsxwriter in constant_memory mode when installed, otherwise an openpyxl
+    write-only workbook; a table longer than the Excel row limit continues on <sheet>_2, <sheet>_3 ...
+    CSV is appended, Parquet and Feather are written as a sequence of Arrow record batches,
+    an HDF5 result store appends to resizable column datasets.
+    Every file is written to a temporary path next to it and moved into place by close(); leaving
+    the with block by an exception (e.g. JobCancelled) discards the partial output instead.
+    Usage:
+        with StreamingTableWriter(path) as writer:
+            writer.add_table('Sheet1')
+            for chunk in chunks:
+                writer.write_frame(chunk)
+    """
+    def __init__(self, path, max_rows=EXCEL_MAX_ROWS):
+        self._path = path
+        self._format = file_format(path)
+        if self._format == 'imzml':
+            raise ValueError('imzML is an input-only format: %s' % path)
+        self._max_rows = max_rows
+        self._book = None
+        self._backend = None
+        self._sheet = None
+        self._handle = None
+        self._table_name = None
+        self._columns = None
+        self._part = 0
+        self._row = 0
+        self._temp = {}
+        self.rows_written = 0
+        if self._format == 'hdf5':
+            from .result_store import ResultStore
+            # 结果库按追加方式打开：先复制已有文件
+            temp = self._temp_path(path)
+            if os.path.exists(path):
+                shutil.copyfile(path, temp)
+            self._book = ResultStore(temp)
+        elif self._format == 'excel':
+            if _has_module('xlsxwriter'):
+                import xlsxwriter
+                self._backend = 'xlsxwriter'
+                self._book = xlsxwriter.Workbook(self._temp_path(path),
+                                                 {'constant_memory': True, 'nan_inf_to_errors': True})
+            else:
+                from openpyxl import Workbook
+                self._backend = 'openpyxl'
+                self._book = Workbook(write_only=True)
+
+    def _temp_path(self, path):
+        # 临时文件保留扩展名，正常关闭时替换目标文件
+        if path not in self._temp:
+            stem, ext = os.path.splitext(path)
+            self._temp[path] = '%s.partial-%d%s' % (stem, os.getpid(), ext)
+        return self._temp[path]
+
+    def add_table(self, sheet_name='Sheet1', path=None):
+        """
+        Start a new table: a new worksheet for Excel, a new file (path, default the writer path) otherwise.
+        """
+        self._close_table()
+        self._table_name = sheet_name
+        self._table_path = self._temp_path(path or self._path)
+        self._columns = None
+        self._part = 0
+        self._sheet = None
+
+    def write_frame(self, df):
+        """
+        Append the rows of a DataFrame to the current table.
+        """
+        if self._table_name is None:
+            self.add_table()
+        if self._columns is None:
+            self._columns = [str(v) for v in df.columns]
+        if self._format == 'hdf5':
+            if self._sheet is None:
+                self._book.write_table(self._table_name, df)
+                self._sheet = self._table_name
+            else:
+                self._book.append_table(self._table_name, df)
+        elif self._format == 'excel':
+            self._write_excel_rows(_frame_rows(df))
+        elif self._format == 'csv':
+            if self._handle is None:
+                self._handle = open(self._table_path, 'w', encoding='utf-8', newline='')
+                df.iloc[:0].to_csv(self._handle, sep=self._sep(), index=False)
+            df.to_csv(self._handle, sep=self._sep(), index=False, header=False)
+        else:
+            self._write_arrow(df)
+        self.rows_written += len(df)
+
+    def _sep(self):
+        return '\t' if str(self._table_path).lower().endswith('.tsv') else ','
+
+    def _new_sheet(self):
+        self._part += 1
+        title = self._table_name if self._part == 1 else '%s_%d' % (self._table_name, self._part)
+        title = str(title)[:31]
+        if self._backend == 'xlsxwriter':
+            self._sheet = self._book.add_worksheet(title)
+            self._sheet.write_row(0, 0, self._columns)
+        else:
+            self._sheet = self._book.create_sheet(title)
+            self._sheet.append(self._columns)
+        self._row = 1
+        if self._part > 1:
+            logger.info('Excel row limit reached, continue on sheet {}', title)
+
+    def _write_excel_rows(self, rows):
+        start = 0
+        while start < len(rows) or self._sheet is None:
+            if self._sheet is None or self._row >= self._max_rows:
+                self._new_sheet()
+            stop = min(len(rows), start + self._max_rows - self._row)
+            for row in rows[start:stop]:
+                if self._backend == 'xlsxwriter':
+                    self._sheet.write_row(self._row, 0, row)
+                else:
+                    self._sheet.append(row)
+                self._row += 1
+            start = stop
+
+    def _write_arrow(self, df):
+        import pyarrow as pa
+        df = df.reset_index(drop=True)
+        df.columns = self._columns
+        if self._handle is None:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._format == 'parquet':
+                import pyarrow.parquet as pq
+                self._handle = pq.ParquetWriter(self._table_path, table.schema)
+            else:
+                self._handle = pa.ipc.new_file(self._table_path, table.schema)
+            self._schema = table.schema
+        else:
+            table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+        self._handle.write_table(table)
+
+    def _close_table(self):
+        if self._format == 'hdf5':
+            if self._table_name is not None and self._sheet is None and self._columns is not None:
+                self._book.write_table(self._table_name, pd.DataFrame(columns=self._columns))
+        elif self._format == 'excel':
+            if self._table_name is not None and self._sheet is None and self._columns is not None:
+                self._new_sheet()
+        elif self._handle is not None:
+            self._handle.close()
+        self._handle = None
+
+    def close(self):
+        self._close_table()
+        if self._book is not None:
+            if self._format == 'hdf5':
+                self._book.close()
+            elif self._backend == 'xlsxwriter':
+                self._book.close()
+            else:
+                self._book.save(self._temp_path(self._path))
+            self._book = None
+        for path, temp in self._temp.items():
+            if os.path.exists(temp):
+                os.replace(temp, path)
+        self._temp = {}
+
+    def discard(self):
+        """
+        Close without writing: remove the partial output files.
+        """
+        try:
+            if self._handle is not None:
+                self._handle.close()
+            if self._format == 'hdf5' or self._backend == 'xlsxwriter':
+                if self._book is not None:
+                    self._book.close()
+        except Exception as e:
+            logger.debug(f"closing discarded output {self._path}: {str(e)}")
+        self._handle = None
+        self._book = None
+        for temp in self._temp.values():
+            if os.path.exists(temp):
+                os.remove(temp)
+        self._temp = {}
+        logger.info('Discarded partial output {}', self._path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+def write_table_streaming(df, path, sheet_name='Sheet1', chunk_size=50000):
+    """
+    Write a DataFrame (or an iterable of DataFrame chunks) with StreamingTableWriter.
+    return: number of rows written
+    """
+    chunks = (df.iloc[i:i + chunk_size] for i in range(0, max(len(df), 1), chunk_size)) \
+        if isinstance(df, pd.DataFrame) else df
+    with StreamingTableWriter(path) as writer:
+        writer.add_table(sheet_name)
+        for chunk in chunks:
+            writer.write_frame(chunk)
+        return writer.rows_written